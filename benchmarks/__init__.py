@@ -0,0 +1,85 @@
+"""
+Microbenchmarks for django_schemas.
+
+Each module is a script to be run from the repository root, for example
+`python -m benchmarks.clones`. They reuse the test app and settings
+from `runtests.py`, but only touch the database when they say so.
+"""
+
+import timeit
+
+
+def setup():
+    """Configure Django with the same databases as the test suite."""
+    from django.conf import settings
+    from django_schemas.utils import get_databases, get_database
+    
+    if settings.configured:
+        return
+    default = {
+        'ENGINE': 'django_schemas.backends.postgres.wrapper',
+        'NAME': 'django_schemas',
+        'USER': 'django_schemas',
+        'PASSWORD': 'django_schemas',
+        'HOST': 'localhost',
+        'PORT': '5432',
+        'ENVIRONMENTS': [],
+    }
+    settings.configure(
+        DATABASE_ENVIRONMENTS={
+            'test1-a': {
+                'SCHEMA_NAME': 'test1_a',
+                'ADDITIONAL_SCHEMAS': ['public'],
+            },
+            'test1-b': {
+                'ADDITIONAL_SCHEMAS': ['public'],
+            },
+        },
+        DATABASES=get_databases(
+            get_database(
+                alias='default',
+                override={'ENVIRONMENTS': ['default']},
+                original=default),
+            get_database(
+                alias='db1',
+                override={'ENVIRONMENTS': ['test1-a', 'test1-b']},
+                replicas=['localhost'],
+                original=default),
+            get_database(
+                alias='db2',
+                override={
+                    'NAME': 'django_schemas_2',
+                    'ENVIRONMENTS': ['test1-b'],
+                },
+                original=default),
+        ),
+        DATABASE_ROUTERS=[
+            'django_schemas.routers.ExplicitRouter',
+        ],
+        SECRET_KEY='benchmarkingbenchmarking',
+        INSTALLED_APPS=(
+            'django.contrib.gis',
+            'django_schemas',
+            'tests',
+        ),
+    )
+    import django
+    django.setup()
+
+
+def measure(name, func, number=100000, repeat=3):
+    """Time a callable and print the best time per call.
+    
+    Args:
+        name (str): Label for the output line.
+        func (callable): Called without arguments.
+        number (int): Calls per round.
+        repeat (int): Rounds to take the best of.
+    
+    Returns:
+        Best time per call, in seconds.
+    
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print('%-40s %12.3f us' % (name, best * 1e6))
+    return best
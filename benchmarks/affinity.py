@@ -0,0 +1,58 @@
+"""
+Connections held by requests that read from replicas.
+
+Plays requests of 20 reads each against `db1` with four replicas, all
+on the local server, with and without `DATABASE_REPLICA_AFFINITY`, and
+reports how many connections each request ends up holding. Needs the
+test database server to be running.
+"""
+
+from __future__ import print_function
+
+import time
+
+from benchmarks import setup
+
+
+def play(requests, reads):
+    """Play requests, and respond with connections held per request."""
+    from django.core import signals
+    from django.db import connections
+    from django_schemas.backends.usage import open_connections
+    from django_schemas.routers import ExplicitRouter
+    from tests.models import Test1AUser
+    
+    router = ExplicitRouter()
+    held = 0
+    for i in range(requests):
+        signals.request_started.send(sender=None)
+        for j in range(reads):
+            alias = router.db_for_read(Test1AUser)
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        held += sum(open_connections().values())
+        signals.request_finished.send(sender=None)
+    return float(held) / requests
+
+
+def main(requests=50, reads=20):
+    setup()
+    from django.conf import settings
+    from django.test import override_settings
+    from django_schemas.topology import rebuild_topology
+    from django_schemas.utils import get_database_replicas_list
+    
+    settings.DATABASES.update(get_database_replicas_list(
+            'db1', settings.DATABASES['db1'], ['localhost'] * 4))
+    rebuild_topology()
+    for affinity in (False, True):
+        with override_settings(DATABASE_REPLICA_AFFINITY=affinity):
+            started = time.time()
+            held = play(requests, reads)
+            elapsed = (time.time() - started) / requests
+        print('affinity: %-5s connections per request: %.2f, '
+              'ms per request: %.2f' % (affinity, held, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
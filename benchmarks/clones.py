@@ -0,0 +1,37 @@
+"""
+Cost of looking up model clones.
+
+Compares a `set_db` call for a clone that already exists against a
+plain dictionary lookup, and against the serial name lookup that
+`set_db` used before it had an alias to go by.
+"""
+
+from __future__ import print_function
+
+from benchmarks import measure, setup
+
+
+def main():
+    setup()
+    from django_schemas import modelsfactory
+    from tests.models import Test1BCar
+    
+    Test1BCar.set_db('db1', 'bench')
+    options = {
+        'db_name': 'db1',
+        'db_table': 'bench"."tests_test1bcar',
+        'schema_name': 'bench',
+        'table_name': 'tests_test1bcar',
+    }
+    lookup = {(Test1BCar, 'db1', 'bench'): Test1BCar}
+    
+    measure('dict lookup', lambda: lookup[(Test1BCar, 'db1', 'bench')])
+    measure('set_db (existing clone)',
+            lambda: Test1BCar.set_db('db1', 'bench'))
+    measure('get_model (serial name)',
+            lambda: modelsfactory.get_model(Test1BCar, options), number=10000)
+    print(modelsfactory.EXISTING_MODEL_CLONES.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Cost of many threads asking for the same new clones at once.
+
+Each round, every thread asks for the same set of clones that don't
+exist yet. Only one thread builds each clone while the others wait on
+it, and the cache reports how often and how long they waited.
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+
+from benchmarks import setup
+
+
+def main(threads=8, schemas=50):
+    setup()
+    from django_schemas.modelsfactory import EXISTING_MODEL_CLONES
+    from tests.models import Test1BCar
+    
+    barrier = threading.Event()
+    
+    def work():
+        barrier.wait()
+        for i in range(schemas):
+            Test1BCar.set_db('db1', 'contention_%d' % i)
+    
+    workers = [threading.Thread(target=work) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    started = time.time()
+    barrier.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - started
+    
+    stats = EXISTING_MODEL_CLONES.stats()
+    print('threads: %d, schemas: %d, elapsed: %.3fs' % (
+            threads, schemas, elapsed))
+    print('builds: %(builds)d, waits: %(waits)d, '
+          'wait time: %(wait_time).3fs' % stats)
+
+
+if __name__ == '__main__':
+    main()
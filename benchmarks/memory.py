@@ -0,0 +1,56 @@
+"""
+Memory held by each model clone.
+
+Builds clones of the test models for 1,000 and then 10,000 schemas, and
+reports the bytes allocated per clone as traced by tracemalloc, along
+with how much of that the clones' fields account for. Needs Python 3.
+"""
+
+from __future__ import print_function
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from benchmarks import setup
+
+
+def clone_many(model, count):
+    """Clone a model for `count` new schemas, and trace what it costs."""
+    gc.collect()
+    tracemalloc.start(1)
+    started = time.time()
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        model.set_db('db1', 'memory_%s_%d' % (count, i))
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    elapsed = time.time() - started
+    tracemalloc.stop()
+    
+    total = fields = 0
+    for stat in after.compare_to(before, 'filename'):
+        total += stat.size_diff
+        filename = stat.traceback[0].filename
+        if filename.endswith(('fields/__init__.py', 'fields/related.py',
+                'copy.py', 'modelsfactory.py')):
+            fields += stat.size_diff
+    print('%-12s %6d clones %10.0f B/clone %10.0f B/clone in fields '
+            '(%.1fs)' % (model.__name__, count, total / count,
+            fields / count, elapsed))
+
+
+def main(counts=(1000, 10000)):
+    setup()
+    from django_schemas.modelsfactory import EXISTING_MODEL_CLONES
+    from tests.models import Test1BCar, Test1BUser
+    
+    for count in counts:
+        for model in (Test1BUser, Test1BCar):
+            clone_many(model, count)
+            EXISTING_MODEL_CLONES.clear()
+
+
+if __name__ == '__main__':
+    main(tuple(int(arg) for arg in sys.argv[1:]) or (1000, 10000))
@@ -0,0 +1,67 @@
+"""
+Cost of cloning a wide model.
+
+Builds a model with 80 fields spread over a few abstract bases, then
+times building new clones of it, with the clone plan kept between
+clones and with it worked out again for each one. Also times the method
+discovery that goes into each plan, with and without its memo.
+"""
+
+from __future__ import print_function
+
+import itertools
+
+from benchmarks import measure, setup
+
+
+def wide_model(width=80, bases=4):
+    """Create a schema model with `width` fields over abstract bases."""
+    from django.db import models
+    from django_schemas.models import Model
+    from django_schemas.modelsfactory import create_model
+    
+    per_base = width // (bases + 1)
+    parents = (Model, models.Model)
+    for i in range(bases):
+        attrs = dict(('f%d_%d' % (i, j), models.CharField(max_length=10))
+                for j in range(per_base))
+        parents = (create_model('WideBase%d' % i, fields=attrs,
+                app_label='tests', module=__name__,
+                options={'abstract': True}, bases=parents),)
+    attrs = dict(('own_%d' % j, models.CharField(max_length=10))
+            for j in range(width - per_base * bases))
+    return create_model('Wide', fields=attrs, app_label='tests',
+            module=__name__, options={'db_environment': 'test1-b'},
+            bases=parents)
+
+
+def main():
+    setup()
+    from django_schemas import modelsfactory
+    from django_schemas.utils import (
+            forget_methods_from_class, get_methods_from_class)
+    
+    model = wide_model()
+    counter = itertools.count()
+    
+    def clone():
+        model.set_db('db1', 'plans_%d' % next(counter))
+    
+    def clone_unplanned():
+        modelsfactory.forget_clone_plan(model)
+        clone()
+    
+    def scan_methods():
+        forget_methods_from_class(model)
+        get_methods_from_class(model)
+    
+    print('fields: %d' % len(model._meta.fields))
+    measure('set_db (new clone)', clone, number=200)
+    measure('set_db (new clone, no plan)', clone_unplanned, number=200)
+    measure('get_methods_from_class (scan)', scan_methods, number=1000)
+    measure('get_methods_from_class (memoized)',
+            lambda: get_methods_from_class(model))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Cost of a short request's connection, with and without a pool.
+
+Plays requests that each run one `SELECT 1` on `db2` and close their
+connection, as Django does when a request finishes, first with a new
+connection for each, then with `POOL_MAX` set.
+
+Then plays requests that each count the users of one of four tenants,
+picked at random, with and without `POOL_SCHEMA_AFFINITY`, and reports
+how often the pool had a connection on the tenant's schema, and how
+many `SET search_path` that saved. Needs the test database server to be
+running, and migrates the tenants' schemas on `db2`.
+"""
+
+from __future__ import print_function
+
+import random
+
+from benchmarks import measure, setup
+
+
+TENANTS = ['pool_benchmark_%d' % i for i in range(4)]
+
+
+def main(number=200):
+    setup()
+    from django.db import connections
+    from django_schemas.backends.pool import close_pools, pool_stats
+    from django_schemas.backends.usage import round_trips_saved
+    from django_schemas.migrations import flush, migrate
+    from django_schemas.routers import using_schema
+    from tests.models import Test1BUser
+    
+    original = connections['db2']
+    
+    def request(wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        wrapper.close()
+    
+    for pool_max in (None, 4):
+        wrapper = type(original)(
+                dict(original.settings_dict, POOL_MAX=pool_max), 'db2')
+        measure('request (POOL_MAX=%s)' % pool_max,
+                lambda: request(wrapper), number=number)
+    stats = pool_stats()['db2']
+    print('checkouts: %d, connections opened: %d, waits: %d' % (
+            stats['checkouts'], stats['size'], stats['waits']))
+    close_pools()
+    
+    # Tenants, with and without connections kept on their schema
+    for tenant in TENANTS:
+        flush(db='db2', schema=tenant)
+        migrate(db='db2', schema=tenant, environment='test1-b')
+    
+    def tenant_request(wrapper):
+        with using_schema('db2', random.choice(TENANTS), 'test1-b'):
+            Test1BUser.objects.count()
+        wrapper.close()
+    
+    for affinity in (False, True):
+        wrapper = connections['db2'] = type(original)(dict(
+                original.settings_dict, POOL_MAX=4,
+                POOL_SCHEMA_AFFINITY=affinity), 'db2')
+        saved = round_trips_saved().get('db2', 0)
+        measure('tenants (affinity=%s)' % affinity,
+                lambda: tenant_request(wrapper), number=number * 5)
+        saved = round_trips_saved().get('db2', 0) - saved
+        print('schema hit rate: %.1f%%, SETs skipped: %d of %d' % (
+                pool_stats()['db2']['hit_rate'] * 100, saved,
+                number * 15))
+        close_pools()
+    connections['db2'] = original
+    for tenant in TENANTS:
+        flush(db='db2', schema=tenant)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Cost of the routing decisions Django asks for on every query.
+
+Runs the router against a `DATABASES` of 60 aliases, 20 write
+databases with two replicas each, one of them holding the environment
+of the routed model. Doesn't touch the database.
+"""
+
+from __future__ import print_function
+
+import warnings
+
+from benchmarks import measure, setup
+
+
+def get_settings(primaries=20, replicas=2):
+    """Build a `DATABASES` setting with many primaries and replicas."""
+    from django.conf import settings
+    from django_schemas.utils import get_databases, get_database
+    
+    original = settings.DATABASES['default']
+    groups = [get_database(alias='default', original=original)]
+    for i in range(primaries):
+        envs = ['test1-a', 'test1-b'] if i == 0 else ['test1-b']
+        groups.append(get_database(
+                alias='db%d' % (i + 1),
+                override={'ENVIRONMENTS': envs},
+                replicas=['localhost'] * replicas,
+                original=original))
+    return get_databases(*groups)
+
+
+def main():
+    setup()
+    from django.test import override_settings
+    from django_schemas.replicas import POLICIES
+    from django_schemas.routers import ExplicitRouter
+    from django_schemas.sticky import forget_writes
+    from tests.models import Test1AUser
+    
+    router = ExplicitRouter()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        with override_settings(DATABASES=get_settings()):
+            measure('db_for_write (environment)',
+                    lambda: router.db_for_write(Test1AUser), number=10000)
+            measure('db_for_read (environment)',
+                    lambda: router.db_for_read(Test1AUser), number=10000)
+            measure('db_for_read (db_name hint)',
+                    lambda: router.db_for_read(Test1AUser, db_name='db7'),
+                    number=10000)
+            measure('allow_migrate (replica)',
+                    lambda: router.allow_migrate('db7-read1', 'tests'),
+                    number=10000)
+            with override_settings(DATABASE_READ_YOUR_WRITES=60):
+                router.db_for_write(Test1AUser)
+                measure('db_for_read (after a write)',
+                        lambda: router.db_for_read(Test1AUser), number=10000)
+                forget_writes()
+            for name in sorted(POLICIES):
+                with override_settings(DATABASE_REPLICA_POLICY=name):
+                    measure('db_for_read (%s)' % name,
+                            lambda: router.db_for_read(Test1AUser),
+                            number=10000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Cost of turning rows into model instances.
+
+Times `Model.from_db`, which Django calls for every row a queryset
+yields, on a schema model and on a plain Django model with the same
+fields. Doesn't touch the database.
+"""
+
+from __future__ import print_function
+
+from benchmarks import measure, setup
+
+
+def main():
+    setup()
+    from django.db import models
+    from django_schemas.modelsfactory import create_model
+    from tests.models import Test1AUser
+    
+    plain = create_model('PlainUser', fields={
+        'name': models.CharField(max_length=100),
+        'db': models.CharField(max_length=63),
+    }, app_label='tests', module=__name__, bases=(models.Model,))
+    names = ['id', 'name', 'db']
+    values = [1, 'garfield', 'db1']
+    
+    measure('from_db (plain model)',
+            lambda: plain.from_db('db1', names, values), number=200000)
+    measure('from_db (schema model)',
+            lambda: Test1AUser.from_db('db1', names, values), number=200000)
+
+
+if __name__ == '__main__':
+    main()
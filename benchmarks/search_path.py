@@ -0,0 +1,57 @@
+"""
+Round trips spent pointing connections to a schema.
+
+Runs `SELECT 1` in new cursors under `using_schema`, first making the
+wrapper forget the `search_path` it set before each one, as it did
+when every cursor sent its own `SET`, then letting it remember. Reports
+the time per query and the round trips saved.
+
+Then times the statements of a switch to a schema whose environment has
+`SESSION_SETTINGS`, sent in one round trip as the wrappers do, and one
+at a time. Needs the test database server to be running.
+"""
+
+from __future__ import print_function
+
+from benchmarks import measure, setup
+
+
+def main(number=5000):
+    setup()
+    from django.db import connections
+    from django_schemas.backends import conf
+    from django_schemas.backends.usage import round_trips_saved
+    from django_schemas.routers import using_schema
+    
+    connection = connections['db1']
+    
+    def query(forget):
+        if forget:
+            connection.schema_search_path = conf.UNKNOWN_PATH
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    
+    with using_schema('db1', 'search_path_benchmark', 'test1-b'):
+        measure('SELECT 1 (SET every cursor)',
+                lambda: query(True), number=number)
+        before = round_trips_saved().get('db1', 0)
+        measure('SELECT 1 (SET on change)',
+                lambda: query(False), number=number)
+        saved = round_trips_saved().get('db1', 0) - before
+    print('round trips saved: %d of %d cursors' % (saved, number * 3))
+    
+    statements = [
+        "SET search_path = search_path_benchmark, public",
+        "SET work_mem = '64MB'",
+        "SET statement_timeout = '2s'",
+    ]
+    with connection.cursor() as cursor:
+        measure('3 SETs (one round trip)',
+                lambda: cursor.execute('; '.join(statements)), number=number)
+        measure('3 SETs (one each)',
+                lambda: [cursor.execute(sql) for sql in statements],
+                number=number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Cost of placing tenants, and how many move when a database is added.
+
+Spreads 100000 tenant keys over 8 databases, adds a ninth, and counts
+the tenants whose database changed. Doesn't touch the database.
+"""
+
+from __future__ import print_function
+
+from benchmarks import measure, setup
+
+
+def main(tenants=100000, databases=8):
+    setup()
+    from django_schemas.shards import ShardMap
+    
+    aliases = ['db%d' % (i + 1) for i in range(databases)]
+    before = ShardMap(aliases, schema_format='tenant_%s')
+    after = ShardMap(aliases + ['db%d' % (databases + 1)],
+            schema_format='tenant_%s')
+    measure('locate', lambda: before.locate(12345))
+    
+    counts = dict((alias, 0) for alias in aliases)
+    moved = 0
+    for key in range(tenants):
+        alias = before.locate(key)[0]
+        counts[alias] += 1
+        if after.locate(key)[0] != alias:
+            moved += 1
+    print('tenants per database: min %d, max %d (ideal %d)' % (
+            min(counts.values()), max(counts.values()),
+            tenants // databases))
+    print('moved after adding a database: %.1f%% (ideal %.1f%%)' % (
+            100.0 * moved / tenants, 100.0 / (databases + 1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,3 +5,5 @@ supports multiple schemas and migrations for PostgreSQL.
 
 __license__ = 'GNU General Public License v3.0'
 __version__ = '0.2.0'
+
+default_app_config = 'django_schemas.apps.DjangoSchemasConfig'
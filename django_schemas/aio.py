@@ -0,0 +1,53 @@
+"""
+Schema routing for coroutines, eg. async views.
+
+`using_schema`, the router and the database wrappers keep their state
+per asyncio task, so coroutines on different schemas can run at once
+on one loop. The ORM itself blocks, and has to run in a thread, which
+wouldn't see the task's schema on its own. `run_sync` and
+`sync_to_async` run it in the loop's executor under the state of the
+coroutine that awaits them::
+
+    async def view(request):
+        with using_schema('db1', 'schema1', 'sample_environment'):
+            users = await run_sync(list, SampleUser.objects.all())
+
+Tasks started from a coroutine, eg. by `asyncio.gather()`, start with
+a copy of its schema from Python 3.7, like any context variable. Below
+3.7 they start with the schema of the thread running the loop instead,
+so enter `using_schema` again in each of them.
+
+Needs Python 3.4 or later.
+"""
+
+import asyncio
+import functools
+
+from .context import capture, run_with
+
+
+def run_sync(func, *args, **kwargs):
+    """Run a blocking function in a thread, under the current schema.
+
+    The schema, routing and replica state of the calling context are
+    carried over to the thread for the call, and the thread gets its
+    own back afterwards.
+
+    Args:
+        func (callable): Called with the remaining arguments.
+
+    Returns:
+        asyncio.Future: Resolves to whatever the function returns.
+
+    """
+    loop = asyncio.get_event_loop()
+    call = functools.partial(run_with, capture(), func, *args, **kwargs)
+    return loop.run_in_executor(None, call)
+
+
+def sync_to_async(func):
+    """Make a blocking function awaitable with `run_sync`."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_sync(func, *args, **kwargs)
+    return wrapper
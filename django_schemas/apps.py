@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+from .topology import rebuild_topology
+
+
+class DjangoSchemasConfig(AppConfig):
+    name = 'django_schemas'
+    verbose_name = 'Django Schemas'
+    
+    def ready(self):
+        """Work out the database topology before the first query."""
+        rebuild_topology()
@@ -0,0 +1,33 @@
+"""
+SQL compilers of the database wrappers.
+
+Clones point to the clones of their foreign key targets by label until
+those are built, see `django_schemas.fields`. `select_related()` reads
+the target of each relation it follows before joining it, so these
+compilers build the targets it's about to follow first.
+"""
+
+from django.db.models.sql import compiler
+from django.db.models.sql.compiler import (
+        SQLAggregateCompiler, SQLDeleteCompiler, SQLInsertCompiler,
+        SQLUpdateCompiler)
+
+
+class SQLCompiler(compiler.SQLCompiler):
+    """Builds the targets that `select_related()` follows."""
+
+    def get_related_selections(self, select, opts=None, root_alias=None,
+            cur_depth=1, requested=None, restricted=None):
+        query = self.query
+        names = requested
+        if names is None:
+            names = query.select_related
+        named = isinstance(names, dict)
+        if named or cur_depth <= query.max_depth:
+            for field in (opts or query.get_meta()).fields:
+                if not hasattr(field, 'is_resolved') or field.is_resolved():
+                    continue
+                if field.name in names if named else not field.null:
+                    field.resolve_related_model()
+        return super(SQLCompiler, self).get_related_selections(
+                select, opts, root_alias, cur_depth, requested, restricted)
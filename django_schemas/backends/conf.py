@@ -1,24 +1,121 @@
+"""
+Schema the database wrappers point their connections to.
 
+Migrations and code serving a tenant pick a schema with
+`django_schemas.routers.using_schema`, and the wrappers set the
+`search_path` of each cursor to it. The choice is local to the current
+thread or asyncio task, so one process can serve different schemas at
+once.
 
-SCHEMA_NAME = None
-"""Force a schema name when using a database.
-
-Hacky solution to not finding a place to inject a schema name
-into migrations.
+The `SCHEMA_NAME`, `ENVIRONMENT_NAME` and `ADDITIONAL_SCHEMAS` globals
+this module used to have read the state of the current context now.
+Assigning them is deprecated, and only changes the current context.
 """
 
-ADDITIONAL_SCHEMAS = []
-"""When forcing a schema, include additional search schemas.
+import collections
+import sys
+import types
+import warnings
 
-Adds to the hacky solution of migrating across multiple schemas. This
-allows the current schema to access resources from other schemas, for
-example Postgis on the 'public' schema will need to be accessible for
-geospacial columns, indexes, etc.
-"""
+from ..context import ContextLocal
+from ..topology import get_topology
+
+
+class SchemaState(collections.namedtuple('SchemaState', [
+        'db_name', 'schema_name', 'environment_name',
+        'additional_schemas'])):
+    """Schema chosen for the current context.
+
+    Attributes:
+        db_name (str): Alias of the only database whose connections,
+            and those of its replicas, use the schema, or None for every
+            database.
+        schema_name (str): Schema to point connections to, or None for
+            their default `search_path`.
+        environment_name (str): Environment whose models may migrate.
+        additional_schemas (tuple): Schemas searched after it, eg.
+            'public' for PostGIS.
+
+    """
+
+    __slots__ = ()
+
+
+DEFAULT_STATE = SchemaState(None, None, None, ())
+
+
+UNKNOWN_PATH = object()
+"""Stands for a `search_path` that may or may not have been rolled back."""
+
+
+_STATE = ContextLocal('django_schemas_schema', default=DEFAULT_STATE)
+
+
+def get_state(alias=None):
+    """Respond with the SchemaState of the current context.
+
+    Args:
+        alias (Optional[str]): Database whose connections the state is
+            for. The default state stands in for databases the current
+            state doesn't cover.
+
+    Returns:
+        SchemaState
+
+    """
+    state = _STATE.get()
+    if alias is None or not state.db_name or state.db_name == alias:
+        return state
+    if alias in get_topology().replicas.get(state.db_name, ()):
+        return state
+    return DEFAULT_STATE
+
+
+def set_state(state):
+    """Replace the SchemaState of the current context.
+
+    Returns:
+        The SchemaState it replaced.
+
+    """
+    previous = _STATE.get()
+    _STATE.set(state)
+    return previous
+
+
+_LEGACY_FIELDS = {
+    'SCHEMA_NAME': 'schema_name',
+    'ENVIRONMENT_NAME': 'environment_name',
+    'ADDITIONAL_SCHEMAS': 'additional_schemas',
+}
+"""SchemaState fields behind the globals this module used to have."""
+
+
+class _ConfModule(types.ModuleType):
+    """This module, with its old globals read from the current context."""
+
+    def __getattr__(self, name):
+        if name not in _LEGACY_FIELDS:
+            raise AttributeError(name)
+        value = getattr(_STATE.get(), _LEGACY_FIELDS[name])
+        if name == 'ADDITIONAL_SCHEMAS':
+            value = list(value)
+        return value
+
+    def __setattr__(self, name, value):
+        if name not in _LEGACY_FIELDS:
+            return super(_ConfModule, self).__setattr__(name, value)
+        warnings.warn(
+                'Setting conf.%s is deprecated, and only applies to the '
+                'current context. Use routers.using_schema() instead.' % name,
+                DeprecationWarning, stacklevel=2)
+        if name == 'ADDITIONAL_SCHEMAS':
+            value = tuple(value or ())
+        _STATE.set(_STATE.get()._replace(**{_LEGACY_FIELDS[name]: value}))
 
-ENVIRONMENT_NAME = None
-"""Force an environment name when using a database.
 
-Hacky solution to not finding a place to route migrations to their
-appropriate schemas.
-"""
\ No newline at end of file
+# Python 2 empties the globals of modules it frees, so keep this one
+_module = _ConfModule(__name__, __doc__)
+_module.__dict__.update(globals())
+_module._original = sys.modules[__name__]
+sys.modules[__name__] = _module
@@ -0,0 +1,376 @@
+"""
+Connections kept open between requests, shared by every thread.
+
+A database entry with `POOL_MAX` set hands its wrappers connections from
+a pool, rather than opening one for each request::
+
+    'db1': {
+        ...
+        'POOL_MIN': 2,        # Opened up front, 0 by default
+        'POOL_MAX': 20,       # Open at most, off by default
+        'POOL_TIMEOUT': 5,    # Seconds to wait for one, 10 by default
+    },
+
+Connections that sat idle for a while are pinged before they're handed
+out, and replaced if they don't answer. Connections handed back are
+rolled back, if they're in a transaction, and put back on their default
+`search_path` and session settings. `pool_stats` reports how busy each
+pool is, and how long checkouts waited.
+
+With `'POOL_SCHEMA_AFFINITY': True`, connections keep the `search_path`
+and settings of their last schema instead. Checkouts take an idle
+connection on the schema they want if there is one, or a new one while
+the pool has room, or else the one idle the longest, so busy tenants
+keep connections whose server caches are warm for their tables. When
+the schema changes outside of a transaction, and an idle connection is
+on the new one, the wrappers swap theirs for it rather than point
+theirs elsewhere. They keep their connection while any cursor from it
+is open. Session state other than the schema and settings, eg.
+advisory locks, temporary tables and `LISTEN`, doesn't follow a swap,
+so hold it in a transaction, or leave schema affinity off. `pool_stats`
+reports how often the schema was a hit.
+
+Each alias has one pool, made from the settings of the first wrapper
+that asks for it. A wrapper of the same alias with other connection or
+pool settings replaces it, and the connections of the old one are
+closed as they're handed back.
+"""
+
+import logging
+import threading
+import time
+
+from django.core.signals import setting_changed
+from django.db import OperationalError
+from django.dispatch import receiver
+from psycopg2 import extensions
+
+from . import conf, usage
+
+
+logger = logging.getLogger(__name__)
+
+
+PING_AFTER = 5
+"""Seconds a connection may sit idle before it's pinged on checkout."""
+
+
+_POOLS = {}
+"""ConnectionPool of each pooled database, keyed by alias."""
+
+
+_POOL_SETTINGS = (
+        'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT', 'OPTIONS',
+        'POOL_MIN', 'POOL_MAX', 'POOL_TIMEOUT', 'POOL_SCHEMA_AFFINITY')
+"""Settings that a database's wrappers must agree on to share a pool."""
+
+
+_LOCK = threading.Lock()
+
+
+class ConnectionPool(object):
+    """Connections to one database, for any thread to check out.
+
+    Args:
+        alias (str): Database the connections are to.
+        min_size (Optional[int]): Connections to open up front.
+        max_size (int): Connections to keep open at most.
+        timeout (Optional[float]): Seconds to wait for a connection
+            when all of them are checked out.
+        schema_affinity (Optional[bool]): Whether to keep connections
+            on their schema, and hand them out by it.
+
+    """
+
+    def __init__(self, alias, min_size=0, max_size=10, timeout=10,
+            schema_affinity=False):
+        self.alias = alias
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.schema_affinity = schema_affinity
+        self.size = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.schema_hits = 0
+        self.schema_misses = 0
+        self.closed = False
+        self.settings = None
+        self._idle = []
+        self._condition = threading.Condition()
+
+    def checkout(self, connect, session=None):
+        """Hand out an open connection.
+
+        Args:
+            connect (callable): Opens a new connection, when the pool
+                has room for one and none are idle.
+            session (Optional): The `search_path` and settings wanted,
+                to pick a connection by under schema affinity.
+
+        Returns:
+            Tuple of the connection and the session it's on, None for
+            its defaults.
+
+        Raises:
+            OperationalError: If none was handed back within the timeout.
+
+        """
+        started = time.time()
+        waited = False
+        while True:
+            with self._condition:
+                while not self._idle and self.size >= self.max_size:
+                    remaining = self.timeout - (time.time() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise OperationalError(
+                                "no connection to %s free after %ss" % (
+                                        self.alias, self.timeout))
+                    waited = True
+                    self._condition.wait(remaining)
+                index = self._pick(session)
+                if index is not None:
+                    connection, idle_since, path = self._idle.pop(index)
+                else:
+                    connection = idle_since = path = None
+                    self.size += 1
+            if connection is None:
+                connection = self._open(connect)
+                self._fill(connect)
+            elif not self._is_usable(connection, idle_since):
+                self.discard(connection)
+                continue
+            break
+
+        # Count how long it took only once it's handed out
+        wait = time.time() - started
+        with self._condition:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += wait
+                self.max_wait = max(self.max_wait, wait)
+            if self.schema_affinity:
+                if path == session:
+                    self.schema_hits += 1
+                else:
+                    self.schema_misses += 1
+        return connection, path
+
+    def checkin(self, connection, session=None,
+            reset_sql="SET search_path TO DEFAULT"):
+        """Take back a connection handed out by `checkout`.
+
+        Args:
+            connection: The connection.
+            session (Optional): The `search_path` and settings it's on,
+                if it was pointed to a schema, or conf.UNKNOWN_PATH.
+            reset_sql (Optional[str]): Puts it back on its defaults.
+
+        """
+        reset = session is not None and (
+                not self.schema_affinity or session is conf.UNKNOWN_PATH)
+        try:
+            if connection.closed:
+                raise OperationalError("connection closed")
+            if (connection.get_transaction_status() !=
+                    extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+            if reset and reset_sql:
+                cursor = connection.cursor()
+                cursor.execute(reset_sql)
+                cursor.close()
+                if not connection.autocommit:
+                    connection.commit()
+            if reset:
+                session = None
+        except Exception:
+            self.discard(connection)
+            return
+        with self._condition:
+            if not self.closed:
+                self._idle.append((connection, time.time(), session))
+                self._condition.notify()
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        """Close a connection handed out, and make room for another."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        usage.connection_closed(self.alias)
+        with self._condition:
+            self.size -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Close the idle connections, and those handed back later."""
+        with self._condition:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for connection, idle_since, session in idle:
+            self.discard(connection)
+
+    def has_idle(self, session):
+        """Whether an idle connection is on a session already.
+
+        Args:
+            session (Optional): The `search_path` and settings wanted,
+                None for their defaults.
+
+        """
+        with self._condition:
+            return any(path == session for connection, idle_since, path in
+                    self._idle)
+
+    def stats(self):
+        """Respond with how busy the pool is, and how long it made wait.
+
+        Returns:
+            Dict of `size`, `idle`, `in_use`, `max_size`, `utilization`
+            as a share of `max_size` in use, `checkouts`, how many of
+            them `waits` for a connection to be handed back, how long
+            in `wait_time` and `max_wait` seconds, and the `timeouts` of
+            checkouts that gave up. Under schema affinity, also the
+            `schema_hits` that found a connection on their schema, the
+            `schema_misses` that didn't, and the `hit_rate`.
+
+        """
+        with self._condition:
+            in_use = self.size - len(self._idle)
+            lookups = self.schema_hits + self.schema_misses
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'max_size': self.max_size,
+                'utilization': float(in_use) / self.max_size,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'max_wait': self.max_wait,
+                'timeouts': self.timeouts,
+                'schema_hits': self.schema_hits,
+                'schema_misses': self.schema_misses,
+                'hit_rate': (
+                        float(self.schema_hits) / lookups if lookups else 0.0),
+            }
+
+    def _pick(self, session):
+        """
+        Respond with the index of the idle connection to hand out, or
+        None to open a new one.
+        """
+        if not self._idle:
+            return None
+        if not self.schema_affinity:
+            return -1
+
+        # The last used on the schema, or a new one while there's room,
+        # or else the least recently used
+        for index in range(len(self._idle) - 1, -1, -1):
+            if self._idle[index][2] == session:
+                return index
+        if self.size < self.max_size:
+            return None
+        return 0
+
+    def _open(self, connect):
+        """Open a connection the pool already made room for."""
+        try:
+            return connect()
+        except Exception:
+            with self._condition:
+                self.size -= 1
+                self._condition.notify()
+            raise
+
+    def _fill(self, connect):
+        """Open idle connections up to the minimum size, if it can."""
+        while True:
+            with self._condition:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+
+            # The checkout that got here has its connection already
+            try:
+                connection = self._open(connect)
+            except Exception:
+                logger.warning('Could not fill the pool of %s', self.alias,
+                        exc_info=True)
+                return
+            with self._condition:
+                self._idle.insert(0, (connection, time.time(), None))
+                self._condition.notify()
+
+    def _is_usable(self, connection, idle_since):
+        """Whether an idle connection still works."""
+        if connection.closed:
+            return False
+        if time.time() - idle_since < PING_AFTER:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            if not connection.autocommit:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+
+def get_pool(alias, settings_dict):
+    """Respond with the pool of a database, or None if it has none.
+
+    A pool made from other settings for the alias is closed, and
+    replaced with one made from these.
+    """
+    if not settings_dict.get('POOL_MAX'):
+        return None
+    settings = tuple(settings_dict.get(name) for name in _POOL_SETTINGS)
+    pool = _POOLS.get(alias)
+    if pool is not None and pool.settings == settings:
+        return pool
+    with _LOCK:
+        stale = pool = _POOLS.get(alias)
+        if pool is None or pool.settings != settings:
+            pool = _POOLS[alias] = ConnectionPool(
+                    alias,
+                    min_size=settings_dict.get('POOL_MIN', 0),
+                    max_size=settings_dict['POOL_MAX'],
+                    timeout=settings_dict.get('POOL_TIMEOUT', 10),
+                    schema_affinity=settings_dict.get(
+                            'POOL_SCHEMA_AFFINITY', False))
+            pool.settings = settings
+    if stale is not None and stale is not pool:
+        stale.close()
+    return pool
+
+
+def pool_stats():
+    """Respond with the `ConnectionPool.stats` of each database."""
+    return dict((alias, pool.stats()) for alias, pool in list(_POOLS.items()))
+
+
+def close_pools():
+    """Close the idle connections of every pool, and forget the pools."""
+    with _LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+@receiver(setting_changed)
+def _close_pools(setting, **kwargs):
+    """Make pools again when DATABASES changes."""
+    if setting == 'DATABASES':
+        close_pools()
@@ -0,0 +1,124 @@
+"""
+Schema-qualified SQL, for databases behind a transaction pooler.
+
+A database entry with `'SCHEMA_QUALIFIED': True` doesn't point its
+connections to a schema with `SET search_path`, which would outlive the
+transaction and leak to other clients of a pooler like PgBouncer in
+transaction mode. Its compilers name the tables of models with an
+environment as `"schema"."table"` instead, with the schema of the
+current context, see `django_schemas.routers.using_schema`.
+
+Cursors opened inside a transaction still get a `SET LOCAL search_path`,
+which ends with it, for SQL that doesn't go through a compiler, eg.
+migrations. `django_schemas.migrations.migrate` runs in one transaction
+on these databases for that reason. Raw SQL outside of a transaction
+has to name its schema itself.
+
+Queries on the tables of schema models outside of any schema raise
+`ConfigError`, rather than fall through to the `public` schema.
+"""
+
+from django.apps import apps
+from django.core.signals import setting_changed
+from django.db.models.signals import class_prepared
+from django.dispatch import receiver
+
+from . import conf
+from ..exceptions import ConfigError
+from ..query import SchemaCompilerMixin
+
+
+_COMPILER_CLASSES = {}
+"""Qualifying subclasses of compiler classes, keyed by base class."""
+
+
+_OPERATIONS_CLASSES = {}
+"""Qualifying subclasses of operations classes, keyed by base class."""
+
+
+_SCHEMA_TABLES = None
+"""Tables of models that live in a schema, made on first use."""
+
+
+def _is_schema_model(model):
+    """Whether a model's table is named after the current schema."""
+    opts = model._meta
+    return (getattr(opts, 'db_environment', None)
+            and '"."' not in opts.db_table)
+
+
+def get_schema_tables():
+    """Respond with the tables that the current schema applies to.
+
+    Those are the tables of models with an environment, other than
+    the ones named after a schema already, eg. clones and models of
+    environments with a `SCHEMA_NAME`.
+    """
+    global _SCHEMA_TABLES
+    tables = _SCHEMA_TABLES
+    if tables is None:
+        tables = _SCHEMA_TABLES = frozenset(
+                model._meta.db_table
+                for model in apps.get_models(include_auto_created=True)
+                if _is_schema_model(model))
+    return tables
+
+
+@receiver(class_prepared)
+def _clear_schema_tables_for_model(sender, **kwargs):
+    """Work the schema tables out again once a schema model is added.
+
+    Clones are named after their schema already, and leave them alone.
+    """
+    global _SCHEMA_TABLES
+    if _is_schema_model(sender):
+        _SCHEMA_TABLES = None
+
+
+@receiver(setting_changed)
+def _clear_schema_tables(setting, **kwargs):
+    """Work the schema tables out again when environments change."""
+    global _SCHEMA_TABLES
+    if setting == 'DATABASE_ENVIRONMENTS':
+        _SCHEMA_TABLES = None
+
+
+class QualifiedCompilerMixin(SchemaCompilerMixin):
+    """
+    Qualifies the tables of schema models with the schema of the
+    current context, or of the query, for `in_schema`.
+    """
+
+    def get_table_schema(self, table):
+        schema = getattr(self.query, 'schema_name', None)
+        if schema:
+            return schema
+        if table not in get_schema_tables():
+            return None
+        schema = conf.get_state(self.connection.alias).schema_name
+        if not schema:
+            raise ConfigError("%s needs a schema on %s, see using_schema" % (
+                    table, self.connection.alias))
+        return schema
+
+
+class QualifiedOperationsMixin(object):
+    """Operations whose compilers qualify tables."""
+
+    def compiler(self, compiler_name):
+        base = super(QualifiedOperationsMixin, self).compiler(compiler_name)
+        if base not in _COMPILER_CLASSES:
+            _COMPILER_CLASSES[base] = type(
+                    'Qualified' + base.__name__,
+                    (QualifiedCompilerMixin, base), {})
+        return _COMPILER_CLASSES[base]
+
+
+def qualify(wrapper):
+    """Make a database wrapper's compilers qualify tables, in place."""
+    base = wrapper.ops.__class__
+    if base not in _OPERATIONS_CLASSES:
+        _OPERATIONS_CLASSES[base] = type(
+                'Qualified' + base.__name__,
+                (QualifiedOperationsMixin, base), {})
+    wrapper.ops.__class__ = _OPERATIONS_CLASSES[base]
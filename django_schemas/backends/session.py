@@ -0,0 +1,155 @@
+"""
+Session settings for the connections of each environment and database.
+
+Entries of `DATABASE_ENVIRONMENTS` and `DATABASES` can both list server
+settings for their connections::
+
+    DATABASE_ENVIRONMENTS = {
+        'reporting': {
+            'SESSION_SETTINGS': {'work_mem': '256MB'},
+        },
+        'oltp': {
+            'SESSION_SETTINGS': {
+                'statement_timeout': '2s',
+                'lock_timeout': '500ms',
+            },
+        },
+    }
+
+Connections get the settings of their database, and those of the
+environment of the current context, see
+`django_schemas.routers.using_schema`. The database's win where both
+set one, so that eg. replicas stay read only. The wrappers send them
+along with the `search_path`, in the same round trip, and only when
+they change. Each connection remembers the names of the settings it was
+given, to put them back to their defaults when a rollback may have
+undone what it knows.
+
+`SCHEMA_QUALIFIED` databases can't have session settings, from
+themselves or their environments. They'd only be set inside
+transactions, so most queries would run without them. Settings that
+every connection needs can go in the connection's `OPTIONS`, eg.
+`{'options': '-c default_transaction_read_only=on'}`.
+"""
+
+import re
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import six
+
+from . import conf
+from ..exceptions import ConfigError
+from ..utils import get_setting
+
+
+_SESSIONS = {}
+"""
+Memoized `get_session` results, keyed by alias and environment, along
+with the database entry they were read from.
+"""
+
+
+_NAME = re.compile(r'^[a-z_][a-z0-9_.]*$')
+
+
+def get_session(alias, settings_dict, environment):
+    """Respond with the settings of a database's connections.
+
+    Args:
+        alias (str): Alias of the database.
+        settings_dict (dict): Its entry in `DATABASES`.
+        environment (Optional[str]): Environment of the current context.
+
+    Returns:
+        Tuple of (name, value) pairs sorted by name, or None if there
+        are none.
+
+    Raises:
+        ConfigError: If a setting's name isn't one.
+
+    """
+    key = (alias, environment)
+    memo = _SESSIONS.get(key)
+    if memo is not None and memo[0] is settings_dict:
+        return memo[1]
+    session = {}
+    if environment:
+        env_settings = get_setting('DATABASE_ENVIRONMENTS', {}).get(
+                environment) or {}
+        session.update(env_settings.get('SESSION_SETTINGS') or {})
+    session.update(settings_dict.get('SESSION_SETTINGS') or {})
+    for name in session:
+        if not _NAME.match(name):
+            raise ConfigError(name + " isn't a session setting")
+    session = tuple(sorted(
+            (name, six.text_type(value))
+            for name, value in session.items())) or None
+    _SESSIONS[key] = (settings_dict, session)
+    return session
+
+
+def check_session(alias, settings_dict):
+    """Make sure a schema-qualified database has no session settings.
+
+    Raises:
+        ConfigError: If it, or any of its environments, has some.
+
+    """
+    if not settings_dict.get('SCHEMA_QUALIFIED'):
+        return
+    sources = [alias] if settings_dict.get('SESSION_SETTINGS') else []
+    environments = get_setting('DATABASE_ENVIRONMENTS', {})
+    for environment in settings_dict.get('ENVIRONMENTS') or ():
+        env_settings = environments.get(environment) or {}
+        if env_settings.get('SESSION_SETTINGS'):
+            sources.append(environment)
+    if sources:
+        raise ConfigError(
+                "%s is SCHEMA_QUALIFIED, and can't have the SESSION_SETTINGS "
+                "of %s" % (alias, ', '.join(sources)))
+
+
+def get_session_names(session):
+    """Respond with the names of the settings of a session."""
+    if not session or session is conf.UNKNOWN_PATH:
+        return frozenset()
+    return frozenset(name for name, value in session)
+
+
+def get_session_sql(command, previous, session, names=()):
+    """Respond with the statements that change one session to another.
+
+    Args:
+        command (str): "SET", or "SET LOCAL".
+        previous: Session the connection has, or conf.UNKNOWN_PATH.
+        session: Session it should have.
+        names (Optional[iterable]): Every setting it may have, to go
+            back to the default of when the previous session isn't
+            known.
+
+    Returns:
+        List of statements.
+
+    """
+    if previous is conf.UNKNOWN_PATH:
+        previous = dict((name, None) for name in names)
+    else:
+        previous = dict(previous or ())
+    session = dict(session or ())
+    statements = []
+    for name in sorted(previous):
+        if name not in session:
+            statements.append("%s %s TO DEFAULT" % (command, name))
+    for name, value in sorted(session.items()):
+        if previous.get(name) != value:
+            statements.append("%s %s = '%s'" % (
+                    command, name, value.replace("'", "''")))
+    return statements
+
+
+@receiver(setting_changed)
+def _clear_sessions(setting, **kwargs):
+    """Read the settings again when they change."""
+    if setting in ('DATABASES', 'DATABASE_ENVIRONMENTS'):
+        _SESSIONS.clear()
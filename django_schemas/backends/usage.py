@@ -0,0 +1,104 @@
+"""
+Use of each database, counted by the backend wrappers.
+
+Both wrappers hand out cursors that count each `execute` while it runs,
+so that routing can prefer the replica with the fewest queries waiting
+on it. They also count the connections they hold open. Counts are per
+process, and cover every thread in it. Queries that lose their
+connection are reported to `django_schemas.health`.
+
+The wrappers also count the cursors that found their connection on the
+right `search_path` already, each of which saved a round trip.
+"""
+
+import collections
+import threading
+
+from django.db import OperationalError
+from django.db.backends import utils
+
+from .. import health
+
+
+_OUTSTANDING = collections.defaultdict(int)
+"""Queries running right now, keyed by database alias."""
+
+
+_OPEN = collections.defaultdict(int)
+"""Connections open right now, keyed by database alias."""
+
+
+_SAVED = collections.defaultdict(int)
+"""Round trips saved by skipping a `SET search_path`, keyed by alias."""
+
+
+_LOCK = threading.Lock()
+
+
+def outstanding(alias):
+    """Respond with the number of queries running on a database."""
+    return _OUTSTANDING.get(alias, 0)
+
+
+def open_connections():
+    """Respond with the number of open connections to each database."""
+    with _LOCK:
+        return dict((alias, count) for alias, count in _OPEN.items() if count)
+
+
+def connection_opened(alias):
+    """Count a connection the wrapper of a database opened."""
+    with _LOCK:
+        _OPEN[alias] += 1
+
+
+def connection_closed(alias):
+    """Count a connection the wrapper of a database closed."""
+    with _LOCK:
+        _OPEN[alias] -= 1
+
+
+def round_trip_saved(alias):
+    """Count a `SET search_path` the wrapper of a database skipped."""
+    with _LOCK:
+        _SAVED[alias] += 1
+
+
+def round_trips_saved():
+    """Respond with the round trips each database was saved."""
+    with _LOCK:
+        return dict(_SAVED)
+
+
+class UsageCursorMixin(object):
+    """Counts the queries of a cursor while they run."""
+
+    def _track(self, method, *args):
+        alias = self.db.alias
+        with _LOCK:
+            _OUTSTANDING[alias] += 1
+        try:
+            return method(*args)
+        except OperationalError:
+            if getattr(self.db.connection, 'closed', True):
+                health.record_failure(alias)
+            raise
+        finally:
+            with _LOCK:
+                _OUTSTANDING[alias] -= 1
+
+    def execute(self, sql, params=None):
+        return self._track(
+                super(UsageCursorMixin, self).execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._track(
+                super(UsageCursorMixin, self).executemany, sql, param_list)
+
+
+class UsageCursorWrapper(UsageCursorMixin, utils.CursorWrapper):
+    pass
+
+
+class UsageCursorDebugWrapper(UsageCursorMixin, utils.CursorDebugWrapper):
+    pass
@@ -0,0 +1,243 @@
+"""
+Schema handling shared by the database wrappers.
+
+The PostgreSQL and PostGIS wrappers only differ in the Django wrapper
+they extend, and mix this in front of it. It points connections to the
+schema and session settings of the current context, see
+`django_schemas.backends.session`, hands them out of and back to their
+database's pool, see `django_schemas.backends.pool`, and qualifies
+tables on `SCHEMA_QUALIFIED` databases, see
+`django_schemas.backends.qualified`.
+"""
+
+import weakref
+
+from django_schemas import health
+from django_schemas.utils import quote_schema
+from . import compiler, conf, pool, qualified, session, usage
+
+
+class SchemaWrapperMixin(object):
+    """Points the connections of a PostgreSQL wrapper to their schema."""
+
+    schema_search_path = None
+    """
+    The `search_path` set for a schema, if any, or conf.UNKNOWN_PATH
+    when a rollback may have undone it.
+    """
+
+    session_settings = None
+    """
+    The `SESSION_SETTINGS` set, as (name, value) pairs, if any, or
+    conf.UNKNOWN_PATH when a rollback may have undone them.
+    """
+
+    session_names = frozenset()
+    """
+    Names of the settings the connection may have been given, to put
+    back to their defaults when they're unknown.
+    """
+
+    session_changed = False
+    """
+    Whether a `search_path` or session settings were sent since the
+    transaction began, so that a rollback may undo them.
+    """
+
+    schema_qualified = False
+    """
+    Whether the database's `SCHEMA_QUALIFIED` is set, and its tables
+    are named after their schema rather than searched for.
+    """
+
+    pool = None
+    """The ConnectionPool the current connection came from, if any."""
+
+    open_cursors = ()
+    """The cursors of the current connection, while they're referenced."""
+
+    def __init__(self, *args, **kwargs):
+        super(SchemaWrapperMixin, self).__init__(*args, **kwargs)
+        self.ops.compiler_module = compiler.__name__
+        session.check_session(self.alias, self.settings_dict)
+        if self.settings_dict.get('SCHEMA_QUALIFIED'):
+            self.schema_qualified = True
+            qualified.qualify(self)
+
+    def get_new_connection(self, conn_params):
+        """Connection from the pool of the database, if it has one."""
+        self.pool = pool.get_pool(self.alias, self.settings_dict)
+        self.schema_search_path = self.session_settings = None
+        self.session_names = frozenset()
+        self.session_changed = False
+        self.open_cursors = weakref.WeakSet()
+        if self.pool is not None:
+            wanted = self._get_session()
+            connection, current = self.pool.checkout(
+                    lambda: self._connect(conn_params),
+                    wanted if wanted != (None, None) else None)
+            if current is not None:
+                self.schema_search_path, self.session_settings = current
+                self.session_names = session.get_session_names(current[1])
+        else:
+            connection = self._connect(conn_params)
+        return connection
+
+    def _connect(self, conn_params):
+        """Connection that reports to replica health whether it worked."""
+        try:
+            connection = super(SchemaWrapperMixin, self).get_new_connection(
+                    conn_params)
+        except self.Database.Error:
+            health.record_failure(self.alias)
+            raise
+        health.record_success(self.alias)
+        usage.connection_opened(self.alias)
+        return connection
+
+    def _close(self):
+        """Close the connection, or hand it back to its pool."""
+        if self.pool is not None and self.connection is not None:
+
+            # Django keeps hold of connections closed in a transaction
+            if self.in_atomic_block:
+                self.pool.discard(self.connection)
+            else:
+                current = (self.schema_search_path, self.session_settings)
+                if current == (None, None):
+                    current = None
+                elif conf.UNKNOWN_PATH in current:
+                    current = conf.UNKNOWN_PATH
+                self.pool.checkin(
+                        self.connection, current,
+                        "; ".join(self._get_session_sql("SET", (None, None))))
+            self.pool = None
+            return
+        try:
+            return super(SchemaWrapperMixin, self)._close()
+        finally:
+            usage.connection_closed(self.alias)
+
+    def _commit(self):
+        """Commit, which ends any `SET LOCAL search_path`."""
+        if self.schema_qualified:
+            self.schema_search_path = self.session_settings = None
+        self.session_changed = False
+        return super(SchemaWrapperMixin, self)._commit()
+
+    def _rollback(self):
+        """Roll back, and with it any `search_path` set since BEGIN."""
+        if self.schema_qualified:
+            self.schema_search_path = self.session_settings = None
+        elif self.session_changed:
+            self.schema_search_path = conf.UNKNOWN_PATH
+            self.session_settings = conf.UNKNOWN_PATH
+        self.session_changed = False
+        return super(SchemaWrapperMixin, self)._rollback()
+
+    def _savepoint_rollback(self, sid):
+        """Roll back to a savepoint, maybe undoing a `search_path`."""
+        if self.session_changed:
+            self.schema_search_path = conf.UNKNOWN_PATH
+            self.session_settings = conf.UNKNOWN_PATH
+        return super(SchemaWrapperMixin, self)._savepoint_rollback(sid)
+
+    def _cursor(self):
+        """Database cursor to write whatever we want. 
+
+        Points the connection to the schema of the current context, if
+        any, or back to its default `search_path`, and gives it the
+        `SESSION_SETTINGS` of its database and environment, see
+        `django_schemas.backends.session`. Connections remember what
+        they were given, and only send what changed, in one round trip.
+        Schemas are made by `migrations.create_schema`.
+
+        Schema-qualified databases only get a `SET LOCAL`, and only in
+        transactions, see `django_schemas.backends.qualified`. Pools
+        with schema affinity hand out a connection on the schema
+        instead, if they have one idle, and there's no transaction or
+        open cursor to keep.
+        """
+        wanted = self._get_session()
+        if self._should_swap(wanted):
+            self.close()
+        cursor = super(SchemaWrapperMixin, self)._cursor()
+        self.open_cursors.add(cursor)
+
+        # Qualified SQL needs no session state to find its tables
+        if self.schema_qualified and not self.in_atomic_block:
+            return cursor
+
+        # Most cursors find the connection where they want it
+        statements = self._get_session_sql(
+                "SET LOCAL" if self.schema_qualified else "SET", wanted)
+        if statements:
+            cursor.execute("; ".join(statements))
+
+            # Settings given in a transaction may outlive a rollback
+            names = session.get_session_names(wanted[1])
+            if not self.autocommit:
+                self.session_changed = True
+                names |= self.session_names
+            self.session_names = names
+        elif wanted[0]:
+            usage.round_trip_saved(self.alias)
+        self.schema_search_path, self.session_settings = wanted
+        return cursor
+
+    def _should_swap(self, wanted):
+        """
+        Whether to hand the connection back for one of the pool's on
+        the wanted session, rather than point it there.
+        """
+        if (self.pool is None or not self.pool.schema_affinity
+                or self.connection is None or self.schema_qualified
+                or not self.autocommit or self.in_atomic_block):
+            return False
+        if wanted == (self.schema_search_path, self.session_settings):
+            return False
+
+        # Cursors still open would carry on with another thread's
+        if any(not cursor.closed for cursor in self.open_cursors):
+            return False
+        return self.pool.has_idle(wanted if wanted != (None, None) else None)
+
+    def _get_session(self):
+        """
+        Respond with the `search_path` and session settings of the
+        current context, None for their defaults.
+        """
+        state = conf.get_state(self.alias)
+        settings = session.get_session(
+                self.alias, self.settings_dict, state.environment_name)
+        if not state.schema_name:
+            return None, settings
+        search_path = ', '.join(quote_schema(schema) for schema in
+                (state.schema_name,) + tuple(state.additional_schemas))
+        return search_path, settings
+
+    def _get_session_sql(self, command, wanted):
+        """Respond with the statements that give the connection a session."""
+        search_path, settings = wanted
+        statements = []
+        if search_path != self.schema_search_path:
+
+            # Don't leave the schema of another context on the connection
+            if search_path:
+                statements.append(
+                        "%s search_path = %s" % (command, search_path))
+            else:
+                statements.append("%s search_path TO DEFAULT" % command)
+        if settings != self.session_settings:
+            statements.extend(session.get_session_sql(
+                    command, self.session_settings, settings,
+                    self.session_names))
+        return statements
+
+    def make_cursor(self, cursor):
+        """Cursor that counts its queries while they run."""
+        return usage.UsageCursorWrapper(cursor, self)
+
+    def make_debug_cursor(self, cursor):
+        """Logging cursor that counts its queries while they run."""
+        return usage.UsageCursorDebugWrapper(cursor, self)
\ No newline at end of file
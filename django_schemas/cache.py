@@ -0,0 +1,326 @@
+"""
+Bounded storage for cloned models.
+
+Each `set_db` call produces a model class that stays registered with
+Django for as long as the process lives. This module keeps those
+classes in a least recently used cache so that processes serving many
+schemas can put a ceiling on how many of them stay alive.
+"""
+
+import collections
+import threading
+import time
+
+
+class ModelCloneCache(object):
+    """Least recently used cache of cloned model classes.
+
+    Keys are `(db_name, schema_name, class_name)` tuples. Every clone
+    also remembers which other clones its related fields point to,
+    whether those are built yet or not, so evicting a clone takes its
+    dependents along with it. Otherwise a dependent would keep pointing
+    to a class that is no longer the one `set_db` hands out.
+
+    Clones can also be reached through aliases, which are any hashable
+    keys that are cheaper to build than the clone's own key. Aliases
+    made from another clone go when either clone is evicted, so they
+    never keep an evicted class alive.
+
+    The cache is safe to share between threads. When several threads
+    ask `build` for the same missing clone, only one of them creates it
+    and the others wait for its result.
+
+    Args:
+        max_size (Optional[int]): Most clones to hold at once. Unbounded
+            if None.
+        on_evict (Optional[callable]): Called with each evicted class.
+
+    """
+
+    def __init__(self, max_size=None, on_evict=None):
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.builds = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.lock = threading.RLock()
+        self._clones = collections.OrderedDict()
+        self._dependents = {}
+        self._related = {}
+        self._aliases = {}
+        self._aliases_by_key = {}
+        self._aliases_by_source = {}
+        self._alias_sources = {}
+        self._flights = {}
+        self._waiting = {}
+
+        # Python 2's OrderedDict has no move_to_end
+        self._touch = getattr(self._clones, 'move_to_end', None)
+        if self._touch is None:
+            self._touch = lambda key: self._clones.__setitem__(
+                    key, self._clones.pop(key))
+
+    def __contains__(self, key):
+        return key in self._clones
+
+    def __len__(self):
+        return len(self._clones)
+
+    def get(self, key):
+        """Find a clone and mark it as the most recently used.
+
+        Args:
+            key (tuple): Key of the clone.
+
+        Returns:
+            The cloned class, otherwise None.
+
+        """
+        with self.lock:
+            model_cls = self._clones.get(key)
+            if model_cls is None:
+                self.misses += 1
+                return None
+            self._touch(key)
+            self.hits += 1
+            return model_cls
+
+    def get_alias(self, alias):
+        """Find a clone by one of its aliases.
+
+        Misses aren't counted, since the caller is expected to fall
+        back on `get`.
+
+        Args:
+            alias (tuple): Alias of the clone.
+
+        Returns:
+            The cloned class, otherwise None.
+
+        """
+        with self.lock:
+            key = self._aliases.get(alias)
+            if key is None:
+                return None
+            self._touch(key)
+            self.hits += 1
+            return self._clones[key]
+
+    def alias(self, alias, key, source=None):
+        """Make a stored clone reachable through another key.
+
+        Args:
+            alias (tuple): Alias of the clone.
+            key (tuple): Key of the clone.
+            source (Optional[tuple]): Key of the clone the alias holds,
+                if any, which drops the alias when it's evicted.
+
+        """
+        with self.lock:
+            if key not in self._clones:
+                return
+            if source is not None and source not in self._clones:
+                return
+            self._drop_alias(alias)
+            self._aliases[alias] = key
+            self._aliases_by_key.setdefault(key, set()).add(alias)
+            if source is not None:
+                self._aliases_by_source.setdefault(source, set()).add(alias)
+                self._alias_sources[alias] = source
+
+    def clear_aliases(self):
+        """Forget every alias, leaving the clones in place."""
+        with self.lock:
+            self._aliases.clear()
+            self._aliases_by_key.clear()
+            self._aliases_by_source.clear()
+            self._alias_sources.clear()
+
+    def _drop_alias(self, alias):
+        """Forget an alias in both directions."""
+        key = self._aliases.pop(alias, None)
+        aliases = self._aliases_by_key.get(key)
+        if aliases is not None:
+            aliases.discard(alias)
+            if not aliases:
+                del self._aliases_by_key[key]
+        source = self._alias_sources.pop(alias, None)
+        aliases = self._aliases_by_source.get(source)
+        if aliases is not None:
+            aliases.discard(alias)
+            if not aliases:
+                del self._aliases_by_source[source]
+
+    def build(self, key, create):
+        """Return a clone, creating it once if it doesn't exist yet.
+
+        The first thread to ask for a missing key calls `create`, while
+        any other thread asking for the same key waits for its result.
+        The created clone is expected to store itself through `set`.
+
+        A thread never waits on a build that is, directly or through
+        other waiting threads, waiting on that same thread. It creates
+        the clone itself rather than deadlocking.
+
+        Args:
+            key (tuple): Key of the clone.
+            create (callable): Builds the clone when called without
+                arguments.
+
+        Returns:
+            The cloned class.
+
+        """
+        me = threading.current_thread()
+        with self.lock:
+            if key in self._clones:
+                return self._clones[key]
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight(me)
+                self._flights[key] = flight
+                leader = True
+            else:
+                leader = self._would_deadlock(flight, me)
+                if not leader:
+                    self._waiting[me] = flight
+                    self.waits += 1
+
+        # Somebody else is building it
+        if not leader:
+            started = time.time()
+            flight.done.wait()
+            with self.lock:
+                self._waiting.pop(me, None)
+                self.wait_time += time.time() - started
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        # Build it ourselves
+        try:
+            model_cls = create()
+        except Exception as e:
+            self._land(key, flight, me, error=e)
+            raise
+        self._land(key, flight, me, result=model_cls)
+        return model_cls
+
+    def _land(self, key, flight, builder, result=None, error=None):
+        """Hand the outcome of a build over to the threads waiting on it."""
+        with self.lock:
+            self.builds += 1
+            if flight.owner is not builder:
+                return
+            flight.result = result
+            flight.error = error
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done.set()
+
+    def _would_deadlock(self, flight, me):
+        """Whether waiting on a flight would mean waiting on ourselves."""
+        seen = set()
+        while flight is not None and flight not in seen:
+            if flight.owner is me:
+                return True
+            seen.add(flight)
+            flight = self._waiting.get(flight.owner)
+        return False
+
+    def set(self, key, model_cls, related=()):
+        """Store a clone, evicting the least recently used if full.
+
+        Args:
+            key (tuple): Key of the clone.
+            model_cls (class): The cloned class.
+            related (iterable): Keys of the clones this one refers to.
+
+        """
+        with self.lock:
+            self._clones[key] = model_cls
+            self._touch(key)
+            related = set(related)
+            related.discard(key)
+            self._related[key] = related
+            protected = related | set([key])
+            for related_key in related:
+                self._dependents.setdefault(related_key, set()).add(key)
+
+            # Trim from the oldest end, sparing the clone just stored
+            while (self.max_size is not None and
+                    len(self._clones) > self.max_size):
+                oldest = next(
+                        (k for k in self._clones if k not in protected), None)
+                if oldest is None:
+                    break
+                self.evict(oldest)
+
+    def evict(self, key):
+        """Remove a clone along with every clone that refers to it.
+
+        Args:
+            key (tuple): Key of the clone.
+
+        """
+        with self.lock:
+            model_cls = self._clones.pop(key, None)
+            dependents = self._dependents.pop(key, set())
+            for alias in self._aliases_by_key.pop(key, set()) | \
+                    self._aliases_by_source.pop(key, set()):
+                self._drop_alias(alias)
+            if model_cls is None:
+                return
+
+            # Clones that were never built don't keep their dependents
+            for related_key in self._related.pop(key, ()):
+                others = self._dependents.get(related_key)
+                if others is None:
+                    continue
+                others.discard(key)
+                if not others and related_key not in self._clones:
+                    del self._dependents[related_key]
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(model_cls)
+            for dependent in dependents:
+                self.evict(dependent)
+
+    def clear(self):
+        """Evict every clone."""
+        with self.lock:
+            while self._clones:
+                self.evict(next(iter(self._clones)))
+
+    def stats(self):
+        """Respond with the usage counters of this cache.
+
+        Besides hits, misses and evictions, `builds` counts the clones
+        that were created, `waits` counts the times a thread waited on
+        another thread's build, and `wait_time` is the seconds spent
+        waiting.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'builds': self.builds,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'size': len(self._clones),
+                'max_size': self.max_size,
+            }
+
+
+class _Flight(object):
+    """A clone being built by one thread, which others can wait on."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
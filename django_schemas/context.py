@@ -0,0 +1,124 @@
+"""
+State local to the current request or task.
+
+Values live in a context variable where Python has them, from 3.7, so
+that each asyncio task gets its own. Elsewhere they're local to the
+current thread, or to the current asyncio task where one is running.
+Tasks only start with a copy of the values of the task that created
+them with context variables. Without them, a task sees the values of
+its thread until it sets its own.
+
+Threads don't inherit the values of whoever started them. To carry them
+over, `capture` them first and hand the snapshot to `run_with` in the
+other thread, as `django_schemas.aio` does.
+"""
+
+import threading
+import weakref
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+
+_LOCALS = []
+"""Every ContextLocal made, to be captured together."""
+
+
+class ContextLocal(object):
+    """One value local to the current context.
+
+    Values are replaced rather than changed in place, since contexts
+    copied from this one share whatever object they were given.
+
+    Args:
+        name (str): Name of the context variable.
+        default: Value of contexts where none was set.
+
+    """
+
+    def __init__(self, name, default=None):
+        self.default = default
+        if contextvars is not None:
+            self._var = contextvars.ContextVar(name)
+        else:
+            self._local = threading.local()
+            self._tasks = weakref.WeakKeyDictionary()
+        _LOCALS.append(self)
+
+    def get(self):
+        """Respond with the value of the current context."""
+        if contextvars is not None:
+            return self._var.get(self.default)
+
+        # Tasks see the value of their thread until they set their own
+        task = _current_task()
+        if task is not None:
+            value = self._tasks.get(task)
+            if value is not None:
+                return value[0]
+        return getattr(self._local, 'value', self.default)
+
+    def set(self, value):
+        """Set the value of the current context."""
+        if contextvars is not None:
+            self._var.set(value)
+            return
+        task = _current_task()
+        if task is not None:
+            self._tasks[task] = (value,)
+        else:
+            self._local.value = value
+
+    def reset(self):
+        """Go back to the default value in the current context."""
+        self.set(self.default)
+
+
+def _current_task():
+    """Respond with the asyncio task running in this thread, if any."""
+    get_running_loop = getattr(asyncio, '_get_running_loop', None)
+    if get_running_loop is None:
+        return None
+    loop = get_running_loop()
+    if loop is None:
+        return None
+    return asyncio.Task.current_task(loop)
+
+
+def capture():
+    """Take a snapshot of every context-local value, for `run_with`."""
+    if contextvars is not None:
+        return contextvars.copy_context()
+    return [(local, local.get()) for local in _LOCALS]
+
+
+def run_with(snapshot, func, *args, **kwargs):
+    """Call a function with the context-local values of a snapshot.
+
+    The current context gets its own values back afterwards.
+
+    Args:
+        snapshot: Made by `capture`, and only used once.
+        func (callable): Called with the remaining arguments.
+
+    Returns:
+        Whatever the function returns.
+
+    """
+    if contextvars is not None:
+        return snapshot.run(func, *args, **kwargs)
+    previous = [(local, local.get()) for local, value in snapshot]
+    for local, value in snapshot:
+        local.set(value)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        for local, value in previous:
+            local.set(value)
@@ -0,0 +1,173 @@
+"""
+Related fields whose target clones are built on first use.
+
+A cloned foreign key points to the clone of its target for the same db
+and schema. Building that target up front would build every clone
+reachable through foreign keys, so cloned fields only point to the
+target's label instead, and build it when something needs the model.
+
+The label is an ordinary lazy reference, `"app_label.ModelName"`, which
+Django resolves through `lazy_related_operation` once a model with that
+label gets registered, however it was built. Until then, joining
+through the field, or using the relation on an instance, builds the
+target. The compilers of the database wrappers do the same for the
+relations `select_related()` follows, see
+`django_schemas.backends.compiler`.
+"""
+
+from django.db.models.fields import Field
+from django.utils import six
+
+
+_LAZY_FIELD_CLASSES = {}
+"""Lazy subclasses of related field classes, keyed by base class."""
+
+
+_LAZY_DESCRIPTOR_CLASSES = {}
+"""Lazy subclasses of related descriptor classes, keyed by base class."""
+
+
+class LazyRelatedFieldMixin(object):
+    """Builds the target clone of a related field on first use.
+
+    Set `_lazy_target`, `_lazy_db` and `_lazy_schema` on the field to
+    the source target model and the db and schema of its clone, and
+    `_lazy_source` to the source field, before it joins a model.
+    """
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super(LazyRelatedFieldMixin, self).contribute_to_class(
+                cls, name, *args, **kwargs)
+
+        # Instances build the target before following the relation
+        descriptor = cls.__dict__.get(self.name)
+        if descriptor is not None:
+            descriptor.__class__ = lazy_descriptor_class(descriptor.__class__)
+
+    def is_resolved(self):
+        """Whether the field points to its target clone yet."""
+        return not isinstance(self.remote_field.model, six.string_types)
+
+    def resolve_related_model(self):
+        """Build the target clone if it isn't built yet.
+
+        Returns:
+            The target model class.
+
+        """
+        if self.is_resolved():
+            return self.remote_field.model
+        related = self._lazy_target.set_db(
+                db=self._lazy_db, schema=self._lazy_schema)
+
+        # Registering the clone normally points this field to it
+        if not self.is_resolved():
+            self.remote_field.model = related
+        return self.remote_field.model
+
+    def do_related_class(self, other, cls):
+        # Clones evicted before their target was built leave it alone
+        opts = cls._meta
+        if opts.apps.all_models[opts.app_label].get(opts.model_name) is not cls:
+            return
+        self.__dict__.pop('related_model', None)
+        return super(LazyRelatedFieldMixin, self).do_related_class(other, cls)
+
+    def resolve_related_fields(self):
+        self.resolve_related_model()
+        return super(LazyRelatedFieldMixin, self).resolve_related_fields()
+
+    def get_path_info(self):
+        self.resolve_related_model()
+        return super(LazyRelatedFieldMixin, self).get_path_info()
+
+    @property
+    def target_field(self):
+        # Reading or writing the column doesn't need the clone itself
+        if not self.is_resolved():
+            return self._lazy_source.target_field
+        return super(LazyRelatedFieldMixin, self).target_field
+
+    def get_default(self):
+        # Nothing can be an instance of a class that doesn't exist yet
+        if not self.is_resolved():
+            return Field.get_default(self)
+        return super(LazyRelatedFieldMixin, self).get_default()
+
+    def validate(self, value, model_instance):
+        self.resolve_related_model()
+        return super(LazyRelatedFieldMixin, self).validate(
+                value, model_instance)
+
+    def formfield(self, **kwargs):
+        self.resolve_related_model()
+        return super(LazyRelatedFieldMixin, self).formfield(**kwargs)
+
+    def deconstruct(self):
+        # Migration states can't wait on a clone that may never be built
+        if not self.is_resolved():
+            return self._lazy_source.deconstruct()
+        name, path, args, kwargs = super(
+                LazyRelatedFieldMixin, self).deconstruct()
+        base = lazy_field_base(self.__class__)
+        path = '%s.%s' % (base.__module__, base.__name__)
+        return name, path, args, kwargs
+
+    def clone(self):
+        # Copies that Django makes, eg. for migration states, aren't lazy
+        name, path, args, kwargs = self.deconstruct()
+        return lazy_field_base(self.__class__)(*args, **kwargs)
+
+
+class LazyRelatedDescriptorMixin(object):
+    """Builds the target clone before an instance follows its relation."""
+
+    def __get__(self, instance, instance_type=None):
+        if instance is not None:
+            self.field.resolve_related_model()
+        return super(LazyRelatedDescriptorMixin, self).__get__(
+                instance, instance_type)
+
+    def __set__(self, instance, value):
+        self.field.resolve_related_model()
+        return super(LazyRelatedDescriptorMixin, self).__set__(
+                instance, value)
+
+    def get_queryset(self, **hints):
+        self.field.resolve_related_model()
+        return super(LazyRelatedDescriptorMixin, self).get_queryset(**hints)
+
+    def get_prefetch_queryset(self, instances, queryset=None):
+        self.field.resolve_related_model()
+        return super(LazyRelatedDescriptorMixin, self).get_prefetch_queryset(
+                instances, queryset)
+
+
+def lazy_field_class(field_cls):
+    """Return the lazy version of a related field class."""
+    if issubclass(field_cls, LazyRelatedFieldMixin):
+        return field_cls
+    if field_cls not in _LAZY_FIELD_CLASSES:
+        _LAZY_FIELD_CLASSES[field_cls] = type(
+                'Lazy' + field_cls.__name__,
+                (LazyRelatedFieldMixin, field_cls), {})
+    return _LAZY_FIELD_CLASSES[field_cls]
+
+
+def lazy_field_base(field_cls):
+    """Return the related field class a lazy one was made from."""
+    for base in field_cls.__mro__:
+        if not issubclass(base, LazyRelatedFieldMixin):
+            return base
+    return field_cls
+
+
+def lazy_descriptor_class(descriptor_cls):
+    """Return the lazy version of a related descriptor class."""
+    if issubclass(descriptor_cls, LazyRelatedDescriptorMixin):
+        return descriptor_cls
+    if descriptor_cls not in _LAZY_DESCRIPTOR_CLASSES:
+        _LAZY_DESCRIPTOR_CLASSES[descriptor_cls] = type(
+                'Lazy' + descriptor_cls.__name__,
+                (LazyRelatedDescriptorMixin, descriptor_cls), {})
+    return _LAZY_DESCRIPTOR_CLASSES[descriptor_cls]
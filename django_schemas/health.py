@@ -0,0 +1,224 @@
+"""
+Health of read replicas, to keep reads off the ones that are failing.
+
+The backend wrappers report connection errors here. A replica that
+fails `DATABASE_REPLICA_FAILURES` times in a row is left out of routing
+for `DATABASE_REPLICA_COOLDOWN` seconds. After that it gets one chance,
+and a single failure leaves it out again.
+
+With `DATABASE_REPLICA_MAX_LAG` set to a number of seconds, replicas
+further behind their primary than that are left out as well. A replica
+that replayed all the WAL it received has no lag, otherwise its lag is
+the time since the last transaction it replayed. It's read at most once
+every `DATABASE_REPLICA_LAG_INTERVAL` seconds per replica, in whichever
+thread routes a read to it first once the last reading is stale, over a
+connection of its own that doesn't go through Django or the routers.
+That connection gives up after `DATABASE_REPLICA_CONNECT_TIMEOUT`
+seconds, 2 by default, so a replica that's down only holds up routing
+that long. A replica whose lag can't be read counts as a connection
+error, and is left out until the next reading.
+
+State is per process, and shared by every thread in it.
+"""
+
+import logging
+import threading
+import time
+
+from django.db import connections
+
+from .utils import get_setting
+
+
+logger = logging.getLogger(__name__)
+
+
+_FAILURES = {}
+"""Connection errors in a row, keyed by alias."""
+
+
+_EJECTED = {}
+"""Time until which each ejected alias is left out, keyed by alias."""
+
+
+_LAG = {}
+"""Last `(time, seconds)` lag reading, keyed by alias."""
+
+
+_PROBES = {}
+"""Connection used to read the lag of each replica, keyed by alias."""
+
+
+_LOCK = threading.Lock()
+
+
+def record_failure(alias):
+    """Count a connection error, and eject the alias if it's too many."""
+    threshold = get_setting('DATABASE_REPLICA_FAILURES', 3)
+    cooldown = get_setting('DATABASE_REPLICA_COOLDOWN', 30)
+    with _LOCK:
+        failures = _FAILURES.get(alias, 0) + 1
+        _FAILURES[alias] = failures
+        if failures >= threshold or alias in _EJECTED:
+            _EJECTED[alias] = time.time() + cooldown
+            logger.warning('Ejected %s for %ss after %d connection errors',
+                    alias, cooldown, failures)
+
+
+def record_success(alias):
+    """Close the circuit of an alias that connected fine."""
+    if alias not in _FAILURES:
+        return
+    with _LOCK:
+        _FAILURES.pop(alias, None)
+        _EJECTED.pop(alias, None)
+
+
+def is_ejected(alias, now=None):
+    """Whether an alias is left out of routing for its errors."""
+    until = _EJECTED.get(alias)
+    if until is None:
+        return False
+    return (now or time.time()) < until
+
+
+def get_lag(alias, now=None):
+    """Respond with how far behind its primary a replica is.
+
+    The last reading is reused until it's older than
+    `DATABASE_REPLICA_LAG_INTERVAL` seconds.
+
+    Args:
+        alias (str): Alias of the replica.
+        now (Optional[float]): Current time.
+
+    Returns:
+        Seconds of lag, infinite if the replica can't be reached, or
+        None where it can't be told.
+
+    """
+    now = now or time.time()
+    interval = get_setting('DATABASE_REPLICA_LAG_INTERVAL', 5)
+    reading = _LAG.get(alias)
+    if reading is not None and now - reading[0] < interval:
+        return reading[1]
+
+    # Other threads keep the stale reading while this one probes
+    with _LOCK:
+        if _LAG.get(alias) is not reading:
+            return _LAG[alias][1]
+        _LAG[alias] = (now, reading[1] if reading else None)
+    lag = _probe_lag(alias)
+    _LAG[alias] = (now, lag)
+    return lag
+
+
+def _probe_lag(alias):
+    """Ask a replica how far behind its primary it is.
+
+    Failing to ask counts as a connection error of the replica, and as
+    infinite lag.
+    """
+    try:
+        connection = _get_probe(alias)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(_get_lag_sql(connection.server_version))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+    except Exception:
+        logger.warning('Could not read the lag of %s', alias, exc_info=True)
+        _close_probe(alias)
+        record_failure(alias)
+        return float('inf')
+    if row is None or row[0] is None:
+        return None
+    return float(row[0])
+
+
+def _get_probe(alias):
+    """Respond with the lag connection of a replica, opening it if needed.
+
+    The connection is made straight from the replica's settings, so
+    reading the lag while routing never routes, checks a connection out
+    of a pool or touches the session of the thread's own connection.
+    It gives up after `DATABASE_REPLICA_CONNECT_TIMEOUT` seconds.
+    """
+    connection = _PROBES.get(alias)
+    if connection is None or connection.closed:
+        wrapper = connections[alias]
+        params = wrapper.get_connection_params()
+        params['connect_timeout'] = get_setting(
+                'DATABASE_REPLICA_CONNECT_TIMEOUT', 2)
+        connection = wrapper.Database.connect(**params)
+        connection.autocommit = True
+        _PROBES[alias] = connection
+    return connection
+
+
+def _close_probe(alias):
+    """Close the lag connection of a replica, if it has one."""
+    connection = _PROBES.pop(alias, None)
+    if connection is None:
+        return
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def _get_lag_sql(server_version):
+    """Respond with the lag query for a version of PostgreSQL."""
+    if server_version >= 100000:
+        received = 'pg_last_wal_receive_lsn'
+        replayed = 'pg_last_wal_replay_lsn'
+    else:
+        received = 'pg_last_xlog_receive_location'
+        replayed = 'pg_last_xlog_replay_location'
+    return (
+            "SELECT CASE WHEN %s() = %s() THEN 0 ELSE "
+            "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+            "END" % (received, replayed))
+
+
+def healthy_replicas(replicas):
+    """Leave out the replicas that are failing or lagging.
+
+    Args:
+        replicas (tuple): Aliases of replicas.
+
+    Returns:
+        Tuple of the aliases fit to read from, possibly empty.
+
+    """
+    max_lag = get_setting('DATABASE_REPLICA_MAX_LAG', None)
+    if not _EJECTED and max_lag is None:
+        return replicas
+    now = time.time()
+    healthy = []
+    for alias in replicas:
+        if is_ejected(alias, now):
+            continue
+        if max_lag is not None:
+            lag = get_lag(alias, now)
+            if lag is not None and lag > max_lag:
+                continue
+        healthy.append(alias)
+    return tuple(healthy)
+
+
+def reset(alias=None):
+    """Forget the health of an alias, or of every alias."""
+    with _LOCK:
+        if alias is None:
+            _FAILURES.clear()
+            _EJECTED.clear()
+            _LAG.clear()
+            for probe in list(_PROBES):
+                _close_probe(probe)
+        else:
+            _FAILURES.pop(alias, None)
+            _EJECTED.pop(alias, None)
+            _LAG.pop(alias, None)
+            _close_probe(alias)
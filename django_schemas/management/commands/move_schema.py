@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from ...moves import move_schema
+
+
+class Command(BaseCommand):
+    """Move a schema to another database."""
+
+    help = 'Copies a schema to another database and reports throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source',
+                type=str,
+                help="database the schema is on")
+        parser.add_argument('target',
+                type=str,
+                help="database to move the schema to")
+        parser.add_argument('--environment',
+                dest='environment',
+                required=True,
+                help="environment whose migrations make the schema")
+        parser.add_argument('--schema',
+                dest='schema',
+                default=None,
+                help="schema to move")
+        parser.add_argument('--tenant',
+                dest='tenant',
+                default=None,
+                help="tenant of a sharded environment to move")
+
+    def handle(self, *args, **options):
+        """Move the schema and report how fast it went.
+
+        Args:
+            **options:
+                source (str): Database the schema is on.
+                target (str): Database to move the schema to.
+                environment (str): Environment of the schema.
+                schema (Optional(str)): Schema to move.
+                tenant (Optional(str)): Tenant whose schema to move.
+
+        """
+        tenant = options.get('tenant')
+        report = move_schema(
+                source=options.get('source'),
+                target=options.get('target'),
+                environment=options.get('environment'),
+                schema=options.get('schema'),
+                tenant=tenant)
+        self.stdout.write(
+                "Copied %d tables, %d rows, %.1f MB in %.2fs: "
+                "%.0f rows/s, %.1f MB/s" % (
+                        report.tables, report.rows,
+                        report.bytes / 1048576.0, report.seconds,
+                        report.rows_per_second, report.mb_per_second))
+
+        if tenant is not None:
+            self.stdout.write("Placed tenant %s on %s" % (
+                    tenant, options.get('target')))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from ...warmup import warm_models
+
+
+class Command(BaseCommand):
+    """Build model clones ahead of the first request."""
+    
+    help = 'Builds the model clones of every configured db and schema'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--schema',
+                dest='schemas',
+                action='append',
+                default=None,
+                help="schema to warm for environments without one, "
+                     "can be repeated")
+        parser.add_argument('--environment',
+                dest='environments',
+                action='append',
+                default=None,
+                help="environment to warm, can be repeated")
+        parser.add_argument('--database',
+                dest='databases',
+                action='append',
+                default=None,
+                help="database to warm, can be repeated")
+        
+    def handle(self, *args, **options):
+        """Warm the clones and report how long it took.
+        
+        Args:
+            **options:
+                schemas (Optional[list]): Schemas to warm.
+                environments (Optional[list]): Environments to warm.
+                databases (Optional[list]): Databases to warm.
+        
+        """
+        report = warm_models(
+                schemas=options.get('schemas'),
+                environments=options.get('environments'),
+                databases=options.get('databases'))
+        memory = 'n/a'
+        if report['memory'] is not None:
+            memory = '%.1f MB' % (report['memory'] / 1048576.0)
+        self.stdout.write(
+                "Warmed %d clones for %d db/schema pairs in %.3fs, "
+                "allocating %s" % (
+                    report['clones'], report['targets'], report['seconds'],
+                    memory))
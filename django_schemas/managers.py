@@ -0,0 +1,11 @@
+from django.db.models.manager import BaseManager
+
+from .query import SchemaQuerySet
+
+
+class SchemaManager(BaseManager.from_queryset(SchemaQuerySet)):
+    """
+    Manager whose querysets can be bound to a database and schema
+    without cloning the model, eg. `User.objects.in_schema(db, schema)`.
+    """
+    pass
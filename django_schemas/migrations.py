@@ -5,7 +5,7 @@ from django.db import connections, transaction
 
 from . import routers
 from .exceptions import ConfigError
-from .utils import dict_fetchall
+from .utils import dict_fetchall, quote_schema
 
 
 def migrate(db, schema=None, environment=None, big_ints=False):
@@ -38,19 +38,43 @@ def migrate(db, schema=None, environment=None, big_ints=False):
         if not current_schema:
             raise ConfigError("schema required and not present")
         
-        # Prep the database wrapper with the school we want
-        routers.set_db(schema=current_schema, environment=env)
-        
-        # Run the migration script for this school specifically
-        call_command('migrate', database=db)
-        
-        # Apply hack to upgrade any 'serial' and 'int' columns to their
-        # 'big' counterparts.
-        if big_ints:
-            upgrade_to_big_keys(db=db, schema=current_schema)
+        # Connections only point to the schema, it's made here
+        create_schema(db=db, schema=current_schema)
         
-        # Reset the router db and schema
-        routers.set_db()
+        # Prep the database wrapper with the school we want
+        with routers.using_schema(
+                db=db, schema=current_schema, environment=env):
+            
+            # Schema-qualified databases only SET LOCAL their schema
+            if getattr(connections[db], 'schema_qualified', False):
+                with transaction.atomic(using=db):
+                    _migrate(db, current_schema, big_ints)
+            else:
+                _migrate(db, current_schema, big_ints)
+
+
+def _migrate(db, schema, big_ints):
+    """Migrate a database on the schema the current context points to."""
+    
+    # Run the migration script for this school specifically
+    call_command('migrate', database=db)
+    
+    # Apply hack to upgrade any 'serial' and 'int' columns to
+    # their 'big' counterparts.
+    if big_ints:
+        upgrade_to_big_keys(db=db, schema=schema)
+
+
+def create_schema(db, schema):
+    """Make the schema in the database, unless it's there already.
+    
+    Args:
+        db (str): Name of the database to write to.
+        schema (str): Name of the schema to make.
+    
+    """
+    cursor = connections[db].cursor()
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS %s" % quote_schema(schema))
 
 
 def flush(db, schema):
@@ -62,7 +86,7 @@ def flush(db, schema):
     
     """
     cursor = connections[db].cursor()
-    cursor.execute("DROP SCHEMA IF EXISTS %s CASCADE" % schema)
+    cursor.execute("DROP SCHEMA IF EXISTS %s CASCADE" % quote_schema(schema))
     
     
 def upgrade_to_big_keys(db, schema):
@@ -109,7 +133,7 @@ def upgrade_to_big_keys(db, schema):
                 new_type = 'bigserial'
             else:
                 continue
-            full_table = "%s.%s" % (schema, table['table_name'])
+            full_table = "%s.%s" % (quote_schema(schema), table['table_name'])
             sql = "ALTER TABLE %s ALTER COLUMN %s SET DATA TYPE %s"
             cursor.execute(sql % (full_table, column['column_name'], new_type))
             
@@ -1,8 +1,17 @@
+from django.apps import apps
 from django.conf import settings
+from django.core.signals import setting_changed
 from django.db import models as django_models
+from django.db.models.signals import class_prepared
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
+import weakref
 
 from .exceptions import ConfigError
+from .modelsfactory import clone_model
+from .query import SchemaQuerySet
+from .routers import using_schema
+from .shards import locate_tenant
 from .utils import dbs_by_environment
 
 
@@ -13,6 +22,17 @@ django_models.options.DEFAULT_NAMES = (
         django_models.options.DEFAULT_NAMES + CUSTOM_META_VARS)
 
 
+_AUTO_DBS = weakref.WeakKeyDictionary()
+"""Memoized `_get_auto_db` results, keyed by class, then environment."""
+
+
+_ENVIRONMENT_SCHEMAS = weakref.WeakKeyDictionary()
+"""
+The `(schema_name, table_name, db_table)` meta of the models pointed at
+their environment's schema, as they were before, keyed by class.
+"""
+
+
 class BaseModel(object):
     """
     Plain non-model class with attributes to merge into the django
@@ -38,9 +58,24 @@ class BaseModel(object):
             Returns a copy of this class with modified attributes.
         
         """
-        from .modelsfactory import clone_model
         return clone_model(cls, db=db, schema=schema)
     
+    @classmethod
+    def in_schema(cls, db, schema):
+        """
+        Query this model on a database and schema without creating a
+        new class for them.
+        
+        Args:
+            db (str): Alias to the database this query should use.
+            schema (str): Name of the database schema.
+        
+        Returns:
+            SchemaQuerySet bound to the db and schema.
+        
+        """
+        return SchemaQuerySet(model=cls).in_schema(db, schema)
+    
     @classmethod
     def inherit_db(cls, model):
         """
@@ -59,50 +94,55 @@ class BaseModel(object):
         
         # Were they set alread?
         if not db or not schema:
-            new_model = model.auto_db() # Throws a ConfigError
-            db = new_model._meta.db_name
-            schema = new_model._meta.schema_name
+            db, schema = _get_auto_db(model) # Throws a ConfigError
         
         # Return the new class
         return cls.set_db(db=db, schema=schema)
     
     @classmethod
-    def auto_db(cls, **kwargs):
+    def for_tenant(cls, key):
         """
-        This method creates a new class out of the current one with
-        modified meta attributes suited for multi-schema databases.
+        Shortcut for the clone of this class on the database and schema
+        that `DATABASE_SHARDS` places a tenant on.
         
-        Instead of manually inputing db and schema names, this method
-        attempts to automatically find them.
+        Args:
+            key (mixed): Anything that identifies the tenant.
         
         Returns:
-            Returns a copy of this class with modified attributes.
+            A copy of this class with modified attributes.
+        
+        Raises:
+            ConfigError: If the class's environment has no shard map.
         
         """
-        # Based on environment, a schema might already be set
         env = getattr(cls._meta, 'db_environment', None)
         if not env:
             raise ConfigError(cls.__name__ + " has no specified environment")
+        db, schema = locate_tenant(env, key)
+        return cls.set_db(db=db, schema=schema)
+    
+    @classmethod
+    def auto_db(cls, **kwargs):
+        """
+        This method creates a new class out of the current one with
+        modified meta attributes suited for multi-schema databases.
         
-        # Schema set by environment?
-        conf = settings.DATABASE_ENVIRONMENTS[env]
-        if not conf.get('SCHEMA_NAME', None):
-            raise ConfigError(cls.__name__ + " has no specified schema")
+        Instead of manually inputing db and schema names, this method
+        attempts to automatically find them.
         
-        # Single db for this class?
-        dbs = dbs_by_environment(env)
-        if len(dbs) != 1:
-            raise ConfigError(cls.__name__ + " has no single database")
+        Returns:
+            Returns a copy of this class with modified attributes.
         
-        # It worked!
-        return cls.set_db(db=list(dbs)[0], schema=conf['SCHEMA_NAME'])
+        """
+        db, schema = _get_auto_db(cls)
+        return cls.set_db(db=db, schema=schema)
     
     @property
     def db_name(self):
         """Respond with the database name attached to this model."""
         db = getattr(self._meta, 'db_name', None)
         if not db:
-            db = getattr(self.auto_db()._meta, 'db_name', None)
+            db = _get_auto_db(self)[0]
         return db
     
     @property
@@ -110,9 +150,36 @@ class BaseModel(object):
         """Respond with the schema name attached to this model."""
         schema = getattr(self._meta, 'schema_name', None)
         if not schema:
-            schema = getattr(self.auto_db()._meta, 'schema_name', None)
+            schema = _get_auto_db(self)[1]
         return schema
     
+    def _do_update(self, base_qs, *args, **kwargs):
+        """Keep updates of instances from `in_schema` on their schema."""
+        schema = getattr(self._state, 'schema_name', None)
+        if schema:
+            base_qs = self.in_schema(
+                    self._state.db_name, schema).using(base_qs._db)
+        return super(BaseModel, self)._do_update(base_qs, *args, **kwargs)
+    
+    def _do_insert(self, manager, *args, **kwargs):
+        """Keep inserts of instances from `in_schema` on their schema."""
+        schema = getattr(self._state, 'schema_name', None)
+        if schema:
+            manager = self.in_schema(self._state.db_name, schema)
+        return super(BaseModel, self)._do_insert(manager, *args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        """
+        Keep deletes of instances from `in_schema` on their schema,
+        cascades and signals included.
+        """
+        schema = getattr(self._state, 'schema_name', None)
+        if not schema:
+            return super(BaseModel, self).delete(*args, **kwargs)
+        with using_schema(self._state.db_name, schema,
+                getattr(self._meta, 'db_environment', None)):
+            return super(BaseModel, self).delete(*args, **kwargs)
+    
     @property
     def table_name(self):
         """Respond with the table name attached to this model."""
@@ -123,22 +190,90 @@ class BaseModel(object):
 
 class Model(BaseModel):
     """Layer in front of Django models."""
+
+
+@receiver(class_prepared)
+def _set_environment_schema(sender, **kwargs):
+    """
+    Point a model at the schema of its environment, if the environment
+    names one. This happens once as the class is prepared, so creating
+    instances of it costs no more than for any other model, and again
+    when `DATABASE_ENVIRONMENTS` changes.
+    """
+    # Migration states render their own models and leave tables alone
+    opts = sender._meta
+    if not issubclass(sender, Model) or opts.apps is not apps:
+        return
+    env = getattr(opts, 'db_environment', None)
+    if not env or getattr(opts, 'schema_name', None):
+        return
+    conf = getattr(settings, 'DATABASE_ENVIRONMENTS', {}).get(env, {})
+    if not conf.get('SCHEMA_NAME', None):
+        return
+    _ENVIRONMENT_SCHEMAS[sender] = (getattr(opts, 'schema_name', None),
+            getattr(opts, 'table_name', None), opts.db_table)
+    opts.schema_name = conf['SCHEMA_NAME']
+    opts.table_name = opts.db_table.split('"."')[-1]
+    opts.db_table = '%s\".\"%s' % (opts.schema_name, opts.table_name)
+
+
+def _get_auto_db(model):
+    """
+    Find the database and schema that a model's environment settles on
+    by itself, for `auto_db` and everything that falls back to it.
+    
+    Args:
+        model (mixed): Model class or object.
+    
+    Returns:
+        Tuple of the database alias and the schema name.
+    
+    Raises:
+        ConfigError: If the environment doesn't settle on a single
+            database and schema.
+    
+    """
+    cls = model if isinstance(model, type) else model.__class__
+    env = getattr(cls._meta, 'db_environment', None)
+    try:
+        return _AUTO_DBS[cls][env]
+    except KeyError:
+        pass
     
-    def __init__(self, *args, **kwargs):
-        """Append some meta on instantiation."""
-        
-        # Do what models do first
-        super(Model, self).__init__(*args, **kwargs)
-        
-        # Based on environment, change some of the meta information
-        env = getattr(self._meta, 'db_environment', None)
-        if env:
-            
-            # Get the environment config
-            conf = settings.DATABASE_ENVIRONMENTS[env]
-            if (conf.get('SCHEMA_NAME', None) and
-                    not getattr(self._meta, 'schema_name', None)):
-                self._meta.schema_name = conf['SCHEMA_NAME']
-                self._meta.table_name = self._meta.db_table
-                self._meta.db_table = '%s\".\"%s' % (
-                        self._meta.schema_name, self._meta.table_name)
\ No newline at end of file
+    # Based on environment, a schema might already be set
+    if not env:
+        raise ConfigError(cls.__name__ + " has no specified environment")
+    
+    # Schema set by environment?
+    conf = settings.DATABASE_ENVIRONMENTS[env]
+    if not conf.get('SCHEMA_NAME', None):
+        raise ConfigError(cls.__name__ + " has no specified schema")
+    
+    # Single db for this class?
+    dbs = dbs_by_environment(env)
+    if len(dbs) != 1:
+        raise ConfigError(cls.__name__ + " has no single database")
+    
+    # It worked!
+    result = (list(dbs)[0], conf['SCHEMA_NAME'])
+    _AUTO_DBS.setdefault(cls, {})[env] = result
+    return result
+
+
+@receiver(setting_changed)
+def _clear_auto_dbs(setting, **kwargs):
+    """Forget the memoized databases when the settings behind them change."""
+    if setting in ('DATABASES', 'DATABASE_ENVIRONMENTS'):
+        _AUTO_DBS.clear()
+    if setting == 'DATABASE_ENVIRONMENTS':
+        _reset_environment_schemas()
+
+
+def _reset_environment_schemas():
+    """Point models at the schemas of their environments again."""
+    for model, meta in list(_ENVIRONMENT_SCHEMAS.items()):
+        opts = model._meta
+        opts.schema_name, opts.table_name, opts.db_table = meta
+    _ENVIRONMENT_SCHEMAS.clear()
+    for model in apps.get_models():
+        _set_environment_schema(model)
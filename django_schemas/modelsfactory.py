@@ -1,7 +1,15 @@
 import collections
-from copy import deepcopy
+from copy import copy, deepcopy
 from django.conf import settings
-from django_schemas.utils import get_methods_from_class
+from django.core.signals import setting_changed
+from django.db.models.utils import make_model_tuple
+from django.dispatch import receiver
+from django.utils import six
+from django.utils.functional import cached_property
+from django_schemas.cache import ModelCloneCache
+from django_schemas.fields import lazy_field_class
+from django_schemas.utils import (
+        forget_methods_from_class, get_methods_from_class)
 import json
 import re
 import sys
@@ -20,24 +28,98 @@ attributes.
 """
 
 
-EXISTING_MODEL_CLONES = {}
+MODEL_CLONES_MAX_SIZE = None
+"""The most cloned models to keep alive at once.
+
+Every db and schema combination of every model produces its own class.
+Processes serving many schemas can set this to put a ceiling on memory.
+Once reached, the least recently used clones are unregistered from
+Django and dropped. Unbounded if None.
+"""
+
+
+def _unregister_model(model_cls):
+    """Remove a cloned model from Django's app registry.
+    
+    Reverse accessors that the clone's related fields placed on their
+    targets are removed as well, since they would otherwise keep the
+    clone alive. So are the operations that relations still waiting on
+    a target that was never built left queued in Django's registry.
+    
+    Args:
+        model_cls (class): The cloned class to forget.
+    
+    """
+    opts = model_cls._meta
+    app_models = opts.apps.all_models[opts.app_label]
+    if app_models.get(opts.model_name) is model_cls:
+        del app_models[opts.model_name]
+    
+    # Drop reverse accessors pointing back to this clone
+    for field in opts.local_fields + opts.local_many_to_many:
+        rel = getattr(field, 'remote_field', None)
+        if not rel or rel.is_hidden():
+            continue
+        if isinstance(rel.model, six.string_types):
+            continue
+        accessor = rel.get_accessor_name()
+        descriptor = rel.model.__dict__.get(accessor)
+        related = (getattr(descriptor, 'rel', None) or
+                getattr(descriptor, 'related', None))
+        if getattr(related, 'field', None) is field:
+            delattr(rel.model, accessor)
+    
+    # Drop relations still waiting for their target to be built
+    pending = opts.apps._pending_operations
+    for field in opts.local_fields + opts.local_many_to_many:
+        rel = getattr(field, 'remote_field', None)
+        if not rel or not isinstance(rel.model, six.string_types):
+            continue
+        key = make_model_tuple(rel.model)
+        operations = [operation for operation in pending.get(key, ())
+                if not _is_operation_of(operation, field)]
+        if operations:
+            pending[key] = operations
+        else:
+            pending.pop(key, None)
+    
+    _CLONED_META_VALUES.pop(model_cls, None)
+    forget_clone_plan(model_cls)
+    opts.apps.clear_cache()
+
+
+def _is_operation_of(operation, field):
+    """Whether a lazy operation in Django's registry was queued by a field.
+    
+    Operations are partials, nested on Python 2, with the field as
+    their `field` keyword argument.
+    """
+    while operation is not None:
+        if (getattr(operation, 'keywords', None) or {}).get('field') is field:
+            return True
+        operation = getattr(operation, 'func', None)
+    return False
+
+
+EXISTING_MODEL_CLONES = ModelCloneCache(on_evict=_unregister_model)
 """Holds existing classes with specific options.
 
 Since each new class is always global and needs a unique name each
 time, they'll be stored here and referenced whenever needed again.
 If nothing else, this is a model clone cache.
 
-Looks like:
-    {
-        'database_name': {
-            'schema_name': {
-                'ClassName_serialized-extras': ClonedClass,
-            },
-        },
-    }
+Keys look like:
+    ('database_name', 'schema_name', 'ClassName_serialized-extras')
+
+Its size is governed by MODEL_CLONES_MAX_SIZE, and `stats()` reports
+its hits, misses and evictions.
 """
 
 
+_CLONED_META_VALUES = {}
+"""Memoized `_get_cloned_meta` results, keyed by model class."""
+
+
 def clone_model(model_cls, db=None, schema=None, *args, **kwargs):
     """Create a clone of a Django model for a specific db and schema.
     
@@ -53,6 +135,12 @@ def clone_model(model_cls, db=None, schema=None, *args, **kwargs):
         Class containing the meta information included.
     
     """
+    # Existing clones are found without rebuilding their serial names
+    alias = (model_cls, db, schema, _get_cloned_meta(model_cls))
+    existing_cls = EXISTING_MODEL_CLONES.get_alias(alias)
+    if existing_cls is not None:
+        return existing_cls
+    
     # Prepare some variables for later class instantiation
     schema_friendly_table = model_cls._meta.db_table
     table_name = model_cls._meta.db_table
@@ -63,12 +151,53 @@ def clone_model(model_cls, db=None, schema=None, *args, **kwargs):
         schema_friendly_table = '%s\".\"%s' % (schema, schema_friendly_table)
     
     # Spit out the cloned model
-    return get_model(model_cls, options={
+    new_model = get_model(model_cls, options={
         'db_name': db,
         'db_table': schema_friendly_table,
         'schema_name': schema,
         'table_name': table_name,
     }, db=db, schema=schema)
+    
+    # Aliases made from a clone go along with it
+    source = getattr(model_cls._meta, 'db_name', None) and \
+            _get_clone_key(model_cls)
+    if source not in EXISTING_MODEL_CLONES:
+        source = None
+    EXISTING_MODEL_CLONES.alias(
+            alias, _get_clone_key(new_model), source=source)
+    return new_model
+
+
+def _get_cloned_meta(model_cls):
+    """The values of CLONABLE_META_ATTRS on a model, as a tuple.
+    
+    These are looked up once per model and remembered in
+    _CLONED_META_VALUES until the setting changes.
+    
+    Args:
+        model_cls (class): Model whose meta to read.
+    
+    Returns:
+        Tuple of meta values.
+    
+    """
+    try:
+        return _CLONED_META_VALUES[model_cls]
+    except KeyError:
+        pass
+    clonable_meta = getattr(settings,'CLONABLE_META_ATTRS',CLONABLE_META_ATTRS)
+    values = tuple(getattr(model_cls._meta, attr, None)
+            for attr in clonable_meta)
+    _CLONED_META_VALUES[model_cls] = values
+    return values
+
+
+@receiver(setting_changed)
+def _clear_cloned_meta(setting, **kwargs):
+    """Forget the memoized meta values when CLONABLE_META_ATTRS changes."""
+    if setting == 'CLONABLE_META_ATTRS':
+        _CLONED_META_VALUES.clear()
+        EXISTING_MODEL_CLONES.clear_aliases()
 
 
 def get_model(model_cls, options={}, **kwargs):
@@ -89,6 +218,24 @@ def get_model(model_cls, options={}, **kwargs):
     if existing_cls:
         return existing_cls
     
+    # Only one thread gets to build each clone, the rest wait for it
+    key = (str(options['db_name']), str(options['schema_name']), serial_name)
+    return EXISTING_MODEL_CLONES.build(key, lambda: _build_model(
+            model_cls, serial_name, options, **kwargs))
+
+
+def _build_model(model_cls, serial_name, options, **kwargs):
+    """Create and store a new clone of a model.
+    
+    Args:
+        model_cls (class): The class to clone.
+        serial_name (str): Name of the new class.
+        options (dict): The meta fields to inject into the new clone.
+    
+    Returns:
+        Class definition clone of the input model.
+    
+    """
     # Start the meta dictionary
     meta_options = {}
     
@@ -101,25 +248,24 @@ def get_model(model_cls, options={}, **kwargs):
     for field in options:
         meta_options[field] = options[field]
     
-    # Convert the fields into the proper format
-    fields = _get_model_fields(model_cls)
-    
-    # Get any methods that might belong to this model alone
-    methods = get_methods_from_class(model_cls)
+    # Fields and methods are worked out once per source model
+    plan = get_clone_plan(model_cls)
     
     # Make the new model based off the old one
     new_model = create_model(
             name=serial_name,
-            fields=fields,
+            fields=dict(plan.fields),
             app_label=model_cls._meta.app_label,
             module=model_cls.__module__,
             options=meta_options,
             bases=model_cls.__bases__,
-            attrs=methods,
+            attrs=plan.methods,
+            inherited_fields=plan.dropped,
+            templates=plan.templates,
             **kwargs)
     
     # Save this model for use while this process is alive
-    _set_cloned_model(new_model)
+    _set_cloned_model(new_model, plan.related)
     
     # Return the cloned model
     return new_model
@@ -153,6 +299,30 @@ def _get_cloned_model(model_cls, options={}):
     options_temp = collections.OrderedDict(sorted(options_temp.items()))
     
     # Make the serial name for the model
+    serial_name = _get_serial_name(
+            model_cls, db_name, schema_name, options_temp.items())
+    
+    # Check for the class in the existing pile
+    existing_clone = EXISTING_MODEL_CLONES.get(
+            (db_name, schema_name, serial_name))
+    
+    # Return
+    return serial_name, existing_clone
+
+
+def _get_serial_name(model_cls, db_name, schema_name, extras=()):
+    """Name of the clone of a model for a db and schema.
+    
+    Args:
+        model_cls (class): The class to clone, or one of its clones.
+        db_name (str): Alias of the database.
+        schema_name (str): Name of the schema.
+        extras (iterable): Any other (key, value) meta pairs, in order.
+    
+    Returns:
+        str: The class name.
+    
+    """
     matches = re.match(r'^(.+?)__',model_cls.__name__)
     if not matches:
         match = model_cls.__name__
@@ -160,46 +330,131 @@ def _get_cloned_model(model_cls, options={}):
         match = matches.group(1)
     serial_name = match + '__'
     regex_sub = re.compile(r'[^a-zA-Z0-9_]')
-    serial_name += regex_sub.sub(r'', db_name) + '__'
-    serial_name += regex_sub.sub(r'', schema_name) + '__'
-    for key, value in options_temp.items():
+    serial_name += regex_sub.sub(r'', str(db_name)) + '__'
+    serial_name += regex_sub.sub(r'', str(schema_name)) + '__'
+    for key, value in extras:
         serial_name += regex_sub.sub(r'',str(key))
         serial_name += regex_sub.sub(r'', str(value))
         serial_name += '__'
-    
-    # Check for the class in the existing pile
-    existing_clone = None
-    if db_name not in EXISTING_MODEL_CLONES:
-        EXISTING_MODEL_CLONES[db_name] = {}
-    if schema_name not in EXISTING_MODEL_CLONES[db_name]:
-        EXISTING_MODEL_CLONES[db_name][schema_name] = {}
-    eds = EXISTING_MODEL_CLONES[db_name][schema_name]
-    if serial_name in eds:
-        existing_clone = eds[serial_name]
-    
-    # Return
-    return serial_name, existing_clone
+    return serial_name
 
 
-def _set_cloned_model(model_cls):
+def _set_cloned_model(model_cls, related_fields=None):
     """Save the created model in the dict stack.
     
     Args:
         model_cls (class): The created model class.
+        related_fields (Optional[iterable]): Names of its relational
+            fields, otherwise all of its local fields are checked.
     
     """
     # Setup some variables
     global EXISTING_MODEL_CLONES
-    db_name = model_cls._meta.db_name
-    schema_name = model_cls._meta.schema_name
-    cls_name = model_cls.__name__
+    EXISTING_MODEL_CLONES.max_size = getattr(
+            settings, 'MODEL_CLONES_MAX_SIZE', MODEL_CLONES_MAX_SIZE)
+    
+    # Remember which clones the related fields point to, built or not
+    related = set()
+    if related_fields is None:
+        fields = model_cls._meta.local_fields
+    else:
+        fields = [model_cls._meta.get_field(name) for name in related_fields]
+    for field in fields:
+        target = getattr(field.remote_field, 'model', None)
+        if isinstance(target, six.string_types):
+            related.add((str(field._lazy_db), str(field._lazy_schema),
+                    target.split('.', 1)[1]))
+            continue
+        if getattr(target, '_meta', None) is None:
+            continue
+        if _get_clone_key(target) in EXISTING_MODEL_CLONES:
+            related.add(_get_clone_key(target))
     
     # Plug in the reference
-    if db_name not in EXISTING_MODEL_CLONES:
-        EXISTING_MODEL_CLONES[db_name] = {}
-    if schema_name not in EXISTING_MODEL_CLONES[db_name]:
-        EXISTING_MODEL_CLONES[db_name][schema_name] = {}
-    EXISTING_MODEL_CLONES[db_name][schema_name][cls_name] = model_cls
+    EXISTING_MODEL_CLONES.set(
+            _get_clone_key(model_cls), model_cls, related=related)
+
+
+def _get_clone_key(model_cls):
+    """Key used to store a cloned model in EXISTING_MODEL_CLONES."""
+    return (str(model_cls._meta.db_name), str(model_cls._meta.schema_name),
+            model_cls.__name__)
+
+
+class ClonePlan(collections.namedtuple(
+        'ClonePlan', ['fields', 'dropped', 'related', 'methods',
+            'templates'])):
+    """What every clone of a source model is built from.
+    
+    Attributes:
+        fields (dict): Fields the clone declares itself, by name.
+        dropped (frozenset): Names of fields inherited from the bases,
+            which the clone mustn't declare again.
+        related (tuple): Names of the relational fields among `fields`,
+            which get rebound to the clone's db and schema.
+        methods (dict): Methods to copy onto the clone, by name.
+        templates (dict): Field templates from `get_field_template`,
+            by name.
+    
+    """
+    __slots__ = ()
+
+
+_CLONE_PLANS = {}
+"""Memoized `get_clone_plan` results, keyed by source model class."""
+
+
+def get_clone_plan(model_cls):
+    """Work out how to clone a model, once for all its clones.
+    
+    Args:
+        model_cls (class): The class to clone.
+    
+    Returns:
+        ClonePlan: Shared by every clone of the model, and not to be
+            modified.
+    
+    """
+    try:
+        return _CLONE_PLANS[model_cls]
+    except KeyError:
+        pass
+    fields = _get_model_fields(model_cls)
+    dropped = set()
+    for base in model_cls.__bases__:
+        dropped.update(_get_model_fields(base))
+    dropped.intersection_update(fields)
+    for name in dropped:
+        del fields[name]
+    related = tuple(name for name in fields
+            if fields[name].remote_field is not None)
+    plan = ClonePlan(
+            fields=fields,
+            dropped=frozenset(dropped),
+            related=related,
+            methods=get_methods_from_class(model_cls),
+            templates=dict((name, get_field_template(fields[name]))
+                    for name in fields))
+    _CLONE_PLANS[model_cls] = plan
+    return plan
+
+
+def forget_clone_plan(model_cls=None):
+    """Have the next clone of a model work out its plan again.
+    
+    Needed after fields or methods are added to or replaced on a source
+    model at runtime. Existing clones are left as they are.
+    
+    Args:
+        model_cls (Optional[class]): The source model to forget,
+            otherwise all of them.
+    
+    """
+    if model_cls is None:
+        _CLONE_PLANS.clear()
+    else:
+        _CLONE_PLANS.pop(model_cls, None)
+    forget_methods_from_class(model_cls)
 
 
 def _get_class_attrs(cls):
@@ -270,6 +525,11 @@ def create_model(
         options (dict): Fields to add to the Meta class of the model.
         admin_opts (dict): Fields to add to the Admin class of the model.
         bases (tuple): The bases for the original class.
+        inherited_fields (Optional[iterable]): Names of the fields the
+            bases already provide, which are left out of `fields`.
+            Worked out from the bases if not given.
+        templates (Optional[dict]): Templates to build the fields from,
+            by name.
     
     Returns:
         Class definition of model.
@@ -302,20 +562,21 @@ def create_model(
         if bases:
             
             # Avoid clashes between fields that were inherited
-            fields_to_remove = set()
-            for base in bases:
-                for field in fields:
-                    base_fields = _get_model_fields(base)
-                    if field in base_fields:
-                        fields_to_remove.add(field)
+            fields_to_remove = kwargs.get('inherited_fields')
+            if fields_to_remove is None:
+                fields_to_remove = set()
+                for base in bases:
+                    fields_to_remove.update(_get_model_fields(base))
             for field in fields_to_remove:
                 fields.pop(field, None)
         
         # Clone any related fields
+        templates = kwargs.get('templates') or {}
         for field in fields:
             fields[field] = clone_related_field(
                     field_obj=fields[field], db=kwargs.get('db', None),
-                    schema=kwargs.get('schema', None),)
+                    schema=kwargs.get('schema', None),
+                    template=templates.get(field))
         
         # Add the fields
         attrs.update(fields)
@@ -334,49 +595,118 @@ def create_model(
     return model
 
 
-def clone_related_field(field_obj, db, schema):
+def clone_related_field(field_obj, db, schema, template=None):
     """Clone an existing relationship field.
     
     For new models based on databases and schemas, the related fields
     involved will also need to be created. This allows for proper
     implicit validation, as well as proper model fetching.
     
-    If the field isn't a relationship field, then just return the input
-    field object.
+    The new field only refers to the clone of its target by label, and
+    the target is built the first time it's needed, unless a clone with
+    that label was registered by then.
+    
+    If the field isn't a relationship field, then just return a new
+    field just like it, so the source model keeps its own fields.
     
     Args:
         field_obj (object): Any field object.
         db (str): Alias of the database to be used.
         schema (str): Name of the schema to be used.
+        template (Optional[class]): From `get_field_template`, shared
+            by every clone of the field. Made for this clone alone if
+            not given.
     
     Returns:
         object: Field object.
     
     """
+    # Everything the clones have in common lives on the template
+    if template is None:
+        template = get_field_template(field_obj)
+    new_field_obj = template.__new__(template)
+    new_field_obj.__dict__.update(template._template_own_attrs)
+    
+    # Containers are copied, so changing one clone's leaves the others
+    for attr in template._template_containers:
+        new_field_obj.__dict__[attr] = copy(getattr(template, attr))
     
     # Is it a relationship field?
     if not field_obj.rel:
-        return field_obj
+        return new_field_obj
+    
+    # Refer to the clone of the target by label, built on first use
+    target = template._lazy_target
+    label = '%s.%s' % (target._meta.app_label,
+            _get_serial_name(target, db, schema))
     
-    # Get the appropriate class to inject
-    new_model_cls = field_obj.rel.to.set_db(db=db, schema=schema)
+    # Keep the relation to ourselves so the source field isn't altered
+    new_field_obj.remote_field = copy(field_obj.remote_field)
+    new_field_obj.remote_field.field = new_field_obj
+    new_field_obj.remote_field.model = label
+    new_field_obj._lazy_db = db
+    new_field_obj._lazy_schema = schema
     
-    # Create the object for this field
-    new_field_obj = field_obj.__class__(new_model_cls)
+    # Return the fresh field
+    return new_field_obj
+
+
+_CLONE_FIELD_ATTRS = frozenset(['model', 'opts', '_lazy_db', '_lazy_schema'])
+"""Field attributes that every clone holds for itself."""
+
+
+_CLONE_FIELD_CONTAINERS = frozenset(['choices', '_validators'])
+"""Mutable field attributes that every clone gets its own copy of."""
+
+
+def get_field_template(field_obj):
+    """Make a class out of the state that clones of a field share.
     
-    # Transfer over all the field attributes
-    attrs = field_obj.__dict__.keys()
-    for attr in attrs:
-        value = getattr(field_obj, attr)
-        if (isinstance(value, list) or
-                isinstance(value, dict) or
-                isinstance(value, set)):
-            value = deepcopy(value)
-        setattr(new_field_obj, attr, value)
+    The template subclasses the field's class, and holds the field's
+    attributes as class attributes. Clones are instances of it that
+    only hold what differs between them, such as their model and their
+    relation, in their own `__dict__`. The field's choices and
+    validators are copied onto each clone, so adding to them on one
+    clone leaves the others alone. The rest of the shared attributes
+    must not be modified.
     
-    # Make sure this new field reflects the correct target
-    new_field_obj.model = new_model_cls
-    new_field_obj.rel.model = new_model_cls
+    Attributes that are cached per model are left out. Those that would
+    turn into methods as class attributes, like a callable `default`,
+    are copied onto each clone instead.
     
-    # Return the fresh field
-    return new_field_obj
\ No newline at end of file
+    Args:
+        field_obj (object): Any field object.
+    
+    Returns:
+        class: Subclass of the field's class, or of its lazy version
+            for relationship fields.
+    
+    """
+    field_cls = field_obj.__class__
+    shared = {}
+    skipped = _CLONE_FIELD_ATTRS
+    if field_obj.rel:
+        skipped = skipped | frozenset(['remote_field'])
+        field_cls = lazy_field_class(field_cls)
+        shared['_lazy_target'] = (getattr(field_obj, '_lazy_target', None) or
+                field_obj.rel.to)
+        shared['_lazy_source'] = field_obj
+    
+    # Callables stay on each clone, where they don't turn into methods
+    own = {}
+    containers = []
+    for attr, value in field_obj.__dict__.items():
+        if attr in skipped or attr in shared:
+            continue
+        if isinstance(getattr(field_cls, attr, None), cached_property):
+            continue
+        if hasattr(type(value), '__get__'):
+            own[attr] = value
+            continue
+        if attr in _CLONE_FIELD_CONTAINERS:
+            containers.append(attr)
+        shared[attr] = value
+    shared['_template_own_attrs'] = own
+    shared['_template_containers'] = tuple(containers)
+    shared['__module__'] = field_cls.__module__
+    return type(field_cls.__name__, (field_cls,), shared)
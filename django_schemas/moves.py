@@ -0,0 +1,301 @@
+"""
+Moving a tenant's schema from one database to another.
+
+`move_schema` migrates the schema on the target database, streams every
+table over with `COPY ... TO STDOUT` and `COPY ... FROM STDIN` through a
+pipe, so rows never pile up in Python, sets the sequences to where they
+were, checks that each table has as many rows on both sides, and only
+then routes the tenant to the target::
+
+    report = move_schema('db1', 'db2', 'sample_environment', tenant=42)
+    print(report.rows_per_second, report.mb_per_second)
+
+Reads of the source keep being served while its tables are copied.
+Writes to them wait until the tenant is placed on the target, see
+`django_schemas.shards.place_tenant`, and then fail: the source tables
+get triggers that refuse writes, committed along with the placement.
+Processes that haven't read the placement yet get an error rather than
+writing to the old copy. The source schema is otherwise left alone, to
+be dropped with `django_schemas.migrations.flush` once nothing reads
+from it.
+
+Moving a schema without a tenant only copies it. Nothing routes to the
+copy, and the source takes writes as before, until the settings say
+otherwise.
+"""
+
+import collections
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.dispatch import Signal
+
+from .exceptions import ConfigError
+from .migrations import flush, migrate
+from .shards import get_shard_map, place_tenant
+from .utils import get_setting, quote_schema
+
+
+schema_moved = Signal(providing_args=[
+        'source', 'target', 'schema', 'environment', 'tenant', 'report'])
+"""Sent once a schema is moved, eg. to save where its tenant lives."""
+
+
+class MoveReport(collections.namedtuple('MoveReport', [
+        'tables', 'rows', 'bytes', 'seconds'])):
+    """How much `move_schema` copied, and how long it took.
+
+    Attributes:
+        tables (int): Tables copied.
+        rows (int): Rows copied, over every table.
+        bytes (int): Size of the rows in COPY's text format.
+        seconds (float): Time taken, migrations included.
+
+    """
+
+    __slots__ = ()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / 1048576.0 / self.seconds if self.seconds else 0.0
+
+
+def move_schema(source, target, environment, schema=None, tenant=None):
+    """Copy a schema to another database, and route its tenant there.
+
+    Args:
+        source (str): Alias of the database the schema is on.
+        target (str): Alias of the database to move it to, which mustn't
+            have the schema yet.
+        environment (str): Environment whose migrations make the schema.
+        schema (Optional[str]): Name of the schema. Defaults to the
+            environment's `SCHEMA_NAME`, or the tenant's schema.
+        tenant (mixed): Tenant of a sharded environment to route to the
+            target once the copy is verified, see `place_tenant`.
+            Without one the schema is only copied, and routing is left
+            to the settings.
+
+    Returns:
+        MoveReport
+
+    Raises:
+        ConfigError: If the schema can't be found, or is on the target
+            already, or the target's tables don't match the source's, or
+            there's a tenant and nowhere to save its placement.
+
+    """
+    started = time.time()
+    if not schema:
+        schema = settings.DATABASE_ENVIRONMENTS[environment].get('SCHEMA_NAME')
+    if not schema and tenant is not None:
+        schema = get_shard_map(environment).get_schema(tenant)
+    if not schema:
+        raise ConfigError("schema required and not present")
+    if not _has_schema(source, schema):
+        raise ConfigError("%s has no schema %s" % (source, schema))
+    if _has_schema(target, schema):
+        raise ConfigError("%s already has schema %s" % (target, schema))
+    if tenant is not None and not get_setting('DATABASE_SHARDS', {}).get(
+            environment, {}).get('PLACEMENTS'):
+        raise ConfigError(environment + " has no PLACEMENTS database")
+
+    # Make the tables, and drop them again if anything goes wrong
+    migrate(db=target, schema=schema, environment=environment)
+    try:
+
+        # Writers to the source wait until it's fenced off, or not moved
+        with transaction.atomic(using=source):
+            tables, rows, size = _copy_schema(source, target, schema)
+
+            # Only now is it safe to route to the target
+            if tenant is not None:
+                _fence_schema(source, schema)
+                place_tenant(environment, tenant, target, schema)
+    except Exception:
+        flush(db=target, schema=schema)
+        raise
+    report = MoveReport(tables, rows, size, time.time() - started)
+    schema_moved.send(
+            sender=MoveReport, source=source, target=target, schema=schema,
+            environment=environment, tenant=tenant, report=report)
+    return report
+
+
+def _has_schema(db, schema):
+    """Whether a database has a schema."""
+    cursor = connections[db].cursor()
+    cursor.execute(
+            "SELECT 1 FROM information_schema.schemata WHERE schema_name = %s",
+            (schema,))
+    return cursor.fetchone() is not None
+
+
+def _get_tables(db, schema):
+    """Respond with the columns of each table in a schema, in order."""
+    cursor = connections[db].cursor()
+    cursor.execute("""
+        SELECT c.table_name, c.column_name
+        FROM information_schema.columns c
+        JOIN information_schema.tables t
+            ON t.table_schema = c.table_schema
+            AND t.table_name = c.table_name
+        WHERE c.table_schema = %s
+            AND t.table_type = 'BASE TABLE'
+            AND t.table_name != 'django_migrations'
+        ORDER BY c.table_name, c.ordinal_position
+    """, (schema,))
+    tables = collections.OrderedDict()
+    for table, column in cursor.fetchall():
+        tables.setdefault(table, []).append(column)
+    return tables
+
+
+def _copy_schema(source, target, schema):
+    """Copy every table and sequence of a schema.
+
+    Locks the source tables against writes, until the transaction the
+    caller has open on the source ends. The copy is committed on the
+    target by the time this returns.
+
+    Returns:
+        Tuple of the tables, rows and bytes copied.
+
+    """
+    tables = _get_tables(source, schema)
+    missing = set(tables) - set(_get_tables(target, schema))
+    if missing:
+        raise ConfigError("%s has no tables %s in %s" % (
+                target, ', '.join(sorted(missing)), schema))
+    quote = connections[source].ops.quote_name
+    names = collections.OrderedDict(
+            (table, '%s.%s' % (quote_schema(schema), quote(table)))
+            for table in tables)
+
+    size = 0
+    with transaction.atomic(using=target):
+        src = connections[source].cursor()
+        dst = connections[target].cursor()
+        if names:
+
+            # Writers wait for the copy, readers don't
+            src.execute("LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE" % (
+                    ', '.join(names.values())))
+            dst.execute("SET CONSTRAINTS ALL DEFERRED")
+            dst.execute("TRUNCATE %s" % ', '.join(names.values()))
+        for table, name in names.items():
+            columns = ', '.join(quote(column) for column in tables[table])
+            size += _stream(
+                    src, "COPY %s (%s) TO STDOUT" % (name, columns),
+                    dst, "COPY %s (%s) FROM STDIN" % (name, columns))
+
+        # Both sides have to agree before anything routes to the target
+        rows = 0
+        for table, name in names.items():
+            count = "SELECT count(*) FROM %s" % name
+            src.execute(count)
+            dst.execute(count)
+            expected, copied = src.fetchone()[0], dst.fetchone()[0]
+            if expected != copied:
+                raise ConfigError("copied %d of %d rows of %s" % (
+                        copied, expected, name))
+            rows += copied
+        _copy_sequences(src, dst, schema, quote)
+    return len(names), rows, size
+
+
+def _fence_schema(db, schema):
+    """Make every table of a schema refuse writes, eg. once it's moved."""
+    cursor = connections[db].cursor()
+    function = '%s.django_schemas_moved' % quote_schema(schema)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION %s() RETURNS trigger AS $$
+        BEGIN
+            RAISE EXCEPTION 'schema %% has moved to another database',
+                TG_TABLE_SCHEMA;
+        END
+        $$ LANGUAGE plpgsql
+    """ % function)
+    quote = connections[db].ops.quote_name
+    for table in _get_tables(db, schema):
+        cursor.execute("""
+            CREATE TRIGGER django_schemas_moved
+            BEFORE INSERT OR UPDATE OR DELETE OR TRUNCATE ON %s.%s
+            FOR EACH STATEMENT EXECUTE PROCEDURE %s()
+        """ % (quote_schema(schema), quote(table), function))
+
+
+def _copy_sequences(src, dst, schema, quote):
+    """Set each sequence on the target to where it is on the source."""
+    src.execute("""
+        SELECT sequence_name FROM information_schema.sequences
+        WHERE sequence_schema = %s
+    """, (schema,))
+    for (sequence,) in src.fetchall():
+        name = '%s.%s' % (quote_schema(schema), quote(sequence))
+        src.execute("SELECT last_value, is_called FROM %s" % name)
+        last_value, is_called = src.fetchone()
+        dst.execute(
+                "SELECT setval(%s, %s, %s)", (name, last_value, is_called))
+
+
+def _stream(src, copy_out, dst, copy_in):
+    """Pipe the output of one COPY into another.
+
+    The source cursor writes from a thread while the target reads, so
+    no more than a pipe's buffer of rows is ever held.
+
+    Returns:
+        The number of bytes copied.
+
+    """
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, 'rb')
+    writer = _CountingWriter(os.fdopen(write_fd, 'wb'))
+    errors = []
+
+    def run():
+        try:
+            src.copy_expert(copy_out, writer)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                writer.close()
+            except (IOError, OSError):
+                pass
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        dst.copy_expert(copy_in, reader)
+    finally:
+
+        # Stops the writer too, if the target gave up early
+        reader.close()
+        thread.join()
+    if errors:
+        raise errors[0]
+    return writer.bytes
+
+
+class _CountingWriter(object):
+    """File to write to that counts what goes through it."""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,211 @@
+"""
+Querysets bound to a database and schema without cloning their model.
+
+`set_db` builds a whole new model class for every db and schema pair.
+The queryset here keeps the original model instead, and only qualifies
+its table names with the schema when the SQL gets compiled.
+"""
+
+from django.db import connections
+from django.db.models import sql
+from django.db.models.query import ModelIterable, QuerySet
+
+from .routers import using_schema
+
+
+_COMPILER_CLASSES = {}
+"""Schema-aware subclasses of compiler classes, keyed by base class."""
+
+
+_QUERY_CLASSES = {}
+"""Schema-aware subclasses of query classes, keyed by base class."""
+
+
+class SchemaCompilerMixin(object):
+    """Qualifies every table of the compiled query with its schema."""
+
+    def get_table_schema(self, table):
+        """Respond with the schema to qualify a table with, if any."""
+        return self.query.schema_name
+
+    def quote_name_unless_alias(self, name):
+        if name in self.query.table_map and '"."' not in name:
+            schema = self.get_table_schema(name)
+            if schema:
+                return self.connection.ops.quote_name(
+                        '%s"."%s' % (schema, name))
+        return super(SchemaCompilerMixin, self).quote_name_unless_alias(name)
+
+    def as_sql(self, *args, **kwargs):
+        result = super(SchemaCompilerMixin, self).as_sql(*args, **kwargs)
+        if not isinstance(self, sql.compiler.SQLInsertCompiler):
+            return result
+
+        # Inserts name their table straight from the model's meta
+        qn = self.connection.ops.quote_name
+        table = self.query.get_meta().db_table
+        schema = self.get_table_schema(table)
+        if '"."' in table or not schema:
+            return result
+        plain = 'INSERT INTO %s' % qn(table)
+        qualified = 'INSERT INTO %s' % qn('%s"."%s' % (schema, table))
+        return [(statement.replace(plain, qualified, 1), params)
+                for statement, params in result]
+
+
+class SchemaQueryMixin(object):
+    """Query that compiles with a SchemaCompilerMixin compiler."""
+
+    schema_name = None
+
+    def clone(self, klass=None, **kwargs):
+        if klass is not None:
+            klass = schema_query_class(klass)
+        obj = super(SchemaQueryMixin, self).clone(klass, **kwargs)
+        obj.schema_name = self.schema_name
+        return obj
+
+    def get_compiler(self, using=None, connection=None):
+        compiler = super(SchemaQueryMixin, self).get_compiler(
+                using, connection)
+        base = compiler.__class__
+        if issubclass(base, SchemaCompilerMixin):
+            return compiler
+        if base not in _COMPILER_CLASSES:
+            _COMPILER_CLASSES[base] = type(
+                    'Schema' + base.__name__, (SchemaCompilerMixin, base), {})
+        compiler.__class__ = _COMPILER_CLASSES[base]
+        return compiler
+
+
+def schema_query_class(klass):
+    """Return the schema-aware version of a query class."""
+    if issubclass(klass, SchemaQueryMixin):
+        return klass
+    if klass not in _QUERY_CLASSES:
+        _QUERY_CLASSES[klass] = type(
+                'Schema' + klass.__name__, (SchemaQueryMixin, klass), {})
+    return _QUERY_CLASSES[klass]
+
+
+def schema_query(query, schema):
+    """Bind a query to a schema in place.
+
+    Args:
+        query (Query): Any Django query.
+        schema (str): Name of the schema to qualify tables with.
+
+    Returns:
+        The same query.
+
+    """
+    query.__class__ = schema_query_class(query.__class__)
+    query.schema_name = schema
+    return query
+
+
+class SchemaModelIterable(ModelIterable):
+    """Remembers the db and schema on each instance it yields."""
+
+    def __iter__(self):
+        hints = self.queryset._hints
+        for obj in super(SchemaModelIterable, self).__iter__():
+            obj._state.db_name = hints['db_name']
+            obj._state.schema_name = hints['schema_name']
+            yield obj
+
+
+class SchemaQuerySet(QuerySet):
+    """
+    Queryset that can be bound to a database and schema with
+    `in_schema`, without creating a new model class.
+
+    The bound database is handed to the router as the `db_name` hint, so
+    reads still go to its replicas. Instances fetched or created through
+    the queryset remember their db and schema, and save back to them.
+
+    Deletes collect related records and send signals as usual, with
+    the connection pointed to the schema while they run. Related objects
+    followed from instances and `refresh_from_db` aren't bound, and still
+    use the model's own table. Use `set_db` where those are needed.
+    """
+
+    def in_schema(self, db, schema):
+        """Bind this queryset to a database and schema.
+
+        Args:
+            db (str): Alias of the database to use.
+            schema (str): Name of the schema to use.
+
+        Returns:
+            A copy of this queryset.
+
+        """
+        clone = self._clone()
+        schema_query(clone.query, schema)
+        clone._hints = dict(self._hints, db_name=db, schema_name=schema)
+        if clone._iterable_class is ModelIterable:
+            clone._iterable_class = SchemaModelIterable
+        return clone
+
+    @property
+    def schema_name(self):
+        """Respond with the schema this queryset is bound to."""
+        return self._hints.get('schema_name')
+
+    def create(self, **kwargs):
+        if not self.schema_name:
+            return super(SchemaQuerySet, self).create(**kwargs)
+        obj = self.model(**kwargs)
+        obj._state.db_name = self._hints['db_name']
+        obj._state.schema_name = self.schema_name
+        self._for_write = True
+        obj.save(force_insert=True, using=self.db)
+        return obj
+
+    def delete(self):
+        """
+        Delete the records on the bound schema, along with the related
+        records Django collects for them, which live on it too.
+        """
+        if not self.schema_name:
+            return super(SchemaQuerySet, self).delete()
+        with using_schema(self._hints['db_name'], self.schema_name,
+                getattr(self.model._meta, 'db_environment', None)):
+            return super(SchemaQuerySet, self).delete()
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def _raw_delete(self, using):
+        if not self.schema_name:
+            return super(SchemaQuerySet, self)._raw_delete(using)
+        query = schema_query(sql.DeleteQuery(self.model), self.schema_name)
+        return query.delete_qs(self, using)
+    _raw_delete.alters_data = True
+
+    def _insert(self, objs, fields, return_id=False, raw=False, using=None):
+        if not self.schema_name:
+            return super(SchemaQuerySet, self)._insert(
+                    objs, fields, return_id=return_id, raw=raw, using=using)
+        self._for_write = True
+        if using is None:
+            using = self.db
+        query = schema_query(sql.InsertQuery(self.model), self.schema_name)
+        query.insert_values(fields, objs, raw=raw)
+        return query.get_compiler(using=using).execute_sql(return_id)
+    _insert.alters_data = True
+    _insert.queryset_only = False
+
+    def _batched_insert(self, objs, fields, batch_size):
+        if not self.schema_name:
+            return super(SchemaQuerySet, self)._batched_insert(
+                    objs, fields, batch_size)
+        for obj in objs:
+            obj._state.db_name = self._hints['db_name']
+            obj._state.schema_name = self.schema_name
+        if not objs:
+            return
+        ops = connections[self.db].ops
+        batch_size = (batch_size or max(ops.bulk_batch_size(fields, objs), 1))
+        for i in range(0, len(objs), batch_size):
+            self._insert(objs[i:i + batch_size], fields=fields, using=self.db)
@@ -0,0 +1,175 @@
+"""
+Policies for picking which replica of a database serves a read.
+
+`get_random_read` hands the replicas of a database to the policy named
+by the `DATABASE_REPLICA_POLICY` setting, which is one of `random`,
+`round_robin`, `weighted` or `least_outstanding`, or the dotted path to
+a `ReplicaPolicy` subclass. Policies are shared by every thread, so any
+state they keep must be safe to share.
+
+With `DATABASE_REPLICA_AFFINITY` set, the first replica picked for each
+database in a context is kept for the rest of it, see
+`django_schemas.context`. A request then holds one connection per
+database rather than one per replica, and all of its reads see the
+same replica. Contexts are reset as each request starts and finishes.
+"""
+
+import bisect
+import itertools
+import random
+
+from django.conf import settings
+from django.core.signals import (
+        request_finished, request_started, setting_changed)
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .backends.usage import outstanding
+from .context import ContextLocal
+from .utils import get_setting
+
+
+_POLICY = None
+"""Current `ReplicaPolicy`, made on first use."""
+
+
+_PINNED = ContextLocal('django_schemas_replicas', default={})
+"""Replica kept for each database, for the current context."""
+
+
+class ReplicaPolicy(object):
+    """Picks a replica of a database for each read."""
+
+    def choose(self, alias, replicas, topology):
+        """Pick one of the replicas.
+
+        Args:
+            alias (str): The write database the replicas belong to.
+            replicas (tuple): Aliases of its replicas, never empty.
+            topology (Topology): The current database topology.
+
+        Returns:
+            The alias of the replica to read from.
+
+        """
+        raise NotImplementedError
+
+
+class RandomPolicy(ReplicaPolicy):
+    """Any replica, with the same chance for each."""
+
+    def choose(self, alias, replicas, topology):
+        return random.choice(replicas)
+
+
+class RoundRobinPolicy(ReplicaPolicy):
+    """Each replica of a database in turn."""
+
+    def __init__(self):
+        self._counters = {}
+
+    def choose(self, alias, replicas, topology):
+        counter = self._counters.get(alias)
+        if counter is None:
+            counter = self._counters.setdefault(alias, itertools.count())
+        return replicas[next(counter) % len(replicas)]
+
+
+class WeightedPolicy(ReplicaPolicy):
+    """Replicas in proportion to the `WEIGHT` of their database entry."""
+
+    def choose(self, alias, replicas, topology):
+        totals = []
+        total = 0.0
+        for replica in replicas:
+            total += max(topology.weights.get(replica, 1.0), 0.0)
+            totals.append(total)
+        if not total:
+            return random.choice(replicas)
+        return replicas[bisect.bisect_right(totals, random.random() * total)]
+
+
+class LeastOutstandingPolicy(ReplicaPolicy):
+    """
+    The replica with the fewest queries running from this process, or
+    any one of them when several are tied.
+    """
+
+    def choose(self, alias, replicas, topology):
+        least = None
+        picks = []
+        for replica in replicas:
+            count = outstanding(replica)
+            if least is None or count < least:
+                least = count
+                picks = [replica]
+            elif count == least:
+                picks.append(replica)
+        if len(picks) == 1:
+            return picks[0]
+        return random.choice(picks)
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'round_robin': RoundRobinPolicy,
+    'weighted': WeightedPolicy,
+    'least_outstanding': LeastOutstandingPolicy,
+}
+"""Built-in policies, by their name in `DATABASE_REPLICA_POLICY`."""
+
+
+def get_policy():
+    """Respond with the policy set by `DATABASE_REPLICA_POLICY`."""
+    global _POLICY
+    policy = _POLICY
+    if policy is None:
+        name = getattr(settings, 'DATABASE_REPLICA_POLICY', 'random')
+        policy_cls = POLICIES.get(name)
+        if policy_cls is None:
+            policy_cls = import_string(name)
+        policy = _POLICY = policy_cls()
+    return policy
+
+
+def choose_replica(alias, replicas, topology):
+    """Pick a replica of a database for a read.
+
+    Args:
+        alias (str): The write database the replicas belong to.
+        replicas (tuple): Aliases of its replicas fit to read from,
+            never empty.
+        topology (Topology): The current database topology.
+
+    Returns:
+        The alias of the replica to read from.
+
+    """
+    if not get_setting('DATABASE_REPLICA_AFFINITY', False):
+        return get_policy().choose(alias, replicas, topology)
+
+    # Keep the replica of this context while it's fit to read from
+    pinned = _PINNED.get()
+    replica = pinned.get(alias)
+    if replica in replicas:
+        return replica
+    replica = get_policy().choose(alias, replicas, topology)
+    pinned = dict(pinned)
+    pinned[alias] = replica
+    _PINNED.set(pinned)
+    return replica
+
+
+@receiver(request_started)
+@receiver(request_finished)
+def forget_replicas(**kwargs):
+    """Let the current context pick new replicas."""
+    _PINNED.reset()
+
+
+@receiver(setting_changed)
+def _reset_policy(setting, **kwargs):
+    """Make the policy again when DATABASE_REPLICA_POLICY changes."""
+    if setting == 'DATABASE_REPLICA_POLICY':
+        global _POLICY
+        _POLICY = None
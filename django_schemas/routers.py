@@ -5,10 +5,13 @@ Automatic database server connections based on the type of object being
 called and whether it's a read or write operation.
 """
 
+from contextlib import contextmanager
 from django.conf import settings
-from .utils import dbs_by_environment, is_read_db
-import random
-import re
+from .health import healthy_replicas
+from .replicas import choose_replica
+from .shards import locate_tenant
+from .sticky import is_sticky, remember_write
+from .topology import get_topology
 
 from .backends import conf
 
@@ -18,31 +21,21 @@ class ExplicitRouter:
     
     def db_for_write(self, model, **hints):
         """Pick a write node to write on."""
-        
-        # Is it already defined?
-        db = getattr(model._meta, 'db_name', None)
-        if db:
-            return db
-        
-        # Is there an environment we can look in?
-        env = getattr(model._meta, 'db_environment', None)
-        if env:
-            
-            # Is there a single alias for this job?
-            aliases = dbs_by_environment(env, write_only=True)
-            if len(aliases) == 1:
-                return list(aliases)[0]
-        
-        # Nothing worked, return default
-        return 'default'
+        alias = _get_write_db(model, **hints)
+        remember_write(alias)
+        return alias
     
     
     def db_for_read(self, model, **hints):
         """Pick a read node to read from."""
         
-        # DB for write already does what we need
-        alias = self.db_for_write(model, **hints)
+        # Reads follow the node that writes would go to
+        alias = _get_write_db(model, **hints)
         if alias:
+            
+            # Reads right after a write see it on the write node
+            if is_sticky(alias):
+                return alias
             return get_random_read(alias)
         return 'default'
     
@@ -55,8 +48,8 @@ class ExplicitRouter:
         environment.
         """
         # Explicit db's?
-        db1 = getattr(obj1._meta, 'db_name', None)
-        db2 = getattr(obj2._meta, 'db_name', None)
+        db1 = _get_db_name(obj1, instance=obj1)
+        db2 = _get_db_name(obj2, instance=obj2)
         if db1 or db2:
             return db1 == db2
         
@@ -72,7 +65,8 @@ class ExplicitRouter:
         question versus the model's environment.
         """
         # Read nodes are never ok
-        if is_read_db(db):
+        topology = get_topology()
+        if topology.is_read(db):
             return False
         
         # Model is required to make an assessment
@@ -81,7 +75,7 @@ class ExplicitRouter:
         
         # Get each environment(s) settings
         model_env = getattr(model._meta, 'db_environment', None)
-        db_envs = settings.DATABASES[db].get('ENVIRONMENTS', [])
+        db_envs = topology.environments.get(db, ())
         
         # Are neither environments set?
         if not model_env and not db_envs:
@@ -92,29 +86,81 @@ class ExplicitRouter:
             if model_env in db_envs:
                 
                 # Is there a specific schema to adhere to?
-                global conf
+                state = conf.get_state()
                 env_settings = settings.DATABASE_ENVIRONMENTS[model_env]
                 specific_schema = env_settings.get('SCHEMA_NAME', None)
                 
                 # If there is one, adhere to it
                 if specific_schema:
-                    return conf.SCHEMA_NAME == specific_schema
+                    return state.schema_name == specific_schema
                 
                 # Is an environment set on the wrapper, too?
-                if conf.ENVIRONMENT_NAME:
-                    return conf.ENVIRONMENT_NAME == model_env
+                if state.environment_name:
+                    return state.environment_name == model_env
                 
                 # Is it totally free range?
-                if not specific_schema and not conf.SCHEMA_NAME:
+                if not specific_schema and not state.schema_name:
                     return True
         
         # Mismatch of environment settings
         return False
 
+
+
+def _get_write_db(model, **hints):
+    """Find the write node for a model, as `db_for_write` does."""
+    
+    # Is it already defined?
+    db = _get_db_name(model, **hints)
+    if db:
+        return db
+    
+    # Is it a tenant of a sharded environment?
+    env = getattr(model._meta, 'db_environment', None)
+    if env and hints.get('tenant') is not None:
+        return locate_tenant(env, hints['tenant'])[0]
+    
+    # Is there an environment we can look in?
+    if env:
+        
+        # Has the context picked one of its databases?
+        db = conf.get_state().db_name
+        topology = get_topology()
+        if db and env in topology.environments.get(db, ()):
+            return db
+        
+        # Is there a single alias for this job?
+        aliases = topology.writes.get(env, ())
+        if len(aliases) == 1:
+            return aliases[0]
+    
+    # Nothing worked, return default
+    return 'default'
+
+
+def _get_db_name(model, **hints):
+    """
+    Find the database a model is bound to, either from a `db_name`
+    hint, an instance from `in_schema`, or the model's meta.
+    """
+    db = hints.get('db_name')
+    if db:
+        return db
+    state = getattr(hints.get('instance'), '_state', None)
+    db = getattr(state, 'db_name', None)
+    if db:
+        return db
+    return getattr(model._meta, 'db_name', None)
+
         
 def get_random_read(name):
     """Get's a random read replica based on the requested name.
     
+    Which replica is up to the `DATABASE_REPLICA_POLICY` setting, and
+    is picked at random by default. Replicas that `django_schemas.health`
+    finds failing or lagging are left out, and the primary is used when
+    none are left.
+    
     Args:
         name (str): Primary database whose name to change to a read node.
         
@@ -125,17 +171,19 @@ def get_random_read(name):
         ValueError: If the supplied name is not a valid database option.
     
     """
-    # Get all the keys that start with this name
-    names = settings.DATABASES.keys()
-    keys = [k for k in names if is_read_db(k, name)]
-    if keys:
+    # Let the replica policy pick a healthy read node to use
+    topology = get_topology()
+    replicas = topology.replicas.get(name)
+    if replicas:
+        replicas = healthy_replicas(replicas)
+        if replicas:
+            return choose_replica(name, replicas, topology)
         
-        # Pick a random read node to use
-        return random.choice(keys)
-        return names[index]
+        # Fall back to the primary when no replica is fit to read
+        return name
         
     # Does the original even exist?
-    if name in names:
+    if name in topology.roles:
         return name
         
     # Return default
@@ -145,6 +193,9 @@ def get_random_read(name):
 def set_db(schema=None, db=None, environment=None):
     """Set the database wrapper variables for migration purposes.
     
+    Applies to the current context until it's called again, see
+    `using_schema` for a scoped version.
+    
     Args:
         db (Optional[str]): Name of the database to use for routing.
         schema (Optional[str]): Name of the schema to use for routing.
@@ -152,14 +203,58 @@ def set_db(schema=None, db=None, environment=None):
             routing and migration.
     
     """
-    global conf
-    conf.SCHEMA_NAME = schema
-    conf.ENVIRONMENT_NAME = environment
-    conf.ADDITIONAL_SCHEMAS = []
+    conf.set_state(_get_schema_state(db, schema, environment))
+
+
+@contextmanager
+def using_schema(db=None, schema=None, environment=None):
+    """
+    Point connections to a schema, and route to a database, for the
+    code run inside. Other threads and asyncio tasks are unaffected.
+    
+    Models without a db of their own are routed to `db`, as long as
+    their environment is on it. Connections to `db`, or to every
+    database if it's None, search `schema` first.
+    
+    Args:
+        db (Optional[str]): Alias of the database to use.
+        schema (Optional[str]): Name of the schema to use.
+        environment (Optional[str]): Name of the environment, whose
+            `ADDITIONAL_SCHEMAS` are searched after the schema.
+    
+    """
+    previous = conf.set_state(_get_schema_state(db, schema, environment))
+    try:
+        yield
+    finally:
+        conf.set_state(previous)
+
+
+@contextmanager
+def using_tenant(environment, key):
+    """
+    Run the code inside on the database and schema that
+    `DATABASE_SHARDS` places a tenant of an environment on, as
+    `using_schema` would.
+    
+    Args:
+        environment (str): Name of the environment.
+        key (mixed): Anything that identifies the tenant.
+    
+    """
+    db, schema = locate_tenant(environment, key)
+    with using_schema(db=db, schema=schema, environment=environment):
+        yield
+
+
+def _get_schema_state(db, schema, environment):
+    """Build the conf.SchemaState for a db, schema and environment."""
+    additional = ()
     
     # If environment has additional schemas, include them
     a = settings.DATABASE_ENVIRONMENTS.get(environment, None)
     if a:
         b = a.get('ADDITIONAL_SCHEMAS', None)
         if b and isinstance(b, list):
-            conf.ADDITIONAL_SCHEMAS = b
\ No newline at end of file
+            additional = tuple(b)
+    return conf.SchemaState(db, schema, environment, additional)
\ No newline at end of file
@@ -0,0 +1,323 @@
+"""
+Tenants spread over databases by consistent hashing.
+
+Each environment listed in the `DATABASE_SHARDS` setting places its
+tenants on one of its write databases, and in a schema named after the
+tenant::
+
+    DATABASE_SHARDS = {
+        'sample_environment': {
+            'DATABASES': ['db1', 'db2', 'db3'],
+            'SCHEMA_FORMAT': 'tenant_%s',
+            'OVERRIDES': {'big-customer': 'db4'},
+        },
+    }
+
+`DATABASES` defaults to every write database holding the environment,
+and `SCHEMA_FORMAT` to the tenant key itself. Tenants in `OVERRIDES` go
+to the given alias, or `(alias, schema)` pair, instead. Tenant keys are
+compared as text, so `42` and `'42'` are the same tenant, and their
+schema names may only have letters, digits and underscores. Every database
+gets `POINTS` places on a hash ring, 100 by default, and a tenant goes
+to the database after its own hash on the ring. Adding a database only
+moves the tenants that now land on its points, about 1/n of them.
+
+Tenants moved with `django_schemas.moves` are placed with
+`place_tenant`, on top of the setting. Placements are kept in the
+`django_schemas_placement` table of the `public` schema on the
+environment's `PLACEMENTS` database, so every process routes to them.
+Processes read it again every `PLACEMENTS_INTERVAL` seconds, 5 by
+default, over a connection of their own that doesn't go through Django
+or the routers. That connection gives up after `PLACEMENTS_TIMEOUT`
+seconds, 2 by default, and the last placements read are kept until the
+next try::
+
+    DATABASE_SHARDS = {
+        'sample_environment': {
+            'PLACEMENTS': 'default',
+        },
+    }
+"""
+
+import bisect
+import hashlib
+import logging
+import re
+import time
+
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.utils import six
+
+from .exceptions import ConfigError
+from .topology import get_topology
+from .utils import get_setting
+
+
+logger = logging.getLogger(__name__)
+
+
+PLACEMENTS_TABLE = 'public.django_schemas_placement'
+"""Table that keeps the tenants placed by `place_tenant`."""
+
+
+_SHARD_MAPS = {}
+"""Memoized `(expires, ShardMap)` pairs, keyed by environment."""
+
+
+_SCHEMA_NAME = re.compile(r'^[A-Za-z0-9_]{1,63}\Z')
+"""Schema names tenants may get: letters, digits and underscores."""
+
+
+_PLACED = {}
+"""Last placements read for each environment, keyed by tenant."""
+
+
+_READERS = {}
+"""Connection used to read placements from each database, by alias."""
+
+
+def _hash(value):
+    """Hash a string the same way in every process."""
+    digest = hashlib.md5(six.text_type(value).encode('utf-8')).hexdigest()
+    return int(digest[:16], 16)
+
+
+class ShardMap(object):
+    """Places the tenants of an environment on databases and schemas.
+
+    Args:
+        aliases (list): Write databases to spread tenants over.
+        schema_format (Optional[str]): Schema name, with `%s` for the
+            tenant key.
+        overrides (Optional[dict]): Alias, or `(alias, schema)` pair,
+            of tenants placed by hand.
+        points (Optional[int]): Places of each database on the ring.
+
+    """
+
+    def __init__(self, aliases, schema_format='%s', overrides=None,
+            points=100):
+        if not aliases:
+            raise ConfigError("shard map has no databases")
+        self.schema_format = schema_format
+        self.overrides = dict(
+                (six.text_type(key), override)
+                for key, override in (overrides or {}).items())
+        for override in self.overrides.values():
+            if (not isinstance(override, six.string_types)
+                    and not _SCHEMA_NAME.match(override[1])):
+                raise ConfigError(
+                        "%r is not a valid schema name" % (override[1],))
+        ring = sorted(
+                (_hash('%s#%d' % (alias, i)), alias)
+                for alias in aliases for i in range(points))
+        self._hashes = [point for point, alias in ring]
+        self._aliases = [alias for point, alias in ring]
+
+    def get_schema(self, key):
+        """Respond with the schema name of a tenant.
+
+        Raises:
+            ValueError: If the name has anything but letters, digits
+                and underscores.
+
+        """
+        return _check_schema(self.schema_format % (six.text_type(key),))
+
+    def locate(self, key):
+        """Find where a tenant lives.
+
+        Args:
+            key: Anything that identifies the tenant, eg. its id.
+
+        Returns:
+            Tuple of the database alias and the schema name.
+
+        """
+        key = six.text_type(key)
+        override = self.overrides.get(key)
+        if override is not None:
+            if isinstance(override, six.string_types):
+                return override, self.get_schema(key)
+            return tuple(override)
+        index = bisect.bisect(self._hashes, _hash(key))
+        return self._aliases[index % len(self._aliases)], self.get_schema(key)
+
+
+def _check_schema(schema):
+    """Respond with a schema name, if it's fit for a tenant.
+
+    Raises:
+        ValueError: If it has anything but letters, digits and
+            underscores.
+
+    """
+    if not _SCHEMA_NAME.match(schema):
+        raise ValueError("%r is not a valid schema name" % (schema,))
+    return schema
+
+
+def get_shard_map(environment):
+    """Respond with the ShardMap of an environment.
+
+    Raises:
+        ConfigError: If `DATABASE_SHARDS` doesn't list the environment.
+
+    """
+    now = time.time()
+    expires, shard_map = _SHARD_MAPS.get(environment, (0, None))
+    if now < expires:
+        return shard_map
+    conf = _get_shard_conf(environment)
+    if not conf.get('PLACEMENTS'):
+        return _build_shard_map(environment, conf, float('inf'))
+    _read_placements(conf['PLACEMENTS'], environment,
+            conf.get('PLACEMENTS_TIMEOUT', 2))
+    return _build_shard_map(
+            environment, conf, now + conf.get('PLACEMENTS_INTERVAL', 5))
+
+
+def _get_shard_conf(environment):
+    """Respond with the `DATABASE_SHARDS` entry of an environment."""
+    conf = get_setting('DATABASE_SHARDS', {}).get(environment)
+    if conf is None:
+        raise ConfigError(environment + " has no shard map")
+    return conf
+
+
+def _build_shard_map(environment, conf, expires):
+    """Make the ShardMap of an environment, from the placements read."""
+    overrides = dict(
+            (six.text_type(key), override)
+            for key, override in (conf.get('OVERRIDES') or {}).items())
+    overrides.update(_PLACED.get(environment, {}))
+    aliases = conf.get('DATABASES')
+    if aliases is None:
+        aliases = get_topology().writes.get(environment, ())
+    shard_map = ShardMap(
+            aliases,
+            schema_format=conf.get('SCHEMA_FORMAT', '%s'),
+            overrides=overrides,
+            points=conf.get('POINTS', 100))
+    _SHARD_MAPS[environment] = (expires, shard_map)
+    return shard_map
+
+
+def locate_tenant(environment, key):
+    """Find the database alias and schema of a tenant."""
+    return get_shard_map(environment).locate(key)
+
+
+def place_tenant(environment, key, db, schema):
+    """Route a tenant to a database and schema from now on.
+
+    The placement is saved to the environment's `PLACEMENTS` database,
+    and committed by the time this returns, unless it's called in a
+    transaction on that database. Other processes route there once
+    they read placements again.
+
+    Raises:
+        ConfigError: If the environment has no shard map, or no
+            `PLACEMENTS` database.
+
+    """
+    _check_schema(schema)
+    conf = _get_shard_conf(environment)
+    alias = conf.get('PLACEMENTS')
+    if not alias:
+        raise ConfigError(environment + " has no PLACEMENTS database")
+    key = six.text_type(key)
+    with transaction.atomic(using=alias):
+        cursor = connections[alias].cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS %s (
+                environment varchar(255) NOT NULL,
+                tenant varchar(255) NOT NULL,
+                db varchar(255) NOT NULL,
+                schema varchar(63) NOT NULL,
+                PRIMARY KEY (environment, tenant))
+        """ % PLACEMENTS_TABLE)
+        cursor.execute(
+                "INSERT INTO %s (environment, tenant, db, schema) "
+                "VALUES (%%s, %%s, %%s, %%s) "
+                "ON CONFLICT (environment, tenant) DO UPDATE "
+                "SET db = EXCLUDED.db, schema = EXCLUDED.schema"
+                % PLACEMENTS_TABLE,
+                (environment, key, db, schema))
+
+    # This process knows the latest, even before it's committed
+    _PLACED.setdefault(environment, {})[key] = (db, schema)
+    _build_shard_map(environment, conf,
+            time.time() + conf.get('PLACEMENTS_INTERVAL', 5))
+
+
+def _read_placements(alias, environment, timeout):
+    """Read the placements of an environment's tenants.
+
+    Read over a connection of its own, so routing never routes again or
+    breaks the transaction of the thread's own connection. The last
+    placements read are kept if the database can't be reached within
+    `timeout` seconds.
+    """
+    try:
+        connection = _get_reader(alias, timeout)
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT to_regclass(%s)", (PLACEMENTS_TABLE,))
+            placed = {}
+            if cursor.fetchone()[0] is not None:
+                cursor.execute(
+                        "SELECT tenant, db, schema FROM %s "
+                        "WHERE environment = %%s" % PLACEMENTS_TABLE,
+                        (environment,))
+                for key, db, schema in cursor.fetchall():
+                    placed[key] = (db, schema)
+        finally:
+            cursor.close()
+    except Exception:
+        logger.warning('Could not read the placements of %s from %s',
+                environment, alias, exc_info=True)
+        _close_reader(alias)
+        return
+    _PLACED[environment] = placed
+
+
+def _get_reader(alias, timeout):
+    """Respond with the placement connection of a database."""
+    connection = _READERS.get(alias)
+    if connection is None or connection.closed:
+        wrapper = connections[alias]
+        params = wrapper.get_connection_params()
+        params['connect_timeout'] = timeout
+        connection = wrapper.Database.connect(**params)
+        connection.autocommit = True
+        _READERS[alias] = connection
+    return connection
+
+
+def _close_reader(alias):
+    """Close the placement connection of a database, if it has one."""
+    connection = _READERS.pop(alias, None)
+    if connection is None:
+        return
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def forget_placements():
+    """Read placements again on the next lookup of each environment."""
+    _PLACED.clear()
+    _SHARD_MAPS.clear()
+    for alias in list(_READERS):
+        _close_reader(alias)
+
+
+@receiver(setting_changed)
+def _clear_shard_maps(setting, **kwargs):
+    """Build shard maps again when the settings behind them change."""
+    if setting in ('DATABASE_SHARDS', 'DATABASES'):
+        _SHARD_MAPS.clear()
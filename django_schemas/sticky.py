@@ -0,0 +1,57 @@
+"""
+Reads that follow a write to the same database, for a while.
+
+Replicas can lag behind their primary, so a read right after a write
+may not see it. With `DATABASE_READ_YOUR_WRITES` set to a number of
+seconds, `ExplicitRouter` sends the reads of a context to the primary
+it last wrote to until that many seconds have passed since the write.
+
+Writes are remembered per context, see `django_schemas.context`, and
+forgotten as each request starts and finishes. Code outside of
+requests, eg. task workers, can call `forget_writes` between tasks.
+"""
+
+import time
+
+from django.core.signals import request_finished, request_started
+from django.dispatch import receiver
+
+from .context import ContextLocal
+from .utils import get_setting
+
+
+_WRITES = ContextLocal('django_schemas_writes', default={})
+"""Time until which reads stick to each alias, for the current context."""
+
+
+def remember_write(alias):
+    """Stick the reads of the current context to a database for a while.
+
+    Does nothing unless `DATABASE_READ_YOUR_WRITES` is set.
+
+    Args:
+        alias (str): The database that was written to.
+
+    """
+    window = get_setting('DATABASE_READ_YOUR_WRITES', None)
+    if not window:
+        return
+    writes = dict(_WRITES.get())
+    writes[alias] = time.time() + window
+    _WRITES.set(writes)
+
+
+def is_sticky(alias):
+    """Whether the current context reads from a database it wrote to."""
+    writes = _WRITES.get()
+    if not writes:
+        return False
+    until = writes.get(alias)
+    return until is not None and time.time() < until
+
+
+@receiver(request_started)
+@receiver(request_finished)
+def forget_writes(**kwargs):
+    """Let the reads of the current context go back to replicas."""
+    _WRITES.reset()
@@ -0,0 +1,122 @@
+"""
+Layout of the configured databases, worked out once for routing.
+
+Django asks the router for a database on every query. Rather than
+scanning every alias in `DATABASES` each time, the aliases are sorted
+into write databases, their replicas and their environments once, and
+each routing decision only looks them up. The topology is built when
+the app is ready, and again whenever `DATABASES` changes.
+"""
+
+import collections
+import re
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+READ = 'read'
+WRITE = 'write'
+
+
+_READ_ALIAS = re.compile(r'^(.*)\-read[1-9]+\d*$')
+"""Matches replica aliases as made by `get_database`, eg. `db1-read2`."""
+
+
+_TOPOLOGY = None
+"""Current `Topology`, built on first use."""
+
+
+class Topology(collections.namedtuple('Topology', [
+        'roles', 'writes', 'replicas', 'environments', 'weights'])):
+    """Aliases of the configured databases, sorted for routing.
+
+    Made by `build_topology`, and shared by every router, so none of it
+    is to be modified.
+
+    Attributes:
+        roles (dict): `READ` or `WRITE` for each alias.
+        writes (dict): Sorted tuple of the write aliases holding each
+            environment.
+        replicas (dict): Sorted tuple of the replica aliases of each
+            alias that has any.
+        environments (dict): Frozenset of the environments of each
+            alias.
+        weights (dict): `WEIGHT` of each alias, 1 where not set.
+
+    """
+
+    __slots__ = ()
+
+    def is_read(self, alias):
+        """Whether an alias names a replica, known or not."""
+        role = self.roles.get(alias)
+        if role is None:
+            return bool(_READ_ALIAS.match(alias))
+        return role == READ
+
+
+def build_topology(databases=None):
+    """Sort database aliases by role, environment and replica.
+
+    Args:
+        databases (Optional[dict]): Database settings, otherwise
+            `settings.DATABASES`.
+
+    Returns:
+        Topology
+
+    """
+    if databases is None:
+        databases = settings.DATABASES
+    roles = {}
+    writes = {}
+    replicas = {}
+    environments = {}
+    weights = {}
+    for alias in sorted(databases):
+        weights[alias] = float(databases[alias].get('WEIGHT', 1))
+        envs = frozenset(databases[alias].get('ENVIRONMENTS', []))
+        environments[alias] = envs
+        match = _READ_ALIAS.match(alias)
+        if match:
+            roles[alias] = READ
+            replicas.setdefault(match.group(1), []).append(alias)
+            continue
+        roles[alias] = WRITE
+        for env in envs:
+            writes.setdefault(env, []).append(alias)
+    return Topology(
+            roles=roles,
+            writes=dict((env, tuple(v)) for env, v in writes.items()),
+            replicas=dict((alias, tuple(v)) for alias, v in replicas.items()),
+            environments=environments,
+            weights=weights)
+
+
+def get_topology():
+    """Respond with the current topology, building it if needed."""
+    topology = _TOPOLOGY
+    if topology is None:
+        topology = rebuild_topology()
+    return topology
+
+
+def rebuild_topology():
+    """Build the topology again from the current settings.
+
+    Returns:
+        The new Topology.
+
+    """
+    global _TOPOLOGY
+    _TOPOLOGY = build_topology()
+    return _TOPOLOGY
+
+
+@receiver(setting_changed)
+def _rebuild_on_databases(setting, **kwargs):
+    """Rebuild the topology when DATABASES changes."""
+    if setting == 'DATABASES':
+        rebuild_topology()
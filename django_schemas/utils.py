@@ -1,8 +1,19 @@
 from copy import deepcopy
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 import inspect
 import logging
 import re
+import weakref
+
+
+_METHODS_FROM_CLASS = weakref.WeakKeyDictionary()
+"""Memoized `get_methods_from_class` results, keyed by class."""
+
+
+_SETTINGS = {}
+"""Memoized `get_setting` results, keyed by setting name."""
 
 
 def get_databases(*groups):
@@ -165,17 +176,39 @@ def dict_fetchall(cursor):
     ]
 
 
+def quote_schema(name):
+    """Quote a schema name for SQL, escaping any quotes inside it.
+    
+    Args:
+        name (str): Schema name, as it was made.
+    
+    Returns:
+        The quoted identifier.
+    
+    """
+    return '"%s"' % name.replace('"', '""')
+
+
 def get_methods_from_class(cls):
     """Get a dict of methods from a given class.
     
     This function will ignore inherited methods or other attributes.
     
+    The class is only scanned the first time, and the same dict is
+    handed out after that, so it mustn't be modified. Classes that get
+    methods added or replaced at runtime need to be passed to
+    `forget_methods_from_class` afterwards.
+    
     Args:
         cls (class): The class to scan.
     
     Returns:
         dict: named methods.
     """
+    try:
+        return _METHODS_FROM_CLASS[cls]
+    except KeyError:
+        pass
     output = {}
     attrs = dir(cls)
     for attr in attrs:
@@ -185,9 +218,24 @@ def get_methods_from_class(cls):
             continue
         if original_cls == cls:
             output[attr] = value
+    _METHODS_FROM_CLASS[cls] = output
     return output
 
 
+def forget_methods_from_class(cls=None):
+    """Have `get_methods_from_class` scan a class again.
+    
+    Args:
+        cls (Optional[class]): The class to forget, otherwise all of
+            them.
+    
+    """
+    if cls is None:
+        _METHODS_FROM_CLASS.clear()
+    else:
+        _METHODS_FROM_CLASS.pop(cls, None)
+
+
 def get_class_that_defined_method(meth):
     """Returns the class that created the given method.
     
@@ -212,4 +260,34 @@ def get_class_that_defined_method(meth):
                       meth.__qualname__.split('.<locals>', 1)[0].rsplit('.', 1)[0])
         if isinstance(cls, type):
             return cls
-    return None # not required since None would have been implicitly returned anyway
\ No newline at end of file
+    return None # not required since None would have been implicitly returned anyway
+
+
+def get_setting(name, default=None):
+    """Read a setting, which is only looked up again once it changes.
+    
+    Reading Django settings goes through a few layers of lookups, which
+    adds up for settings read on every query.
+    
+    Args:
+        name (str): Name of the setting.
+        default: Value where the setting isn't set. Every caller of a
+            setting must pass the same one.
+    
+    Returns:
+        The value of the setting.
+    
+    """
+    try:
+        return _SETTINGS[name]
+    except KeyError:
+        pass
+    value = getattr(settings, name, default)
+    _SETTINGS[name] = value
+    return value
+
+
+@receiver(setting_changed)
+def _forget_setting(setting, **kwargs):
+    """Forget the memoized value of a setting when it changes."""
+    _SETTINGS.pop(setting, None)
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Building model clones ahead of the first request.
+
+`set_db` builds a clone the first time a db and schema pair is asked
+for, so the first request to each schema pays for it. Calling
+`warm_models` while a worker starts moves that cost out of the request
+path. Called before a preforking server forks, eg. from a gunicorn
+config with `preload_app = True`, the workers inherit the warmed clones
+instead of building their own.
+"""
+
+import gc
+import time
+
+from django.apps import apps
+from django.conf import settings
+
+from .modelsfactory import EXISTING_MODEL_CLONES
+from .models import BaseModel
+from .utils import dbs_by_environment
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+
+def get_warm_targets(schemas=None, environments=None, databases=None):
+    """List the db and schema pairs that clones can be warmed for.
+
+    Environments with a `SCHEMA_NAME` use that schema, and all others
+    use each of the given schemas.
+
+    Args:
+        schemas (Optional[list]): Schema names for environments that
+            don't specify one.
+        environments (Optional[list]): Names of the environments to
+            warm, otherwise all of them.
+        databases (Optional[list]): Aliases of the databases to warm,
+            otherwise every write database.
+
+    Returns:
+        List of (environment, db, schema) tuples.
+
+    """
+    if environments is None:
+        environments = sorted(getattr(settings, 'DATABASE_ENVIRONMENTS', {}))
+    targets = []
+    for env in environments:
+        env_schema = settings.DATABASE_ENVIRONMENTS[env].get('SCHEMA_NAME')
+        env_schemas = [env_schema] if env_schema else (schemas or [])
+        for db in sorted(dbs_by_environment(env)):
+            if databases is not None and db not in databases:
+                continue
+            for schema in env_schemas:
+                targets.append((env, db, schema))
+    return targets
+
+
+def get_schema_models(environment):
+    """List the models of an environment that can be cloned.
+
+    Args:
+        environment (str): Name of the environment.
+
+    Returns:
+        List of model classes, not including clones.
+
+    """
+    return [
+        model for model in apps.get_models()
+        if issubclass(model, BaseModel) and
+        getattr(model._meta, 'db_environment', None) == environment and
+        not getattr(model._meta, 'db_name', None)]
+
+
+def warm_models(schemas=None, environments=None, databases=None,
+        freeze=False):
+    """Build the clones of every schema model ahead of time.
+
+    Related fields of each clone are resolved as well, so their targets
+    get built in the same batch.
+
+    Args:
+        schemas (Optional[list]): Schema names for environments that
+            don't specify one.
+        environments (Optional[list]): Names of the environments to
+            warm, otherwise all of them.
+        databases (Optional[list]): Aliases of the databases to warm,
+            otherwise every write database.
+        freeze (Optional[bool]): Collect garbage and move everything
+            left to the permanent generation afterwards, so that forked
+            workers don't copy the pages holding the clones when the
+            collector runs. Needs `gc.freeze`, from Python 3.7.
+
+    Returns:
+        dict: `clones` built, `targets` warmed, `seconds` taken,
+            `memory` allocated in bytes, which is None where
+            tracemalloc isn't available, and whether the objects were
+            `frozen`.
+
+    """
+    tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if tracemalloc is not None:
+        memory_before = tracemalloc.get_traced_memory()[0]
+    builds_before = EXISTING_MODEL_CLONES.stats()['builds']
+    started = time.time()
+
+    # Build each clone along with the targets of its relations
+    targets = get_warm_targets(schemas, environments, databases)
+    models_by_env = {}
+    for env, db, schema in targets:
+        if env not in models_by_env:
+            models_by_env[env] = get_schema_models(env)
+        for model in models_by_env[env]:
+            new_model = model.set_db(db=db, schema=schema)
+            for field in new_model._meta.concrete_fields:
+                if hasattr(field, 'resolve_related_model'):
+                    field.resolve_related_model()
+
+    report = {
+        'clones': EXISTING_MODEL_CLONES.stats()['builds'] - builds_before,
+        'targets': len(targets),
+        'seconds': time.time() - started,
+        'memory': None,
+        'frozen': False,
+    }
+    if tracemalloc is not None:
+        report['memory'] = tracemalloc.get_traced_memory()[0] - memory_before
+    if tracing:
+        tracemalloc.stop()
+
+    # Keep the collector from touching the warmed pages after a fork
+    if freeze and hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+        report['frozen'] = True
+    return report
@@ -0,0 +1,85 @@
+"""
+Coroutines for test_6, kept apart since Python 2 can't parse them.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django_schemas.aio import run_sync
+from django_schemas.backends import conf
+from django_schemas.routers import ExplicitRouter, using_schema
+from tests.models import Test1BUser
+
+
+def show_search_path(db):
+    with connections[db].cursor() as cursor:
+        cursor.execute('SHOW search_path')
+        return cursor.fetchone()[0]
+
+
+async def use_schema(db, schema, rounds):
+    """Report what a coroutine on a schema sees, round after round."""
+    seen = []
+    with using_schema(db, schema, 'test1-b'):
+        for i in range(rounds):
+            await asyncio.sleep(0)
+            path = await run_sync(show_search_path, db)
+            seen.append((
+                    conf.get_state().schema_name,
+                    path.split(',')[0],
+                    ExplicitRouter().db_for_write(Test1BUser)))
+    return seen
+
+
+async def close_connections(workers):
+    """Close the connections of every thread of the loop's executor."""
+    barrier = threading.Barrier(workers)
+
+    # Each call holds its thread until all of them have one
+    def close():
+        barrier.wait()
+        connections.close_all()
+
+    await asyncio.gather(*[run_sync(close) for i in range(workers)])
+
+
+async def use_schemas(targets, rounds, workers):
+    """Run a coroutine for each db and schema, then close connections."""
+    try:
+        return await asyncio.gather(
+                *[use_schema(db, schema, rounds) for db, schema in targets])
+    finally:
+        await close_connections(workers)
+
+
+async def get_schema():
+    return conf.get_state().schema_name
+
+
+async def use_parent_schema(db, schema):
+    """Report the schema that tasks started on a schema see."""
+    with using_schema(db, schema, 'test1-b'):
+        return await asyncio.gather(
+                get_schema(), asyncio.ensure_future(get_schema()))
+
+
+def run_parent_schema(db, schema):
+    """Start tasks from a coroutine on a schema."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(use_parent_schema(db, schema))
+    finally:
+        loop.close()
+
+
+def run_schemas(targets, rounds=5):
+    """Run a coroutine for each db and schema at once."""
+    workers = len(targets)
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    try:
+        return loop.run_until_complete(use_schemas(targets, rounds, workers))
+    finally:
+        loop.close()
@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase
+from django_schemas.modelsfactory import (
+        EXISTING_MODEL_CLONES, forget_clone_plan, get_clone_plan)
+from tests.models import Test1BCar, Test1BUser
+
+
+class Test10(SimpleTestCase):
+
+    def setUp(self):
+        EXISTING_MODEL_CLONES.clear()
+        forget_clone_plan()
+
+    def tearDown(self):
+        EXISTING_MODEL_CLONES.clear()
+        forget_clone_plan()
+
+    def test_clone_plan(self):
+        """Clones of a model share one plan until it's forgotten."""
+        Test1BUser.set_db('db1', 'test10_a')
+        plan = get_clone_plan(Test1BUser)
+        Test1BUser.set_db('db1', 'test10_b')
+        self.assertTrue(get_clone_plan(Test1BUser) is plan)
+        self.assertTrue('color' in plan.fields)
+        self.assertEqual(get_clone_plan(Test1BCar).related, ('user',))
+
+        # Forgetting one model leaves the others alone
+        car_plan = get_clone_plan(Test1BCar)
+        forget_clone_plan(Test1BUser)
+        self.assertTrue(get_clone_plan(Test1BCar) is car_plan)
+
+        # The next clone works it out again
+        user_cls = Test1BUser.set_db('db1', 'test10_c')
+        rebuilt = get_clone_plan(Test1BUser)
+        self.assertFalse(rebuilt is plan)
+        self.assertEqual(sorted(rebuilt.fields), sorted(plan.fields))
+        self.assertEqual(user_cls._meta.get_field('color').max_length, 100)
@@ -0,0 +1,89 @@
+import gc
+import weakref
+
+from django.apps import apps
+from django.test import SimpleTestCase, override_settings
+from django_schemas.modelsfactory import EXISTING_MODEL_CLONES
+from tests.models import Test1BCar, Test1BUser
+
+
+class Test11(SimpleTestCase):
+
+    def setUp(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def tearDown(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def test_clone_lazy_related(self):
+        """Targets of related fields are only cloned once they're used."""
+        car_cls = Test1BCar.set_db('db1', 'test11_d')
+        self.assertEqual(len(EXISTING_MODEL_CLONES), 1)
+
+        # Building the query joins the target's clone
+        query = str(car_cls.objects.filter(user__color='red').query)
+        user_cls = Test1BUser.set_db('db1', 'test11_d')
+        self.assertEqual(len(EXISTING_MODEL_CLONES), 2)
+        self.assertTrue('"test11_d"."tests_test1buser"' in query)
+        field = car_cls._meta.get_field('user')
+        self.assertTrue(field.remote_field.model is user_cls)
+
+        # Targets built first are picked up once they're registered
+        user_cls = Test1BUser.set_db('db1', 'test11_e')
+        car_cls = Test1BCar.set_db('db1', 'test11_e')
+        field = car_cls._meta.get_field('user')
+        self.assertTrue(field.remote_field.model is user_cls)
+
+        # New instances don't need the target, select_related() does
+        car_cls = Test1BCar.set_db('db1', 'test11_k')
+        size = len(EXISTING_MODEL_CLONES)
+        car_cls()
+        self.assertEqual(len(EXISTING_MODEL_CLONES), size)
+        query = str(car_cls.objects.select_related('user').query)
+        self.assertTrue('"test11_k"."tests_test1buser"' in query)
+        field = car_cls._meta.get_field('user')
+        self.assertTrue(field.remote_field.model is
+                Test1BUser.set_db('db1', 'test11_k'))
+
+    @override_settings(MODEL_CLONES_MAX_SIZE=2)
+    def test_evicted_lazy_related(self):
+        """Clones evicted before their targets are built can be freed."""
+        clones = [weakref.ref(Test1BCar.set_db('db1', 'test11_m%d' % i))
+                for i in range(5)]
+        gc.collect()
+        self.assertEqual([clone() is None for clone in clones],
+                [True, True, True, False, False])
+        pending = [key for key in apps._pending_operations
+                if key[1].startswith('test1buser__db1__test11_m')]
+        self.assertEqual(sorted(pending), [
+                ('tests', 'test1buser__db1__test11_m3__'),
+                ('tests', 'test1buser__db1__test11_m4__')])
+
+    def test_clone_fields(self):
+        """Clones of a field share its state, and keep their own model."""
+        user_a = Test1BUser.set_db('db1', 'test11_f')
+        user_b = Test1BUser.set_db('db1', 'test11_g')
+        field = Test1BUser._meta.get_field('color')
+        field_a = user_a._meta.get_field('color')
+        field_b = user_b._meta.get_field('color')
+        self.assertTrue(type(field_a) is type(field_b))
+        self.assertTrue(isinstance(field_a, type(field)))
+        self.assertFalse(field_a is field_b)
+        self.assertFalse('max_length' in field_a.__dict__)
+        self.assertEqual(field_a.max_length, 100)
+        self.assertEqual(field_a.get_default(), 'grey')
+        self.assertTrue(field_a.model is user_a)
+        self.assertTrue(field_b.model is user_b)
+        self.assertTrue(field.model is Test1BUser)
+
+        # Changing one clone's field leaves the others alone
+        field_a.max_length = 10
+        field_a.validators.append(None)
+        field_a._validators.append(None)
+        field_a.choices.append(('x', 'x'))
+        self.assertEqual(field_b.max_length, 100)
+        self.assertEqual(field.max_length, 100)
+        self.assertFalse(None in field_b.validators)
+        self.assertFalse(None in field.validators)
+        self.assertEqual(field_b._validators, [])
+        self.assertEqual(field.choices, [])
@@ -0,0 +1,14 @@
+from django.test import SimpleTestCase
+from django_schemas.utils import (
+        forget_methods_from_class, get_methods_from_class)
+from tests.models import Test1AUser
+
+
+class Test12(SimpleTestCase):
+
+    def test_methods_from_class(self):
+        """Methods are only looked up again once the class is forgotten."""
+        methods = get_methods_from_class(Test1AUser)
+        self.assertTrue(get_methods_from_class(Test1AUser) is methods)
+        forget_methods_from_class(Test1AUser)
+        self.assertFalse(get_methods_from_class(Test1AUser) is methods)
@@ -0,0 +1,46 @@
+from django.test import SimpleTestCase, override_settings
+from django_schemas.modelsfactory import EXISTING_MODEL_CLONES
+from tests.models import Test1AUser, Test1BUser
+
+
+class Test13(SimpleTestCase):
+
+    def setUp(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def tearDown(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def test_environment_schema(self):
+        """Models of a single-schema environment point at it up front."""
+        self.assertEqual(Test1AUser._meta.schema_name, 'test1_a')
+        self.assertEqual(Test1AUser._meta.table_name, 'tests_test1auser')
+        self.assertEqual(
+                Test1AUser._meta.db_table, 'test1_a"."tests_test1auser')
+        Test1AUser(name='garfield')
+        self.assertEqual(
+                Test1AUser._meta.db_table, 'test1_a"."tests_test1auser')
+
+        # They follow the environment when its settings change
+        with override_settings(DATABASE_ENVIRONMENTS={
+                'test1-a': {'SCHEMA_NAME': 'test13_i'}}):
+            self.assertEqual(Test1AUser._meta.schema_name, 'test13_i')
+            self.assertEqual(
+                    Test1AUser._meta.db_table, 'test13_i"."tests_test1auser')
+        with override_settings(DATABASE_ENVIRONMENTS={'test1-a': {}}):
+            self.assertEqual(Test1AUser._meta.schema_name, None)
+            self.assertEqual(Test1AUser._meta.db_table, 'tests_test1auser')
+        self.assertEqual(
+                Test1AUser._meta.db_table, 'test1_a"."tests_test1auser')
+
+    def test_auto_db_memo(self):
+        """Environments are only looked up again once settings change."""
+        user = Test1AUser(name='garfield')
+        self.assertEqual(user.db_name, 'db1')
+        self.assertEqual(Test1AUser.auto_db()._meta.db_name, 'db1')
+        with override_settings(DATABASE_ENVIRONMENTS={
+                'test1-a': {'SCHEMA_NAME': 'test13_h'}}):
+            self.assertEqual(Test1BUser.inherit_db(user)._meta.schema_name,
+                    'test13_h')
+        self.assertEqual(Test1BUser.inherit_db(user)._meta.schema_name,
+                'test1_a')
@@ -0,0 +1,80 @@
+import threading
+
+from django.apps import apps
+from django.test import SimpleTestCase, override_settings
+from django_schemas.modelsfactory import (
+        EXISTING_MODEL_CLONES, _get_clone_key)
+from tests.models import Test1BCar, Test1BUser
+
+
+class Test2(SimpleTestCase):
+
+    def setUp(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def tearDown(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def test_clone_cache_hits(self):
+        """Asking for the same clone twice only builds it once."""
+        cls = Test1BUser.set_db('db1', 'test2_a')
+        self.assertTrue(Test1BUser.set_db('db1', 'test2_a') is cls)
+        stats = EXISTING_MODEL_CLONES.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertTrue(stats['hits'] >= 1)
+
+    @override_settings(MODEL_CLONES_MAX_SIZE=2)
+    def test_clone_cache_eviction(self):
+        """
+        Old clones are dropped from the cache and from Django's app
+        registry, and their dependents go along with them.
+        """
+        user_cls = Test1BUser.set_db('db1', 'test2_a')
+        car_cls = Test1BCar.set_db('db1', 'test2_a')
+        self.assertEqual(len(EXISTING_MODEL_CLONES), 2)
+        evictions = EXISTING_MODEL_CLONES.stats()['evictions']
+
+        # The user clone goes first, and the car clone depends on it
+        Test1BUser.set_db('db1', 'test2_b')
+        registered = apps.all_models['tests']
+        self.assertFalse(user_cls._meta.model_name in registered)
+        self.assertFalse(car_cls._meta.model_name in registered)
+        self.assertEqual(len(EXISTING_MODEL_CLONES), 1)
+        self.assertEqual(
+                EXISTING_MODEL_CLONES.stats()['evictions'], evictions + 2)
+
+        # The source model is left untouched
+        field = Test1BCar._meta.get_field('user')
+        self.assertTrue(field.remote_field.model is Test1BUser)
+
+    def test_clone_cache_alias_eviction(self):
+        """Aliases made from an evicted clone don't keep it around."""
+        user_a = Test1BUser.set_db('db1', 'test2_i')
+        user_b = user_a.set_db('db1', 'test2_j')
+        self.assertTrue(user_a.set_db('db1', 'test2_j') is user_b)
+        EXISTING_MODEL_CLONES.evict(_get_clone_key(user_a))
+        for alias in EXISTING_MODEL_CLONES._aliases:
+            self.assertFalse(user_a in alias)
+        for aliases in EXISTING_MODEL_CLONES._aliases_by_key.values():
+            for alias in aliases:
+                self.assertFalse(user_a in alias)
+        self.assertTrue(Test1BUser.set_db('db1', 'test2_j') is user_b)
+
+    def test_clone_single_flight(self):
+        """Threads asking for the same new clone all get one class."""
+        start = threading.Event()
+        results = []
+
+        def work():
+            start.wait()
+            results.append(Test1BCar.set_db('db1', 'test2_c'))
+
+        builds = EXISTING_MODEL_CLONES.stats()['builds']
+        workers = [threading.Thread(target=work) for i in range(8)]
+        for worker in workers:
+            worker.start()
+        start.set()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(EXISTING_MODEL_CLONES.stats()['builds'], builds + 1)
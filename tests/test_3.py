@@ -0,0 +1,300 @@
+import threading
+import warnings
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models.signals import class_prepared, post_delete
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django_schemas.backends import conf, qualified, session, usage
+from django_schemas.exceptions import ConfigError
+from django_schemas.migrations import flush, migrate
+from django_schemas.routers import using_schema
+from tests.models import Test1BCar, Test1BUser
+
+
+class Test3(TestCase):
+
+    def test_in_schema(self):
+        """
+        Querysets bound with `in_schema` read and write the schema's
+        tables without cloning the model.
+        """
+        flush(db='db1', schema='test3')
+        migrate(db='db1', schema='test3', environment='test1-b')
+        registered = len(apps.all_models['tests'])
+        
+        # Write some rows
+        users = Test1BUser.in_schema('db1', 'test3')
+        user1 = users.create(master_id=1)
+        users.bulk_create([Test1BUser(master_id=2), Test1BUser(master_id=3)])
+        self.assertEqual(users.count(), 3)
+        
+        # Instances save back to their schema
+        user1.color = 'red'
+        user1.save()
+        self.assertEqual(users.get(master_id=1).color, 'red')
+        user2 = users.get(master_id=2)
+        user2.color = 'pink'
+        user2.save()
+        self.assertEqual(users.filter(color='pink').count(), 1)
+        
+        # Joins stay on the schema too
+        cars = Test1BCar.in_schema('db1', 'test3')
+        cars.create(user=user1)
+        self.assertEqual(cars.filter(user__color='red').count(), 1)
+        
+        # Updates and deletes
+        users.filter(master_id=3).update(color='green')
+        user2.delete()
+        self.assertEqual(
+                sorted(users.values_list('color', flat=True)),
+                ['green', 'red'])
+        self.assertEqual(len(apps.all_models['tests']), registered)
+        
+        # The same rows are there for clones
+        self.assertEqual(Test1BUser.set_db('db1', 'test3').objects.count(), 2)
+        
+        flush(db='db1', schema='test3')
+
+    def test_in_schema_delete(self):
+        """
+        Deletes through bound querysets and instances cascade on the
+        schema, and send their signals.
+        """
+        flush(db='db1', schema='test3_d')
+        migrate(db='db1', schema='test3_d', environment='test1-b')
+        users = Test1BUser.in_schema('db1', 'test3_d')
+        cars = Test1BCar.in_schema('db1', 'test3_d')
+        user1 = users.create(master_id=1)
+        user2 = users.create(master_id=2)
+        cars.create(user=user1)
+        cars.create(user=user2)
+        deleted = []
+
+        def receive(sender, instance, **kwargs):
+            deleted.append((sender, instance._state.schema_name))
+
+        post_delete.connect(receive, sender=Test1BUser)
+        try:
+            count, counts = users.filter(master_id=1).delete()
+            self.assertEqual(count, 2)
+            self.assertEqual(counts['tests.Test1BCar'], 1)
+            user2.delete()
+        finally:
+            post_delete.disconnect(receive, sender=Test1BUser)
+        self.assertEqual(deleted, [(Test1BUser, 'test3_d')] * 2)
+        self.assertEqual(users.count(), 0)
+        self.assertEqual(cars.count(), 0)
+        self.assertEqual(conf.get_state(), conf.DEFAULT_STATE)
+
+        flush(db='db1', schema='test3_d')
+
+    def test_using_schema(self):
+        """
+        Code under `using_schema` routes to its database and searches
+        its schema, without touching other threads or later code.
+        """
+        flush(db='db1', schema='test3_b')
+        migrate(db='db1', schema='test3_b', environment='test1-b')
+        with using_schema('db1', 'test3_b', 'test1-b'):
+            Test1BUser.objects.create(master_id=1)
+            self.assertEqual(Test1BUser.objects.count(), 1)
+            
+            # Other threads keep their own state
+            states = []
+            worker = threading.Thread(
+                    target=lambda: states.append(conf.get_state()))
+            worker.start()
+            worker.join()
+            self.assertEqual(states, [conf.DEFAULT_STATE])
+            self.assertEqual(conf.get_state('db2'), conf.DEFAULT_STATE)
+        
+        # The connection goes back to its own search_path
+        self.assertEqual(conf.get_state(), conf.DEFAULT_STATE)
+        cursor = connections['db1'].cursor()
+        cursor.execute('SHOW search_path')
+        self.assertFalse('test3_b' in cursor.fetchone()[0])
+        self.assertEqual(
+                Test1BUser.in_schema('db1', 'test3_b').count(), 1)
+
+    def test_legacy_conf(self):
+        """The old `conf` globals read and write the current context."""
+        self.assertEqual(conf.SCHEMA_NAME, None)
+        with using_schema('db1', 'test3_b', 'test1-b'):
+            self.assertEqual(conf.SCHEMA_NAME, 'test3_b')
+            self.assertEqual(conf.ENVIRONMENT_NAME, 'test1-b')
+            self.assertTrue(isinstance(conf.ADDITIONAL_SCHEMAS, list))
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                conf.SCHEMA_NAME = 'test3_c'
+            self.assertEqual(caught[0].category, DeprecationWarning)
+            self.assertEqual(conf.get_state().schema_name, 'test3_c')
+            self.assertEqual(conf.get_state().db_name, 'db1')
+        self.assertEqual(conf.get_state(), conf.DEFAULT_STATE)
+
+    def test_search_path_kept(self):
+        """
+        Connections only get a new `search_path` when it changes, or
+        when a rollback may have undone it.
+        """
+        def show():
+            cursor = connections['db1'].cursor()
+            cursor.execute('SHOW search_path')
+            return cursor.fetchone()[0]
+        
+        def saved():
+            return usage.round_trips_saved().get('db1', 0)
+        
+        with using_schema('db1', 'test3_c', 'test1-b'):
+            show()
+            before = saved()
+            self.assertEqual(show(), 'test3_c, public')
+            self.assertEqual(saved(), before + 1)
+            
+            # Rolled back SETs are sent again
+            try:
+                with transaction.atomic(using='db1'):
+                    with using_schema('db1', 'test3_d', 'test1-b'):
+                        show()
+                    raise ValueError
+            except ValueError:
+                pass
+            with using_schema('db1', 'test3_d', 'test1-b'):
+                self.assertEqual(show(), 'test3_d, public')
+        self.assertFalse('test3_c' in show())
+        
+        # Without a schema nothing is saved, or undone by a rollback
+        before = saved()
+        show()
+        self.assertEqual(saved(), before)
+        try:
+            with transaction.atomic(using='db1'):
+                show()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertTrue(connections['db1'].schema_search_path is None)
+
+    def test_schema_qualified(self):
+        """
+        Schema-qualified databases name the tables of the current schema
+        in their SQL, and only set a `search_path` in transactions.
+        """
+        original = connections['db1']
+        wrapper = type(original)(
+                dict(original.settings_dict, SCHEMA_QUALIFIED=True), 'db1')
+        connections['db1'] = wrapper
+        try:
+            flush(db='db1', schema='test3_q')
+            migrate(db='db1', schema='test3_q', environment='test1-b')
+            with using_schema('db1', 'test3_q', 'test1-b'):
+                user = Test1BUser.objects.create(master_id=1, color='red')
+                Test1BCar.objects.create(user=user)
+                self.assertEqual(
+                        Test1BCar.objects.filter(user__color='red').count(), 1)
+                self.assertEqual(Test1BCar.objects.get().user, user)
+                
+                # No session state outside of a transaction
+                cursor = connections['db1'].cursor()
+                cursor.execute('SHOW search_path')
+                self.assertFalse('test3_q' in cursor.fetchone()[0])
+                with transaction.atomic(using='db1'):
+                    cursor = connections['db1'].cursor()
+                    cursor.execute('SHOW search_path')
+                    self.assertEqual(cursor.fetchone()[0], 'test3_q, public')
+                cursor = connections['db1'].cursor()
+                cursor.execute('SHOW search_path')
+                self.assertFalse('test3_q' in cursor.fetchone()[0])
+            
+            # Migrations were recorded in the schema
+            cursor.execute(
+                    'SELECT count(*) FROM test3_q.django_migrations')
+            self.assertTrue(cursor.fetchone()[0] > 0)
+            self.assertEqual(
+                    Test1BUser.in_schema('db1', 'test3_q').count(), 1)
+            
+            # Schema tables don't fall through to public without one
+            with self.assertRaises(ConfigError):
+                Test1BUser.objects.using('db1').count()
+            tables = qualified.get_schema_tables()
+            self.assertTrue('tests_test1buser' in tables)
+            self.assertFalse('django_migrations' in tables)
+            flush(db='db1', schema='test3_q')
+        finally:
+            connections['db1'] = original
+            wrapper.close()
+        
+        # New schema models are picked up, clones aren't
+        class_prepared.send(sender=Test1BUser.set_db('db1', 'test3_q'))
+        self.assertTrue(qualified.get_schema_tables() is tables)
+        class_prepared.send(sender=Test1BUser)
+        self.assertFalse(qualified.get_schema_tables() is tables)
+
+    @override_settings(DATABASE_ENVIRONMENTS=dict(
+            settings.DATABASE_ENVIRONMENTS, **{'test1-b': {
+                'ADDITIONAL_SCHEMAS': ['public'],
+                'SESSION_SETTINGS': {
+                    'work_mem': '7MB',
+                    'statement_timeout': '3s',
+                },
+            }, 'test3-reporting': {
+                'SESSION_SETTINGS': {'work_mem': '9MB'},
+            }}))
+    def test_session_settings(self):
+        """
+        Connections get the session settings of their database and
+        environment, and lose the environment's outside of it.
+        """
+        original = connections['db1']
+        tuned = type(original)(dict(
+                original.settings_dict, SESSION_SETTINGS={
+                    'lock_timeout': '1s',
+                    'statement_timeout': '5s',
+                }), 'db1')
+        connections['db1'] = tuned
+        
+        def show():
+            cursor = tuned.cursor()
+            cursor.execute("""SELECT current_setting('work_mem'),
+                current_setting('statement_timeout'),
+                current_setting('lock_timeout')""")
+            return cursor.fetchone()
+        
+        try:
+            default = show()
+            self.assertEqual(default[1:], ('5s', '1s'))
+            with using_schema('db1', 'test3_s', 'test1-b'):
+                self.assertEqual(show(), ('7MB', '5s', '1s'))
+                saved = usage.round_trips_saved().get('db1', 0)
+                show()
+                self.assertEqual(
+                        usage.round_trips_saved().get('db1', 0), saved + 1)
+            self.assertEqual(show(), default)
+            
+            # Settings of environments off the database are undone too
+            with using_schema('db1', 'test3_s', 'test3-reporting'):
+                self.assertEqual(show()[0], '9MB')
+            try:
+                with transaction.atomic(using='db1'):
+                    self.assertEqual(show(), default)
+                    raise ValueError
+            except ValueError:
+                pass
+            self.assertEqual(show(), default)
+        finally:
+            connections['db1'] = original
+            tuned.close()
+        
+        # Schema-qualified databases can't have any
+        with self.assertRaises(ConfigError):
+            type(original)(dict(
+                    original.settings_dict, SCHEMA_QUALIFIED=True), 'db1')
+        
+        # Settings that may have been rolled back go back to defaults
+        self.assertEqual(session.get_session_sql(
+                'SET', conf.UNKNOWN_PATH, (('work_mem', "7'MB"),),
+                ('statement_timeout', 'work_mem')), [
+                    'SET statement_timeout TO DEFAULT',
+                    "SET work_mem = '7''MB'",
+                ])
@@ -0,0 +1,42 @@
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils.six import StringIO
+from django_schemas.modelsfactory import EXISTING_MODEL_CLONES
+from django_schemas.warmup import get_warm_targets, warm_models
+from tests.models import Test1AUser, Test1BCar
+
+
+class Test4(SimpleTestCase):
+
+    def setUp(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def tearDown(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def test_warm_targets(self):
+        """Environments with a schema ignore the given schemas."""
+        targets = get_warm_targets(
+                schemas=['test4'], environments=['test1-a', 'test1-b'])
+        self.assertTrue(('test1-a', 'db1', 'test1_a') in targets)
+        self.assertTrue(('test1-b', 'db1', 'test4') in targets)
+        self.assertTrue(('test1-b', 'db2', 'test4') in targets)
+        self.assertFalse(('test1-a', 'db1', 'test4') in targets)
+
+    def test_warm_models(self):
+        """Warmed clones are handed out without being built again."""
+        report = warm_models(
+                schemas=['test4'], environments=['test1-a', 'test1-b'],
+                databases=['db1'])
+        self.assertEqual(report['targets'], 2)
+        self.assertTrue(report['clones'] >= 3)
+        builds = EXISTING_MODEL_CLONES.stats()['builds']
+        Test1AUser.set_db('db1', 'test1_a')
+        Test1BCar.set_db('db1', 'test4')
+        self.assertEqual(EXISTING_MODEL_CLONES.stats()['builds'], builds)
+
+    def test_warm_command(self):
+        out = StringIO()
+        call_command('warm_schema_models', schemas=['test4'],
+                environments=['test1-b'], stdout=out)
+        self.assertTrue('Warmed' in out.getvalue())
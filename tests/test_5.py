@@ -0,0 +1,196 @@
+import threading
+import time
+import warnings
+
+from django.conf import settings
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from django_schemas import health
+from django_schemas.backends.usage import UsageCursorWrapper, outstanding
+from django_schemas.replicas import (
+        LeastOutstandingPolicy, RandomPolicy, RoundRobinPolicy,
+        WeightedPolicy, choose_replica, forget_replicas, get_policy)
+from django_schemas.routers import ExplicitRouter, get_random_read
+from django_schemas.sticky import forget_writes
+from django_schemas.topology import READ, WRITE, build_topology, get_topology
+from tests.models import Test1AUser, Test1BUser
+
+
+class Test5(SimpleTestCase):
+
+    def tearDown(self):
+        health.reset()
+        forget_replicas()
+        forget_writes()
+
+    def test_topology(self):
+        """Aliases are sorted into roles, environments and replicas."""
+        topology = get_topology()
+        self.assertEqual(topology.roles['db1'], WRITE)
+        self.assertEqual(topology.roles['db1-read1'], READ)
+        self.assertEqual(topology.writes['test1-a'], ('db1',))
+        self.assertEqual(topology.writes['test1-b'], ('db1', 'db2'))
+        self.assertEqual(topology.replicas['db1'], ('db1-read1',))
+        self.assertTrue(topology.is_read('db3-read1'))
+        self.assertFalse(topology.is_read('db2'))
+
+    def test_topology_rebuild(self):
+        """Routing follows DATABASES when it changes."""
+        router = ExplicitRouter()
+        self.assertEqual(router.db_for_write(Test1AUser), 'db1')
+        self.assertEqual(get_random_read('db1'), 'db1-read1')
+        databases = dict(settings.DATABASES)
+        databases['db2'] = dict(
+                databases['db2'], ENVIRONMENTS=['test1-a', 'test1-b'])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with override_settings(DATABASES=databases):
+                self.assertEqual(router.db_for_write(Test1AUser), 'default')
+                self.assertEqual(router.db_for_read(Test1BUser), 'default')
+        self.assertEqual(router.db_for_write(Test1AUser), 'db1')
+
+    def test_replica_policies(self):
+        """Replicas are picked by the configured policy."""
+        topology = build_topology({
+            'db1': {'ENVIRONMENTS': ['test1-a']},
+            'db1-read1': {'WEIGHT': 0},
+            'db1-read2': {'WEIGHT': 3},
+            'db1-read3': {},
+        })
+        replicas = topology.replicas['db1']
+        policy = RoundRobinPolicy()
+        picks = [policy.choose('db1', replicas, topology) for i in range(6)]
+        self.assertEqual(picks, list(replicas) * 2)
+        policy = WeightedPolicy()
+        picks = set(policy.choose('db1', replicas, topology)
+                for i in range(50))
+        self.assertFalse('db1-read1' in picks)
+        with override_settings(DATABASE_REPLICA_POLICY='round_robin'):
+            self.assertTrue(isinstance(get_policy(), RoundRobinPolicy))
+        self.assertTrue(isinstance(get_policy(), RandomPolicy))
+
+    def test_least_outstanding(self):
+        """Replicas busy with queries from this process are avoided."""
+        topology = build_topology({
+            'db1': {},
+            'db1-read1': {},
+            'db1-read2': {},
+        })
+        replicas = topology.replicas['db1']
+        policy = LeastOutstandingPolicy()
+        test = self
+        
+        class Cursor(object):
+            def execute(self, sql):
+                test.assertEqual(outstanding('db1-read1'), 1)
+                test.assertEqual(
+                        policy.choose('db1', replicas, topology), 'db1-read2')
+        
+        cursor = UsageCursorWrapper(Cursor(), connections['db1-read1'])
+        cursor.execute('SELECT 1')
+        self.assertEqual(outstanding('db1-read1'), 0)
+
+    @override_settings(DATABASE_REPLICA_FAILURES=2)
+    def test_replica_ejection(self):
+        """Failing replicas are left out until their cooldown is over."""
+        health.record_failure('db1-read1')
+        self.assertEqual(get_random_read('db1'), 'db1-read1')
+        health.record_failure('db1-read1')
+        self.assertEqual(get_random_read('db1'), 'db1')
+        
+        # Once the cooldown is over, one more failure ejects it again
+        health._EJECTED['db1-read1'] = time.time() - 1
+        self.assertEqual(get_random_read('db1'), 'db1-read1')
+        health.record_failure('db1-read1')
+        self.assertEqual(get_random_read('db1'), 'db1')
+        health.record_success('db1-read1')
+        self.assertEqual(get_random_read('db1'), 'db1-read1')
+
+    @override_settings(DATABASE_REPLICA_MAX_LAG=10)
+    def test_replica_lag(self):
+        """Replicas too far behind are left out while the reading lasts."""
+        health._LAG['db1-read1'] = (time.time(), 30.0)
+        self.assertEqual(get_random_read('db1'), 'db1')
+        health._LAG['db1-read1'] = (time.time(), 2.0)
+        self.assertEqual(get_random_read('db1'), 'db1-read1')
+
+    def test_replica_lag_probe(self):
+        """Lag is read over a connection of its own, not Django's."""
+        connection = connections['db1-read1'].connection
+        self.assertEqual(health._probe_lag('db1-read1'), None)
+        self.assertTrue('db1-read1' in health._PROBES)
+        self.assertTrue(connections['db1-read1'].connection is connection)
+        self.assertTrue('pg_last_wal_replay_lsn' in
+                health._get_lag_sql(100000))
+        self.assertTrue('pg_last_xlog_replay_location' in
+                health._get_lag_sql(90600))
+        health.reset()
+        self.assertEqual(health._PROBES, {})
+
+    @override_settings(DATABASE_REPLICA_MAX_LAG=10,
+            DATABASE_REPLICA_CONNECT_TIMEOUT=1)
+    def test_replica_lag_unreachable(self):
+        """Replicas whose lag can't be read are left out, and fail."""
+        wrapper = connections['db1-read1']
+        params = []
+        
+        class Database(object):
+            Error = wrapper.Database.Error
+            
+            @staticmethod
+            def connect(**kwargs):
+                params.append(kwargs)
+                raise Database.Error('unreachable')
+        
+        wrapper.Database = Database
+        health.logger.disabled = True
+        try:
+            self.assertEqual(get_random_read('db1'), 'db1')
+        finally:
+            health.logger.disabled = False
+            del wrapper.Database
+        self.assertEqual(params[0]['connect_timeout'], 1)
+        self.assertEqual(health._FAILURES['db1-read1'], 1)
+        self.assertEqual(health.get_lag('db1-read1'), float('inf'))
+
+    @override_settings(DATABASE_READ_YOUR_WRITES=5)
+    def test_read_your_writes(self):
+        """Reads stick to the primary of a recent write in this context."""
+        router = ExplicitRouter()
+        self.assertEqual(router.db_for_read(Test1AUser), 'db1-read1')
+        self.assertEqual(router.db_for_write(Test1AUser), 'db1')
+        self.assertEqual(router.db_for_read(Test1AUser), 'db1')
+        
+        # Other threads keep reading from replicas
+        results = []
+        worker = threading.Thread(
+                target=lambda: results.append(router.db_for_read(Test1AUser)))
+        worker.start()
+        worker.join()
+        self.assertEqual(results, ['db1-read1'])
+        forget_writes()
+        self.assertEqual(router.db_for_read(Test1AUser), 'db1-read1')
+
+    @override_settings(
+            DATABASE_REPLICA_AFFINITY=True,
+            DATABASE_REPLICA_POLICY='round_robin')
+    def test_replica_affinity(self):
+        """A context keeps reading from the replica it was given."""
+        topology = build_topology({
+            'db1': {},
+            'db1-read1': {},
+            'db1-read2': {},
+        })
+        replicas = topology.replicas['db1']
+        replica = choose_replica('db1', replicas, topology)
+        for i in range(3):
+            self.assertEqual(
+                    choose_replica('db1', replicas, topology), replica)
+        
+        # Replicas left out for their health get replaced
+        others = tuple(alias for alias in replicas if alias != replica)
+        other = choose_replica('db1', others, topology)
+        self.assertNotEqual(other, replica)
+        self.assertEqual(choose_replica('db1', replicas, topology), other)
+        forget_replicas()
+        self.assertNotEqual(choose_replica('db1', replicas, topology), other)
@@ -0,0 +1,47 @@
+import sys
+from unittest import skipIf
+
+from django.db import connections
+from django.test import TestCase
+from django_schemas.backends import usage
+from django_schemas.migrations import flush
+
+try:
+    from tests import coroutines
+except SyntaxError:  # Python < 3.5
+    coroutines = None
+
+
+@skipIf(coroutines is None, 'needs async syntax')
+class Test6(TestCase):
+
+    def tearDown(self):
+        for db, schema in self.targets():
+            flush(db=db, schema=schema)
+        for db in ('db1', 'db2'):
+            connections[db].close()
+
+    def targets(self):
+        return [
+            ('db1', 'test6_a'),
+            ('db2', 'test6_b'),
+            ('db1', 'test6_c'),
+            ('db2', 'test6_d'),
+        ]
+
+    def test_concurrent_schemas(self):
+        """Coroutines on different schemas never see each other's."""
+        targets = self.targets()
+        opened = usage.open_connections()
+        results = coroutines.run_schemas(targets)
+        for (db, schema), seen in zip(targets, results):
+            self.assertEqual(seen, [(schema, schema, db)] * 5)
+
+        # Threads of the executor don't keep theirs
+        self.assertEqual(usage.open_connections(), opened)
+
+    @skipIf(sys.version_info < (3, 7), 'needs contextvars')
+    def test_child_tasks(self):
+        """Tasks start with the schema of the task that created them."""
+        self.assertEqual(coroutines.run_parent_schema('db1', 'test6_a'),
+                ['test6_a', 'test6_a'])
@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase, override_settings
+from django_schemas.exceptions import ConfigError
+from django_schemas.modelsfactory import EXISTING_MODEL_CLONES
+from django_schemas.routers import ExplicitRouter, using_tenant
+from django_schemas.shards import ShardMap, locate_tenant
+from tests.models import Test1BUser
+
+
+SHARDS = {
+    'test1-b': {
+        'SCHEMA_FORMAT': 'test7_%s',
+        'OVERRIDES': {'moved': 'db2', 'renamed': ('db1', 'test7_other')},
+    },
+}
+
+
+class Test7(SimpleTestCase):
+
+    def setUp(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def tearDown(self):
+        EXISTING_MODEL_CLONES.clear()
+
+    def test_shard_map(self):
+        """Adding a database only moves the tenants that land on it."""
+        keys = range(2000)
+        before = ShardMap(['db1', 'db2', 'db3', 'db4'])
+        after = ShardMap(['db1', 'db2', 'db3', 'db4', 'db5'])
+        placed = [before.locate(key)[0] for key in keys]
+        self.assertEqual(set(placed), set(['db1', 'db2', 'db3', 'db4']))
+        moved = [key for key in keys
+                if before.locate(key) != after.locate(key)]
+        self.assertTrue(0 < len(moved) < len(keys) / 3)
+        for key in moved:
+            self.assertEqual(after.locate(key)[0], 'db5')
+
+    def test_shard_map_keys(self):
+        """Keys are compared as text, and make plain schema names only."""
+        shard_map = ShardMap(['db1', 'db2'], 'test7_%s',
+                overrides={42: ('db2', 'test7_answer')})
+        self.assertEqual(shard_map.locate('42'), ('db2', 'test7_answer'))
+        self.assertEqual(shard_map.locate(7), shard_map.locate('7'))
+        for key in ('x; DROP SCHEMA public', 'x"', 'x\n'):
+            with self.assertRaises(ValueError):
+                shard_map.locate(key)
+        with self.assertRaises(ConfigError):
+            ShardMap(['db1'], overrides={'a': ('db1', 'a-b')})
+
+    @override_settings(DATABASE_SHARDS=SHARDS)
+    def test_for_tenant(self):
+        """Tenants are cloned and routed where the shard map says."""
+        db, schema = locate_tenant('test1-b', 42)
+        self.assertTrue(db in ('db1', 'db2'))
+        self.assertEqual(schema, 'test7_42')
+        cls = Test1BUser.for_tenant(42)
+        self.assertEqual(
+                (cls._meta.db_name, cls._meta.schema_name), (db, schema))
+        self.assertEqual(locate_tenant('test1-b', 'moved'),
+                ('db2', 'test7_moved'))
+        self.assertEqual(locate_tenant('test1-b', 'renamed'),
+                ('db1', 'test7_other'))
+        
+        # The router follows tenant hints and contexts
+        router = ExplicitRouter()
+        self.assertEqual(
+                router.db_for_write(Test1BUser, tenant='moved'), 'db2')
+        with using_tenant('test1-b', 'moved'):
+            self.assertEqual(router.db_for_write(Test1BUser), 'db2')
@@ -0,0 +1,115 @@
+from django.db import DatabaseError, connections
+from django.test import TestCase, override_settings
+from django_schemas.exceptions import ConfigError
+from django_schemas.migrations import flush, migrate
+from django_schemas.moves import move_schema
+from django_schemas import shards
+from django_schemas.shards import (
+        PLACEMENTS_TABLE, forget_placements, locate_tenant, place_tenant)
+from tests.models import Test1BCar, Test1BUser
+
+
+SHARDS = {
+    'test1-b': {
+        'SCHEMA_FORMAT': 'test%s',
+        'OVERRIDES': {8: 'db1'},
+        'PLACEMENTS': 'default',
+    },
+}
+
+
+class Test8(TestCase):
+
+    def setUp(self):
+        flush(db='db1', schema='test8')
+        flush(db='db2', schema='test8')
+
+    def tearDown(self):
+        forget_placements()
+        flush(db='db1', schema='test8')
+        flush(db='db2', schema='test8')
+
+    @override_settings(DATABASE_SHARDS=SHARDS)
+    def test_move_schema(self):
+        """
+        Moved schemas keep their rows and sequences, their tenant is
+        routed to the new database, and the old copy takes no writes.
+        """
+        migrate(db='db1', schema='test8', environment='test1-b')
+        users = Test1BUser.in_schema('db1', 'test8')
+        users.bulk_create([Test1BUser(master_id=i) for i in range(100)])
+        user = users.get(master_id=7)
+        Test1BCar.in_schema('db1', 'test8').create(user=user)
+        self.assertEqual(locate_tenant('test1-b', 8), ('db1', 'test8'))
+        
+        report = move_schema('db1', 'db2', 'test1-b', tenant=8)
+        self.assertEqual(report.rows, 101)
+        self.assertTrue(report.tables >= 2 and report.bytes > 0)
+        self.assertTrue(report.rows_per_second > 0)
+        self.assertEqual(locate_tenant('test1-b', 8), ('db2', 'test8'))
+        cursor = connections['default'].cursor()
+        cursor.execute("SELECT db, schema FROM %s WHERE tenant = '8'" % (
+                PLACEMENTS_TABLE))
+        self.assertEqual(cursor.fetchall(), [('db2', 'test8')])
+        with self.assertRaises(DatabaseError):
+            users.create(master_id=100)
+        
+        # Same rows, and new ones don't clash with them
+        moved = Test1BUser.in_schema('db2', 'test8')
+        self.assertEqual(moved.count(), 100)
+        cars = Test1BCar.in_schema('db2', 'test8')
+        self.assertEqual(cars.filter(user__master_id=7).count(), 1)
+        self.assertTrue(moved.create(master_id=100).pk > user.pk)
+        
+        # The target has to be free
+        with self.assertRaises(ConfigError):
+            move_schema('db1', 'db2', 'test1-b', schema='test8')
+
+    @override_settings(DATABASE_SHARDS={
+            'test1-b': {'SCHEMA_FORMAT': 'test%s'}})
+    def test_move_schema_placements(self):
+        """Tenants can't move without somewhere to keep their placement."""
+        migrate(db='db1', schema='test8', environment='test1-b')
+        with self.assertRaises(ConfigError):
+            move_schema('db1', 'db2', 'test1-b', tenant=8)
+
+        # Schemas on their own are only copied
+        Test1BUser.in_schema('db1', 'test8').create(master_id=1)
+        move_schema('db1', 'db2', 'test1-b', schema='test8')
+        self.assertEqual(Test1BUser.in_schema('db2', 'test8').count(), 1)
+        Test1BUser.in_schema('db1', 'test8').create(master_id=2)
+
+    @override_settings(DATABASE_SHARDS=dict(SHARDS, **{
+            'test1-b': dict(SHARDS['test1-b'], PLACEMENTS_TIMEOUT=1)}))
+    def test_place_tenant(self):
+        """Placing a tenant again replaces its placement."""
+        place_tenant('test1-b', 9, 'db1', 'test9')
+        place_tenant('test1-b', 9, 'db2', 'test9b')
+        self.assertEqual(locate_tenant('test1-b', 9), ('db2', 'test9b'))
+        cursor = connections['default'].cursor()
+        cursor.execute(
+                "SELECT db, schema FROM %s WHERE tenant = '9'"
+                % PLACEMENTS_TABLE)
+        self.assertEqual(cursor.fetchall(), [('db2', 'test9b')])
+        
+        # Unreachable placements give up quickly, and keep the last read
+        wrapper = connections['default']
+        params = []
+        
+        class Database(object):
+            Error = wrapper.Database.Error
+            
+            @staticmethod
+            def connect(**kwargs):
+                params.append(kwargs)
+                raise Database.Error('unreachable')
+        
+        forget_placements()
+        wrapper.Database = Database
+        shards.logger.disabled = True
+        try:
+            self.assertEqual(locate_tenant('test1-b', 8), ('db1', 'test8'))
+        finally:
+            shards.logger.disabled = False
+            del wrapper.Database
+        self.assertEqual(params[0]['connect_timeout'], 1)
@@ -0,0 +1,244 @@
+import threading
+
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase, TestCase
+from django_schemas.backends import pool, usage
+from django_schemas.migrations import flush, migrate
+from django_schemas.routers import using_schema
+from psycopg2 import extensions
+
+
+class FakeCursor(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise OperationalError("server closed the connection")
+        self.connection.queries.append(sql)
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    """Stands in for a psycopg2 connection."""
+
+    closed = 0
+    autocommit = True
+    broken = False
+
+    def __init__(self):
+        self.queries = []
+        usage.connection_opened('test9')
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class Test9(SimpleTestCase):
+
+    def test_checkout(self):
+        """Connections are reused, and only so many are opened."""
+        connection_pool = pool.ConnectionPool(
+                'test9', min_size=2, max_size=3, timeout=0.05)
+        first, path = connection_pool.checkout(FakeConnection)
+        self.assertEqual(connection_pool.stats()['size'], 2)
+        second, path = connection_pool.checkout(FakeConnection)
+        third, path = connection_pool.checkout(FakeConnection)
+        self.assertEqual(len(set([first, second, third])), 3)
+        stats = connection_pool.stats()
+        self.assertEqual((stats['in_use'], stats['utilization']), (3, 1.0))
+        
+        # Full pools make checkouts wait, and give up after the timeout
+        with self.assertRaises(OperationalError):
+            connection_pool.checkout(FakeConnection)
+        worker = threading.Timer(
+                0.01, lambda: connection_pool.checkin(third, 'test9'))
+        worker.start()
+        connection_pool.timeout = 5
+        self.assertEqual(
+                connection_pool.checkout(FakeConnection), (third, None))
+        worker.join()
+        self.assertEqual(third.queries, ['SET search_path TO DEFAULT'])
+        stats = connection_pool.stats()
+        self.assertEqual((stats['waits'], stats['timeouts']), (1, 1))
+        self.assertTrue(stats['max_wait'] > 0)
+        
+        for connection in (first, second, third):
+            connection_pool.checkin(connection)
+        connection_pool.close()
+        self.assertEqual(connection_pool.stats()['size'], 0)
+        self.assertFalse('test9' in usage.open_connections())
+
+    def test_fill_failure(self):
+        """Checkouts keep their connection when the pool can't fill up."""
+        opened = []
+
+        def connect():
+            if opened:
+                raise OperationalError("too many connections")
+            opened.append(FakeConnection())
+            return opened[-1]
+
+        connection_pool = pool.ConnectionPool('test9', min_size=3)
+        pool.logger.disabled = True
+        try:
+            connection, path = connection_pool.checkout(connect)
+        finally:
+            pool.logger.disabled = False
+        self.assertTrue(connection is opened[0])
+        self.assertEqual(connection_pool.stats()['size'], 1)
+        connection_pool.checkin(connection)
+        connection_pool.close()
+        self.assertEqual(connection_pool.stats()['size'], 0)
+
+    def test_get_pool(self):
+        """Each alias has one pool, for the settings it was made with."""
+        settings_dict = {'NAME': 'test9', 'POOL_MAX': 2}
+        try:
+            first = pool.get_pool('test9', settings_dict)
+            self.assertTrue(pool.get_pool('test9', dict(settings_dict)) is
+                    first)
+            self.assertTrue(pool.get_pool(
+                    'test9', dict(settings_dict, POOL_MAX=None)) is None)
+            second = pool.get_pool(
+                    'test9', dict(settings_dict, POOL_SCHEMA_AFFINITY=True))
+            self.assertFalse(second is first)
+            self.assertTrue(first.closed and second.schema_affinity)
+        finally:
+            pool.close_pools()
+
+    def test_health_check(self):
+        """Idle connections that went away are replaced on checkout."""
+        connection_pool = pool.ConnectionPool('test9', max_size=1)
+        broken, path = connection_pool.checkout(FakeConnection)
+        connection_pool.checkin(broken)
+        broken.broken = True
+        ping_after = pool.PING_AFTER
+        pool.PING_AFTER = 0
+        try:
+            connection, path = connection_pool.checkout(FakeConnection)
+        finally:
+            pool.PING_AFTER = ping_after
+        self.assertFalse(connection is broken)
+        self.assertTrue(broken.closed)
+        connection_pool.checkin(connection)
+        connection_pool.close()
+
+    def test_schema_affinity(self):
+        """
+        Connections are handed out by schema, and otherwise the one
+        idle the longest goes.
+        """
+        connection_pool = pool.ConnectionPool(
+                'test9', max_size=3, schema_affinity=True)
+        first, path = connection_pool.checkout(FakeConnection, 'a')
+        second, path = connection_pool.checkout(FakeConnection, 'b')
+        third, path = connection_pool.checkout(FakeConnection, 'c')
+        connection_pool.checkin(first, 'a')
+        connection_pool.checkin(second, 'b')
+        connection_pool.checkin(third, 'c')
+        self.assertEqual(
+                connection_pool.checkout(FakeConnection, 'b'), (second, 'b'))
+        connection_pool.checkin(second, 'b')
+        self.assertEqual(
+                connection_pool.checkout(FakeConnection, 'd'), (first, 'a'))
+        self.assertEqual(first.queries, [])
+        stats = connection_pool.stats()
+        self.assertEqual((stats['schema_hits'], stats['schema_misses']), (1, 4))
+        self.assertEqual(stats['hit_rate'], 0.2)
+        connection_pool.checkin(first, 'd')
+        connection_pool.close()
+
+
+class Test9Wrapper(TestCase):
+
+    def test_pooled_wrapper(self):
+        """
+        Pooled wrappers hand their connection back on close, pointed
+        back to its default `search_path`.
+        """
+        original = connections['db2']
+        pooled = type(original)(
+                dict(original.settings_dict, POOL_MAX=2), 'db2')
+        connections['db2'] = pooled
+        try:
+            flush(db='db2', schema='test9')
+            migrate(db='db2', schema='test9', environment='test1-b')
+            pooled.close()
+            with using_schema('db2', 'test9', 'test1-b'):
+                cursor = pooled.cursor()
+                cursor.execute('SELECT pg_backend_pid(), current_schema()')
+                pid, schema = cursor.fetchone()
+                self.assertEqual(schema, 'test9')
+            pooled.close()
+            
+            cursor = pooled.cursor()
+            cursor.execute('SELECT pg_backend_pid(), current_schema()')
+            self.assertEqual(cursor.fetchone(), (pid, 'public'))
+            pooled.close()
+            stats = pool.pool_stats()['db2']
+            self.assertEqual((stats['size'], stats['in_use']), (1, 0))
+            self.assertEqual(stats['checkouts'], 3)
+            flush(db='db2', schema='test9')
+        finally:
+            connections['db2'] = original
+            pooled.close()
+            pool.close_pools()
+
+    def test_schema_affinity(self):
+        """
+        Wrappers swap their connection for an idle one on the schema
+        they change to, if there is one and none of their cursors are
+        open, and otherwise point theirs there.
+        """
+        original = connections['db2']
+        pooled = type(original)(dict(
+                original.settings_dict, POOL_MAX=2,
+                POOL_SCHEMA_AFFINITY=True), 'db2')
+        connections['db2'] = pooled
+        
+        def show():
+            cursor = pooled.cursor()
+            cursor.execute('SELECT pg_backend_pid(), current_setting(%s)',
+                    ['search_path'])
+            return cursor.fetchone()
+        
+        try:
+            with using_schema('db2', 'test9_a', 'test1-b'):
+                pid_a, path = show()
+            pooled.close()
+            with using_schema('db2', 'test9_b', 'test1-b'):
+                pid_b, path = show()
+                self.assertEqual(path, 'test9_b, public')
+            pooled.close()
+            self.assertNotEqual(pid_a, pid_b)
+            
+            # Changing schemas swaps for the idle connection on it
+            with using_schema('db2', 'test9_a', 'test1-b'):
+                self.assertEqual(show(), (pid_a, 'test9_a, public'))
+            with using_schema('db2', 'test9_b', 'test1-b'):
+                self.assertEqual(show(), (pid_b, 'test9_b, public'))
+            
+            # Without one, or with a cursor open, the connection stays
+            with using_schema('db2', 'test9_c', 'test1-b'):
+                self.assertEqual(show(), (pid_b, 'test9_c, public'))
+            cursor = pooled.cursor()
+            with using_schema('db2', 'test9_a', 'test1-b'):
+                self.assertEqual(show(), (pid_b, 'test9_a, public'))
+            cursor.close()
+            pooled.close()
+            stats = pool.pool_stats()['db2']
+            self.assertEqual((stats['schema_hits'], stats['size']), (2, 2))
+        finally:
+            connections['db2'] = original
+            pooled.close()
+            pool.close_pools()